@@ -16,15 +16,18 @@
 
 import calendar
 import hashlib
+import os
 import threading
+import time
 from io import BytesIO
 from typing import Optional
 
 from mapproxy.cache.tile import Tile
 from mapproxy.cache import path
-from mapproxy.cache.base import tile_buffer, TileCacheBase
+from mapproxy.cache.base import tile_buffer, tile_content_hash, TileCacheBase
 from mapproxy.image import ImageResult
 from mapproxy.util import async_
+from mapproxy.util.lru import LRU
 from mapproxy.util.coverage import Coverage
 
 try:
@@ -39,15 +42,29 @@ import logging
 log = logging.getLogger('mapproxy.cache.azureblob')
 
 
+# metadata of tile blobs that reference deduplicated data
+REF_METADATA = 'mapproxy_ref'
+# metadata with the size of the referenced data
+SIZE_METADATA = 'mapproxy_size'
+
+
 class AzureBlobConnectionError(Exception):
     pass
 
 
 class AzureBlobCache(TileCacheBase):
 
+    # min. number of tiles with the same key prefix to list the prefix in
+    # are_cached, instead of checking each tile
+    list_min_tiles = 32
+
+    # seconds after which deduplicated data is uploaded again, even if this
+    # process already stored it, see remove_unreferenced_blobs
+    blob_reupload_interval = 600
+
     def __init__(self, base_path, file_ext, directory_layout='tms', container_name='mapproxy',
                  _concurrent_writer=4, _concurrent_reader=4, connection_string=None,
-                 coverage: Optional[Coverage] = None):
+                 coverage: Optional[Coverage] = None, deduplicate=False, max_connections=None):
         super().__init__(coverage)
         if BlobServiceClient is None:
             raise ImportError("Azure Blob Cache requires 'azure-storage-blob' package")
@@ -57,7 +74,14 @@ class AzureBlobCache(TileCacheBase):
 
         self.connection_string = connection_string
         self.container_name = container_name
-        self._container_client_cache = threading.local()
+        self.max_connections = max_connections
+        # (pid, client) of the shared container client, see container_client
+        self._container_client = None
+        self._container_client_lock = threading.Lock()
+        self.deduplicate = deduplicate
+        # keys of deduplicated tile data this process already stored, with the store time
+        self._stored_blobs = LRU(1024)
+        self._stored_blobs_lock = threading.Lock()
 
         self.base_path = base_path
         self.file_ext = file_ext
@@ -67,16 +91,48 @@ class AzureBlobCache(TileCacheBase):
 
     @property
     def container_client(self):
-        if not getattr(self._container_client_cache, 'client', None):
-            container_client = (BlobServiceClient
-                                .from_connection_string(self.connection_string)
-                                .get_container_client(self.container_name))
-            self._container_client_cache.client = container_client
-        return self._container_client_cache.client
+        """
+        The container client of this cache. The client is thread-safe and
+        created once for each process, so all threads share its connection pool.
+        """
+        client = self._container_client
+        if client is not None and client[0] == os.getpid():
+            return client[1]
+
+        with self._container_client_lock:
+            if self._container_client is None or self._container_client[0] != os.getpid():
+                kw = {}
+                if self.max_connections:
+                    kw['transport'] = self._pooled_transport(self.max_connections)
+                container_client = (BlobServiceClient
+                                    .from_connection_string(self.connection_string, **kw)
+                                    .get_container_client(self.container_name))
+                self._container_client = (os.getpid(), container_client)
+            return self._container_client[1]
+
+    @staticmethod
+    def _pooled_transport(max_connections):
+        import requests
+        from azure.core.pipeline.transport import RequestsTransport
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return RequestsTransport(session=session, session_owner=False)
 
     def tile_key(self, tile):
         return self._tile_location(tile, self.base_path, self.file_ext).lstrip('/')
 
+    def blob_key(self, content_hash):
+        """
+        Key of the deduplicated tile data with `content_hash`.
+        """
+        return '%s%s/%s.%s' % (self._blob_prefix(), content_hash[:2], content_hash, self.file_ext)
+
+    def _blob_prefix(self):
+        return '%s/blobs/' % self.base_path.strip('/')
+
     def load_tile_metadata(self, tile, dimensions=None):
         if tile.timestamp:
             return
@@ -86,6 +142,11 @@ class AzureBlobCache(TileCacheBase):
     def _set_metadata(properties, tile):
         tile.timestamp = calendar.timegm(properties.last_modified.timetuple())
         tile.size = properties.size
+        metadata = properties.metadata or {}
+        if REF_METADATA in metadata:
+            # size of the referenced data, unknown for references without size
+            size = metadata.get(SIZE_METADATA)
+            tile.size = int(size) if size else None
 
     def is_cached(self, tile, dimensions=None):
         if tile.is_missing():
@@ -98,7 +159,44 @@ class AzureBlobCache(TileCacheBase):
 
         return True
 
+    def are_cached(self, tiles, dimensions=None):
+        """
+        Check all tiles with one blob listing per key prefix (directory)
+        instead of two requests per tile, if the prefix contains many of
+        the requested tiles (e.g. while seeding).
+        """
+        result = [True] * len(tiles)
+        prefixes: dict[str, list[tuple[int, str, Tile]]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.coord is not None and tile.is_missing():
+                key = self.tile_key(tile)
+                prefixes.setdefault(key.rpartition('/')[0] + '/', []).append((i, key, tile))
+
+        for prefix, entries in prefixes.items():
+            if len(entries) < self.list_min_tiles:
+                for i, _, tile in entries:
+                    result[i] = self.is_cached(tile, dimensions=dimensions)
+                continue
+            wanted = dict((key, (i, tile)) for i, key, tile in entries)
+            last_key = max(wanted)
+            found = set()
+            blobs = self.container_client.walk_blobs(name_starts_with=prefix, include=['metadata'], delimiter='/')
+            for blob in blobs:
+                if blob.name > last_key or len(found) == len(wanted):
+                    # blobs are listed in lexicographical order
+                    break
+                if blob.name not in wanted or getattr(blob, 'last_modified', None) is None:
+                    continue
+                found.add(blob.name)
+                self._set_metadata(blob, wanted[blob.name][1])
+            for key, (i, _) in wanted.items():
+                result[i] = key in found
+        return result
+
     def load_tiles(self, tiles, with_metadata=True, dimensions=None):
+        tiles = [t for t in tiles if t.is_missing()]
+        if not tiles:
+            return True
         p = async_.Pool(min(self._concurrent_reader, len(tiles)))
         return all(p.map(self.load_tile, tiles))
 
@@ -115,6 +213,10 @@ class AzureBlobCache(TileCacheBase):
         try:
             r = self.container_client.download_blob(key)
             self._set_metadata(r.properties, tile)
+            ref = (r.properties.metadata or {}).get(REF_METADATA)
+            if ref:
+                r = self.container_client.download_blob(ref)
+                tile.size = r.properties.size
             tile.image_result = ImageResult(BytesIO(r.readall()))
         except AzureError as e:
             log.debug("AzureBlob:load_tile unable to load key: %s" % key, e)
@@ -129,6 +231,22 @@ class AzureBlobCache(TileCacheBase):
         log.debug('remove_tile, key: %s' % key)
         self.container_client.delete_blob(key)
 
+    def remove_tiles(self, tiles, dimensions=None):
+        """
+        Remove all tiles with batch requests of up to 256 blobs.
+        """
+        self._delete_blobs([self.tile_key(t) for t in tiles if t.coord is not None])
+
+    def _delete_blobs(self, keys):
+        for i in range(0, len(keys), 256):
+            batch = keys[i:i + 256]
+            log.debug('delete_blobs, %d keys' % len(batch))
+            responses = self.container_client.delete_blobs(*batch, raise_on_any_failure=False)
+            for key, response in zip(batch, responses):
+                # 404: already removed
+                if response.status_code not in (200, 202, 404):
+                    log.warning('unable to remove %s: %s %s' % (key, response.status_code, response.reason))
+
     def store_tiles(self, tiles, dimensions=None):
         p = async_.Pool(min(self._concurrent_writer, len(tiles)))
         p.map(self.store_tile, tiles)
@@ -143,8 +261,68 @@ class AzureBlobCache(TileCacheBase):
         container_client = self.container_client
         with tile_buffer(tile) as buf:
             content_settings = ContentSettings(content_type='image/' + self.file_ext)
+            if self.deduplicate:
+                # store an empty blob that references the data
+                data = buf.read()
+                blob_key = self._store_blob(data, content_settings)
+                container_client.upload_blob(
+                    name=key,
+                    data=b'',
+                    overwrite=True,
+                    metadata={REF_METADATA: blob_key, SIZE_METADATA: str(len(data))},
+                    content_settings=content_settings)
+                return
             container_client.upload_blob(
                 name=key,
                 data=buf,
                 overwrite=True,
                 content_settings=content_settings)
+
+    def _store_blob(self, data, content_settings):
+        """
+        Store `data` once under its content hash and return the key.
+        """
+        blob_key = self.blob_key(tile_content_hash(data))
+        with self._stored_blobs_lock:
+            if time.time() - self._stored_blobs.get(blob_key, 0) < self.blob_reupload_interval:
+                return blob_key
+        self.container_client.upload_blob(
+            name=blob_key,
+            data=data,
+            overwrite=True,
+            content_settings=content_settings)
+        with self._stored_blobs_lock:
+            self._stored_blobs[blob_key] = time.time()
+        return blob_key
+
+    def remove_unreferenced_blobs(self, min_age=3600, dry_run=False):
+        """
+        Remove deduplicated tile data that is no longer referenced by any tile.
+
+        Data that was stored in the last `min_age` seconds is kept, as it
+        might be referenced by tiles that are stored concurrently.
+        Returns the number of removed (or unreferenced for `dry_run`) blobs.
+        """
+        started = time.time()
+        blob_prefix = self._blob_prefix()
+        tiles_prefix = blob_prefix[:-len('blobs/')]
+
+        referenced = set()
+        for blob in self.container_client.list_blobs(name_starts_with=tiles_prefix, include=['metadata']):
+            ref = (blob.metadata or {}).get(REF_METADATA)
+            if ref:
+                referenced.add(ref)
+
+        # list blobs after the references, so that blobs that were stored
+        # again in the meantime have a new modification time
+        unreferenced = []
+        for blob in self.container_client.list_blobs(name_starts_with=blob_prefix):
+            if blob.name in referenced:
+                continue
+            if calendar.timegm(blob.last_modified.timetuple()) > started - min_age:
+                continue
+            unreferenced.append(blob.name)
+
+        if not dry_run:
+            self._delete_blobs(unreferenced)
+        return len(unreferenced)
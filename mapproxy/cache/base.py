@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import os
 import sys
 import time
@@ -42,6 +43,54 @@ def tile_buffer(tile):
     tile.stored = True
 
 
+def tile_range(coords, min_density=0.5):
+    """
+    Return the rectangle ``(level, minx, miny, maxx, maxy)`` of all `coords`,
+    if they are on a single level and fill at least `min_density` of the
+    rectangle. Returns ``None`` otherwise.
+
+    Caches can use this to query dense tile sets with a single range query.
+
+    >>> tile_range([(1, 2, 5), (2, 2, 5), (1, 3, 5), (2, 3, 5)])
+    (5, 1, 2, 2, 3)
+    >>> tile_range([(1, 2, 5), (2, 2, 4)]) is None
+    True
+    >>> tile_range([(0, 0, 5), (9, 9, 5)]) is None
+    True
+    """
+    if not coords:
+        return None
+    level = coords[0][2]
+    minx = maxx = coords[0][0]
+    miny = maxy = coords[0][1]
+    for x, y, z in coords:
+        if z != level:
+            return None
+        if x < minx:
+            minx = x
+        elif x > maxx:
+            maxx = x
+        if y < miny:
+            miny = y
+        elif y > maxy:
+            maxy = y
+    area = (maxx - minx + 1) * (maxy - miny + 1)
+    if len(coords) < area * min_density:
+        return None
+    return level, minx, miny, maxx, maxy
+
+
+def tile_content_hash(data):
+    """
+    Return the hash used to store tiles with identical (encoded) `data`
+    only once in caches with ``deduplicate`` enabled.
+
+    >>> tile_content_hash(b'foo')
+    '2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae'
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
 class TileCacheBase(ABC):
     """
     Base implementation of a tile cache.
@@ -90,6 +139,15 @@ class TileCacheBase(ABC):
         """
         pass
 
+    def are_cached(self, tiles, dimensions=None):
+        """
+        Return a list with ``True`` for each cached tile of `tiles`.
+
+        Caches should implement this with a single (or a few) queries,
+        as it is used by the seeder to filter large numbers of tiles.
+        """
+        return [self.is_cached(tile, dimensions=dimensions) for tile in tiles]
+
     @abstractmethod
     def load_tile_metadata(self, tile, dimensions=None):
         """
@@ -98,6 +156,14 @@ class TileCacheBase(ABC):
         """
         pass
 
+    def load_tiles_metadata(self, tiles, dimensions=None):
+        """
+        Fill the metadata attributes of all `tiles`.
+        See `load_tile_metadata`.
+        """
+        for tile in tiles:
+            self.load_tile_metadata(tile, dimensions=dimensions)
+
 
 # whether we immediately remove lock files or not
 REMOVE_ON_UNLOCK = True
@@ -16,9 +16,11 @@
 import contextlib
 import errno
 import hashlib
+import mmap
 import os
 import shutil
 import struct
+import threading
 from abc import ABC, abstractmethod
 from io import BytesIO
 from typing import Optional
@@ -26,9 +28,10 @@ from typing import Optional
 from mapproxy.grid import TileCoord
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageResult
-from mapproxy.cache.base import TileCacheBase, tile_buffer
+from mapproxy.cache.base import TileCacheBase, tile_buffer, tile_content_hash
 from mapproxy.util.fs import ensure_directory, write_atomic
 from mapproxy.util.lock import FileLock
+from mapproxy.util.lru import LRU
 
 import logging
 
@@ -46,13 +49,14 @@ class CompactCacheBase(TileCacheBase, ABC):
         pass
 
     def __init__(self, cache_dir, coverage: Optional[Coverage] = None,
-                 directory_permissions=None, file_permissions=None):
+                 directory_permissions=None, file_permissions=None, deduplicate=False):
         super().__init__(coverage)
         md5 = hashlib.new('md5', cache_dir.encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = 'compactcache-' + md5.hexdigest()
         self.cache_dir = cache_dir
         self.directory_permissions = directory_permissions
         self.file_permissions = file_permissions
+        self.deduplicate = deduplicate
 
     def _get_bundle_fname_and_offset(self, tile_coord: TileCoord):
         x, y, z = tile_coord
@@ -68,7 +72,7 @@ class CompactCacheBase(TileCacheBase, ABC):
     def _get_bundle(self, tile_coord: TileCoord):
         bundle_fname, offset = self._get_bundle_fname_and_offset(tile_coord)
         return self.bundle_class(bundle_fname, offset=offset, file_permissions=self.file_permissions,
-                                 directory_permissions=self.directory_permissions)
+                                 directory_permissions=self.directory_permissions, deduplicate=self.deduplicate)
 
     def is_cached(self, tile, dimensions=None):
         if tile.coord is None:
@@ -78,6 +82,22 @@ class CompactCacheBase(TileCacheBase, ABC):
 
         return self._get_bundle(tile.coord).is_cached(tile, dimensions=dimensions)
 
+    def are_cached(self, tiles, dimensions=None):
+        result = [True] * len(tiles)
+        tiles_by_bundle: dict[str, list[int]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.image_result or tile.coord is None:
+                continue
+            bundle_fname = self._get_bundle_fname_and_offset(tile.coord)[0]
+            tiles_by_bundle.setdefault(bundle_fname, []).append(i)
+
+        for idx in tiles_by_bundle.values():
+            bundle = self._get_bundle(tiles[idx[0]].coord)
+            bundle_result = bundle.are_cached([tiles[i] for i in idx], dimensions=dimensions)
+            for i, cached in zip(idx, bundle_result):
+                result[i] = cached
+        return result
+
     def store_tile(self, tile, dimensions=None):
         if tile.stored:
             return True
@@ -152,8 +172,85 @@ BUNDLE_EXT = '.bundle'
 BUNDLEX_V1_EXT = '.bundlx'
 
 
+class MappedFiles:
+    """
+    Least recently used cache of read-only memory-mapped bundle and index files.
+
+    Each lookup checks the size, mtime and inode of the file and maps the
+    file again if it changed (e.g. new tiles from another process or after
+    defragmentation). Bundles call `invalidate` after they wrote to a file.
+
+    Mappings are not closed explicitly when they are removed from the cache,
+    as other threads might still read from them. They are closed as soon as
+    they are no longer referenced.
+    """
+
+    def __init__(self, size=128):
+        self._lru = LRU(size)
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """
+        Return the memory-mapped content of `filename` or ``None`` if the file
+        does not exist or is empty.
+        """
+        try:
+            st = os.stat(filename)
+        except FileNotFoundError:
+            self.invalidate(filename)
+            return None
+        stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+        with self._lock:
+            entry = self._lru.get(filename)
+        if entry is not None and entry[0] == stat:
+            return entry[1]
+
+        if st.st_size == 0:
+            return None
+        try:
+            with open(filename, 'rb') as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            self._lru[filename] = (stat, mm)
+        return mm
+
+    def invalidate(self, filename):
+        with self._lock:
+            if filename in self._lru:
+                del self._lru[filename]
+
+    def clear(self):
+        with self._lock:
+            self._lru = LRU(self._lru.size)
+
+
+# process-wide, shared by all compact caches
+mapped_files = MappedFiles()
+
+
+def _read_mapped(filename, mm, offset, size):
+    """
+    Return `size` bytes at `offset` from the mapped `filename` and the mapping.
+    Maps the file again if `mm` is shorter, e.g. if the index references a tile
+    that was appended after the file was mapped. Returns ``None`` as data if the
+    file is still too short.
+    """
+    if offset + size > len(mm):
+        mapped_files.invalidate(filename)
+        mm = mapped_files.get(filename)
+        if mm is None or offset + size > len(mm):
+            return None, mm
+    return mm[offset:offset + size], mm
+
+
 class BundleV1:
-    def __init__(self, base_filename, offset, file_permissions=None, directory_permissions=None):
+    def __init__(self, base_filename, offset, file_permissions=None, directory_permissions=None,
+                 deduplicate=False):
+        # deduplicate not supported by V1
         self.base_filename = base_filename
         self.lock_filename = base_filename + '.lck'
         self.offset = offset
@@ -173,21 +270,56 @@ class BundleV1:
     def index(self):
         return BundleIndexV1(self.base_filename + BUNDLEX_V1_EXT, self.directory_permissions, self.file_permissions)
 
+    def _mapped_tile(self, idx_mm, data_mm, tile_coord: TileCoord, with_data=True):
+        """
+        Read the tile from the mapped index and bundle file. Returns the tile data
+        (or the size if `with_data` is False) and the mapped bundle file.
+        """
+        x, y = self._rel_tile_coord(tile_coord)
+        idx_offset = BUNDLEX_V1_HEADER_SIZE + (x * BUNDLEX_V1_GRID_HEIGHT + y) * 5
+        offset = INT64LE.unpack(idx_mm[idx_offset:idx_offset + 5] + b'\x00\x00\x00')[0]
+        if offset == 0:
+            return None, data_mm
+
+        data_fname = self.base_filename + BUNDLE_EXT
+        buf, data_mm = _read_mapped(data_fname, data_mm, offset, 4)
+        if not buf:
+            return None, data_mm
+        size = struct.unpack('<L', buf)[0]
+        if not with_data or size == 0:
+            return size, data_mm
+        return _read_mapped(data_fname, data_mm, offset + 4, size)
+
+    def _invalidate_mapped(self):
+        mapped_files.invalidate(self.base_filename + BUNDLE_EXT)
+        mapped_files.invalidate(self.base_filename + BUNDLEX_V1_EXT)
+
     def is_cached(self, tile, dimensions=None):
         if tile.image_result or tile.coord is None:
             return True
 
-        with self.index().readonly() as idx:
-            if not idx:
-                return False
-            x, y = self._rel_tile_coord(tile.coord)
-            offset = idx.tile_offset(x, y)
-            if offset == 0:
-                return False
+        idx_mm = mapped_files.get(self.base_filename + BUNDLEX_V1_EXT)
+        if idx_mm is None:
+            return False
+        data_mm = mapped_files.get(self.base_filename + BUNDLE_EXT)
+        if data_mm is None:
+            return False
+        size, _ = self._mapped_tile(idx_mm, data_mm, tile.coord, with_data=False)
+        return bool(size)
 
-        with self.data().readonly() as bundle:
-            size = bundle.read_size(offset)
-        return size != 0
+    def are_cached(self, tiles, dimensions=None):
+        idx_mm = mapped_files.get(self.base_filename + BUNDLEX_V1_EXT)
+        data_mm = mapped_files.get(self.base_filename + BUNDLE_EXT)
+        result = []
+        for tile in tiles:
+            if tile.image_result or tile.coord is None:
+                result.append(True)
+            elif idx_mm is None or data_mm is None:
+                result.append(False)
+            else:
+                size, data_mm = self._mapped_tile(idx_mm, data_mm, tile.coord, with_data=False)
+                result.append(bool(size))
+        return result
 
     def store_tile(self, tile, dimensions=None):
         if tile.stored:
@@ -212,6 +344,7 @@ class BundleV1:
                         offset = idx.tile_offset(x, y)
                         offset, size = bundle.append_tile(data, prev_offset=offset)
                         idx.update_tile_offset(x, y, offset=offset, size=size)
+        self._invalidate_mapped()
 
         return True
 
@@ -223,24 +356,21 @@ class BundleV1:
     def load_tiles(self, tiles: list[Tile], with_metadata: bool = False, dimensions=None) -> bool:
         missing = False
 
-        with self.index().readonly() as idx:
-            if not idx:
-                return False
-            with self.data().readonly() as bundle:
-                for t in tiles:
-                    if t.image_result or t.coord is None:
-                        continue
-                    x, y = self._rel_tile_coord(t.coord)
-                    offset = idx.tile_offset(x, y)
-                    if offset == 0:
-                        missing = True
-                        continue
-
-                    data = bundle.read_tile(offset)
-                    if not data:
-                        missing = True
-                        continue
-                    t.image_result = ImageResult(BytesIO(data))
+        idx_mm = mapped_files.get(self.base_filename + BUNDLEX_V1_EXT)
+        if idx_mm is None:
+            return False
+        data_mm = mapped_files.get(self.base_filename + BUNDLE_EXT)
+        if data_mm is None:
+            return False
+
+        for t in tiles:
+            if t.image_result or t.coord is None:
+                continue
+            data, data_mm = self._mapped_tile(idx_mm, data_mm, t.coord)
+            if not data:
+                missing = True
+                continue
+            t.image_result = ImageResult(BytesIO(data))
 
         return not missing
 
@@ -253,6 +383,7 @@ class BundleV1:
             with self.index().readwrite() as idx:
                 x, y = self._rel_tile_coord(tile.coord)
                 idx.remove_tile_offset(x, y)
+        self._invalidate_mapped()
 
         return True
 
@@ -501,12 +632,18 @@ BUNDLE_V2_HEADER_SIZE = 64
 
 
 class BundleV2:
-    def __init__(self, base_filename, offset=None, file_permissions=None, directory_permissions=None):
+    # max. number of existing records with the same size that are compared
+    # with a new tile in deduplicate mode
+    dedup_max_candidates = 8
+
+    def __init__(self, base_filename, offset=None, file_permissions=None, directory_permissions=None,
+                 deduplicate=False):
         # offset not used by V2
         self.filename = base_filename + '.bundle'
         self.lock_filename = base_filename + '.lck'
         self.file_permissions = file_permissions
         self.directory_permissions = directory_permissions
+        self.deduplicate = deduplicate
 
         # defer initialization to update/remove calls to avoid
         # index creation on is_cached (prevents new files in read-only caches)
@@ -547,20 +684,32 @@ class BundleV2:
         offset = val - (size << 40)
         return offset, size
 
-    def _load_tile(self, fh, tile: Tile, dimensions=None):
+    def _mapped_tile_offset_size(self, mm, x, y):
+        val = INT64LE.unpack_from(mm, self._tile_idx_offset(x, y))[0]
+        size = val >> 40
+        if size == 0:
+            return 0, 0
+        return val - (size << 40), size
+
+    def _load_tile(self, mm, tile: Tile, dimensions=None):
+        """
+        Load `tile` from the mapped bundle file. Returns whether the tile was
+        loaded and the (possibly updated) mapping.
+        """
         if tile.image_result or tile.coord is None:
-            return True
+            return True, mm
 
         x, y = self._rel_tile_coord(tile.coord)
-        offset, size = self._tile_offset_size(fh, x, y)
+        offset, size = self._mapped_tile_offset_size(mm, x, y)
         if not size:
-            return False
+            return False, mm
 
-        fh.seek(offset)
-        data = fh.read(size)
+        data, mm = _read_mapped(self.filename, mm, offset, size)
+        if data is None:
+            return False, mm
 
         tile.image_result = ImageResult(BytesIO(data))
-        return True
+        return True, mm
 
     def load_tile(self, tile, with_metadata=False, dimensions=None):
         if tile.image_result or tile.coord is None:
@@ -571,28 +720,42 @@ class BundleV2:
     def load_tiles(self, tiles, with_metadata=False, dimensions=None):
         missing = False
 
-        with self._readonly() as fh:
-            if not fh:
-                return False
+        mm = mapped_files.get(self.filename)
+        if mm is None:
+            return False
 
-            for t in tiles:
-                if t.image_result or t.coord is None:
-                    continue
-                if not self._load_tile(fh, t):
-                    missing = True
+        for t in tiles:
+            if t.image_result or t.coord is None:
+                continue
+            loaded, mm = self._load_tile(mm, t)
+            if not loaded:
+                missing = True
 
         return not missing
 
     def is_cached(self, tile, dimensions=None):
-        with self._readonly() as fh:
-            if not fh:
-                return False
+        mm = mapped_files.get(self.filename)
+        if mm is None:
+            return False
 
-            x, y = self._rel_tile_coord(tile.coord)
-            _, size = self._tile_offset_size(fh, x, y)
-            if not size:
-                return False
-            return True
+        x, y = self._rel_tile_coord(tile.coord)
+        _, size = self._mapped_tile_offset_size(mm, x, y)
+        if not size:
+            return False
+        return True
+
+    def are_cached(self, tiles, dimensions=None):
+        mm = mapped_files.get(self.filename)
+        result = []
+        for tile in tiles:
+            if tile.image_result or tile.coord is None:
+                result.append(True)
+            elif mm is None:
+                result.append(False)
+            else:
+                x, y = self._rel_tile_coord(tile.coord)
+                result.append(bool(self._mapped_tile_offset_size(mm, x, y)[1]))
+        return result
 
     def _update_tile_offset(self, fh, x, y, offset, size):
         idx_offset = self._tile_idx_offset(x, y)
@@ -630,6 +793,30 @@ class BundleV2:
 
         filesize = offset + size
         self._update_metadata(fh, filesize, size)
+        return offset
+
+    def _existing_records(self, fh, sizes):
+        """
+        Return dict with the content hash and offset of the existing records
+        with one of the given `sizes`.
+        """
+        fh.seek(BUNDLE_V2_HEADER_SIZE)
+        index = struct.unpack('<%dQ' % BUNDLE_V2_TILES, fh.read(BUNDLE_V2_INDEX_SIZE))
+        candidates: dict[int, set[int]] = {}
+        for val in index:
+            size = val >> 40
+            if size not in sizes:
+                continue
+            offsets = candidates.setdefault(size, set())
+            if len(offsets) < self.dedup_max_candidates:
+                offsets.add(val - (size << 40))
+
+        records = {}
+        for size, offsets in candidates.items():
+            for offset in offsets:
+                fh.seek(offset)
+                records[tile_content_hash(fh.read(size))] = offset
+        return records
 
     def store_tile(self, tile, dimensions=None):
         if tile.stored:
@@ -651,8 +838,20 @@ class BundleV2:
         with FileLock(self.lock_filename, directory_permissions=self.directory_permissions,
                       file_permissions=self.file_permissions, remove_on_unlock=True):
             with self._readwrite() as fh:
-                for tile_coord, data in tiles_data:
-                    self._store_tile(fh, tile_coord, data, dimensions=dimensions)
+                if not self.deduplicate:
+                    for tile_coord, data in tiles_data:
+                        self._store_tile(fh, tile_coord, data, dimensions=dimensions)
+                else:
+                    # reference a single record for all tiles with identical data
+                    records = self._existing_records(fh, set(len(data) for _, data in tiles_data))
+                    for tile_coord, data in tiles_data:
+                        content_hash = tile_content_hash(data)
+                        if content_hash in records:
+                            x, y = self._rel_tile_coord(tile_coord)
+                            self._update_tile_offset(fh, x, y, records[content_hash], len(data))
+                        else:
+                            records[content_hash] = self._store_tile(fh, tile_coord, data, dimensions=dimensions)
+        mapped_files.invalidate(self.filename)
 
         return True
 
@@ -666,18 +865,22 @@ class BundleV2:
             with self._readwrite() as fh:
                 x, y = self._rel_tile_coord(tile.coord)
                 self._update_tile_offset(fh, x, y, 0, 0)
+        mapped_files.invalidate(self.filename)
 
         return True
 
     def size(self):
         total_size = 0
+        offsets = set()
         with self._readonly() as fh:
             if not fh:
                 return 0, 0
             for y in range(BUNDLE_V2_GRID_HEIGHT):
                 for x in range(BUNDLE_V2_GRID_WIDTH):
-                    _, size = self._tile_offset_size(fh, x, y)
-                    if size:
+                    offset, size = self._tile_offset_size(fh, x, y)
+                    # count records that are shared by deduplicated tiles once
+                    if size and offset not in offsets:
+                        offsets.add(offset)
                         total_size += size + 4
             fh.seek(0, os.SEEK_END)
             actual_size = fh.tell()
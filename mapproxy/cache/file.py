@@ -121,6 +121,46 @@ class FileCache(TileCacheBase):
         else:
             return True
 
+    # min. number of tiles in one directory to list the directory in are_cached,
+    # instead of checking each file
+    scandir_min_tiles = 32
+
+    def are_cached(self, tiles, dimensions=None):
+        """
+        Returns a list with ``True`` for each tile that is present.
+
+        Lists the directory once with `os.scandir`, if it contains many
+        of the requested tiles.
+        """
+        result = [True] * len(tiles)
+        tiles_by_dir: dict[str, list[tuple[int, str]]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.is_missing():
+                dirname, fname = os.path.split(self.tile_location(tile, dimensions=dimensions))
+                tiles_by_dir.setdefault(dirname, []).append((i, fname))
+
+        for dirname, dir_tiles in tiles_by_dir.items():
+            if len(dir_tiles) >= self.scandir_min_tiles:
+                names = self._file_names(dirname)
+                for i, fname in dir_tiles:
+                    result[i] = fname in names
+            else:
+                for i, fname in dir_tiles:
+                    result[i] = os.path.exists(os.path.join(dirname, fname))
+        return result
+
+    def _file_names(self, dirname):
+        """
+        Return the names of all files in `dirname` (including valid symlinks to files).
+        """
+        try:
+            with os.scandir(dirname) as it:
+                return set(entry.name for entry in it if entry.is_file())
+        except OSError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+            return set()
+
     def load_tile(self, tile: Tile, with_metadata=False, dimensions=None) -> bool:
         """
         Fills the `Tile.image_result` of the `tile` if it is cached.
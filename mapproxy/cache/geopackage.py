@@ -27,12 +27,12 @@ from typing import Optional
 
 from mapproxy.cache.tile import TileCollection
 from mapproxy.cache.tile import Tile
-from mapproxy.cache.base import TileCacheBase, tile_buffer, REMOVE_ON_UNLOCK
+from mapproxy.cache.base import TileCacheBase, tile_buffer, tile_range, REMOVE_ON_UNLOCK
 from mapproxy.image import ImageResult
 from mapproxy.srs import get_epsg_num
 from mapproxy.util.fs import ensure_directory
 from mapproxy.util.lock import FileLock
-from mapproxy.util.sqlite3 import sqlite3
+from mapproxy.util.sqlite3 import sqlite3, connect as sqlite_connect
 from mapproxy.util.coverage import Coverage
 
 log = logging.getLogger(__name__)
@@ -43,7 +43,8 @@ class GeopackageCache(TileCacheBase):
 
     def __init__(
             self, geopackage_file, tile_grid, table_name, with_timestamps=False, timeout=30, wal=False,
-            coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None):
+            coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None,
+            read_only=False, cache_size_mb=None, mmap_size_mb=None):
         super().__init__(coverage)
         self.tile_grid = tile_grid
         self.table_name = self._check_table_name(table_name)
@@ -61,14 +62,25 @@ class GeopackageCache(TileCacheBase):
         self.supports_timestamp = with_timestamps
         self.timeout = timeout
         self.wal = wal
-        self.ensure_gpkg()
+        self.read_only = read_only
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        if read_only:
+            if not os.path.isfile(self.geopackage_file):
+                raise ValueError('read_only GeoPackage file %s does not exist' % self.geopackage_file)
+        else:
+            self.ensure_gpkg()
         self._db_conn_cache = threading.local()
 
     @property
     def db(self):
         if not getattr(self._db_conn_cache, 'db', None):
-            self.ensure_gpkg()
-            self._db_conn_cache.db = sqlite3.connect(self.geopackage_file, timeout=self.timeout)
+            if not self.read_only:
+                self.ensure_gpkg()
+            self._db_conn_cache.db = sqlite_connect(
+                self.geopackage_file, self.timeout, read_only=self.read_only,
+                cache_size_mb=self.cache_size_mb, mmap_size_mb=self.mmap_size_mb,
+            )
         return self._db_conn_cache.db
 
     def uncached_db(self):
@@ -327,6 +339,9 @@ class GeopackageCache(TileCacheBase):
         return self._store_bulk(tiles)
 
     def _store_bulk(self, tiles):
+        if self.read_only:
+            log.warning('unable to store tile in read_only %s', self.geopackage_file)
+            return False
         records = []
         # tile_buffer (as_buffer) will encode the tile to the target format
         # we collect all tiles before, to avoid having the db transaction
@@ -365,6 +380,36 @@ class GeopackageCache(TileCacheBase):
         else:
             return False
 
+    def _query_tiles(self, columns, coords):
+        """
+        Yield the rows with `columns` for all tiles in `coords`. Also yields
+        rows of tiles that are not in `coords` if `coords` are queried as a range.
+        """
+        stmt_base = "SELECT {0} FROM [{1}] WHERE ".format(columns, self.table_name)
+
+        # Query contiguous tiles with a single range query, see MBTilesCache._query_tiles
+        rect = tile_range(coords)
+        if rect:
+            level, minx, miny, maxx, maxy = rect
+            queries = [(
+                stmt_base + 'zoom_level = ? AND tile_column BETWEEN ? AND ? AND tile_row BETWEEN ? AND ?',
+                (level, minx, maxx, miny, maxy),
+            )]
+        else:
+            # SQLite is limited to 1000 args -> split into multiple requests if more arguments are needed
+            queries = []
+            for i in range(0, len(coords), 333):
+                cur_coords = coords[i:i + 333]
+                stmt = stmt_base + ' OR '.join(
+                    ['(tile_column = ? AND tile_row = ? AND zoom_level = ?)'] * len(cur_coords))
+                queries.append((stmt, [c for coord in cur_coords for c in coord]))
+
+        for stmt, args in queries:
+            cursor = self.db.cursor()
+            cursor.execute(stmt, args)
+            yield from cursor
+            cursor.close()
+
     def load_tiles(self, tiles: TileCollection, with_metadata=False, dimensions=None) -> bool:
         # associate the right tiles with the cursor
         tile_dict = {}
@@ -372,41 +417,40 @@ class GeopackageCache(TileCacheBase):
         for tile in tiles:
             if tile.image_result or tile.coord is None:
                 continue
-            x, y, level = tile.coord
-            coords.append(x)
-            coords.append(y)
-            coords.append(level)
-            tile_dict[(x, y)] = tile
+            coords.append(tile.coord)
+            tile_dict[tile.coord[:2]] = tile
 
         if not tile_dict:
             # all tiles loaded or coords are None
             return True
 
-        stmt_base = "SELECT tile_column, tile_row, tile_data FROM [{0}] WHERE ".format(self.table_name)
-
         loaded_tiles = 0
+        for row in self._query_tiles("tile_column, tile_row, tile_data", coords):
+            tile = tile_dict.get((row[0], row[1]))
+            if tile is None:
+                # range query includes tiles that were not requested
+                continue
+            loaded_tiles += 1
+            data = row[2]
+            tile.size = len(data)
+            tile.image_result = ImageResult(BytesIO(data))
 
-        # SQLite is limited to 1000 args -> split into multiple requests if more arguments are needed
-        while coords:
-            cur_coords = coords[:999]
-
-            stmt = stmt_base + ' OR '.join(
-                ['(tile_column = ? AND tile_row = ? AND zoom_level = ?)'] * (len(cur_coords) // 3))
-
-            cursor = self.db.cursor()
-            cursor.execute(stmt, cur_coords)
-
-            for row in cursor:
-                loaded_tiles += 1
-                tile = tile_dict[(row[0], row[1])]
-                data = row[2]
-                tile.size = len(data)
-                tile.image_result = ImageResult(BytesIO(data))
-            cursor.close()
+        return loaded_tiles == len(tile_dict)
 
-            coords = coords[999:]
+    def are_cached(self, tiles, dimensions=None):
+        result = [True] * len(tiles)
+        tile_idx = {}
+        for i, tile in enumerate(tiles):
+            if tile.image_result or tile.coord is None:
+                continue
+            result[i] = False
+            tile_idx.setdefault(tuple(tile.coord), []).append(i)
 
-        return loaded_tiles == len(tile_dict)
+        if tile_idx:
+            for row in self._query_tiles("tile_column, tile_row, zoom_level", list(tile_idx)):
+                for i in tile_idx.get(tuple(row), ()):
+                    result[i] = True
+        return result
 
     def remove_tile(self, tile, dimensions=None):
         cursor = self.db.cursor()
@@ -441,7 +485,8 @@ class GeopackageCache(TileCacheBase):
 class GeopackageLevelCache(TileCacheBase):
 
     def __init__(self, geopackage_dir, tile_grid, table_name, timeout=30, wal=False,
-                 coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None):
+                 coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None,
+                 read_only=False, cache_size_mb=None, mmap_size_mb=None):
         super().__init__(coverage)
         md5 = hashlib.new('md5', geopackage_dir.encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = 'gpkg-' + md5.hexdigest()
@@ -450,18 +495,28 @@ class GeopackageLevelCache(TileCacheBase):
         self.table_name = table_name
         self.timeout = timeout
         self.wal = wal
-        self._geopackage: dict[int, GeopackageCache] = {}
+        self.read_only = read_only
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        self._geopackage: dict[int, Optional[GeopackageCache]] = {}
         self._geopackage_lock = threading.Lock()
         self.directory_permissions = directory_permissions
         self.file_premissions = file_permissions
 
     def _get_level(self, level):
+        """
+        Return the cache for `level`. Returns ``None`` for read_only caches
+        without a file for this level.
+        """
         if level in self._geopackage:
             return self._geopackage[level]
 
         with self._geopackage_lock:
             if level not in self._geopackage:
                 geopackage_filename = os.path.join(self.cache_dir, '%s.gpkg' % level)
+                if self.read_only and not os.path.isfile(geopackage_filename):
+                    self._geopackage[level] = None
+                    return None
                 self._geopackage[level] = GeopackageCache(
                     geopackage_filename,
                     self.tile_grid,
@@ -471,7 +526,10 @@ class GeopackageLevelCache(TileCacheBase):
                     wal=self.wal,
                     coverage=self.coverage,
                     directory_permissions=self.directory_permissions,
-                    file_permissions=self.file_premissions
+                    file_permissions=self.file_premissions,
+                    read_only=self.read_only,
+                    cache_size_mb=self.cache_size_mb,
+                    mmap_size_mb=self.mmap_size_mb,
                 )
 
         return self._geopackage[level]
@@ -482,7 +540,8 @@ class GeopackageLevelCache(TileCacheBase):
         """
         with self._geopackage_lock:
             for gp in self._geopackage.values():
-                gp.cleanup()
+                if gp is not None:
+                    gp.cleanup()
 
     def is_cached(self, tile, dimensions=None):
         if tile.coord is None:
@@ -490,28 +549,55 @@ class GeopackageLevelCache(TileCacheBase):
         if tile.image_result:
             return True
 
-        return self._get_level(tile.coord[2]).is_cached(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.is_cached(tile, dimensions=dimensions)
 
     def store_tile(self, tile, dimensions=None):
         if tile.stored:
             return True
 
-        return self._get_level(tile.coord[2]).store_tile(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.store_tile(tile, dimensions=dimensions)
 
     def store_tiles(self, tiles, dimensions=None):
         failed = False
         for level, tiles in groupby(tiles, key=lambda t: t.coord[2]):
             tiles = [t for t in tiles if not t.stored]
-            res = self._get_level(level).store_tiles(tiles, dimensions=dimensions)
-            if not res:
+            level_cache = self._get_level(level)
+            if level_cache is None or not level_cache.store_tiles(tiles, dimensions=dimensions):
                 failed = True
         return failed
 
+    def are_cached(self, tiles, dimensions=None):
+        result = [True] * len(tiles)
+        tiles_by_level: dict[int, list[int]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.image_result or tile.coord is None:
+                continue
+            tiles_by_level.setdefault(tile.coord[2], []).append(i)
+
+        for level, idx in tiles_by_level.items():
+            level_cache = self._get_level(level)
+            if level_cache is None:
+                level_result = [False] * len(idx)
+            else:
+                level_result = level_cache.are_cached([tiles[i] for i in idx], dimensions=dimensions)
+            for i, cached in zip(idx, level_result):
+                result[i] = cached
+        return result
+
     def load_tile(self, tile, with_metadata=False, dimensions=None):
         if tile.image_result or tile.coord is None:
             return True
 
-        return self._get_level(tile.coord[2]).load_tile(tile, with_metadata=with_metadata, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.load_tile(tile, with_metadata=with_metadata, dimensions=dimensions)
 
     def load_tiles(self, tiles: TileCollection, with_metadata=False, dimensions=None) -> bool:
         level = None
@@ -524,16 +610,27 @@ class GeopackageLevelCache(TileCacheBase):
         if not level:
             return True
 
-        return self._get_level(level).load_tiles(tiles, with_metadata=with_metadata, dimensions=dimensions)
+        level_cache = self._get_level(level)
+        if level_cache is None:
+            return False
+        return level_cache.load_tiles(tiles, with_metadata=with_metadata, dimensions=dimensions)
 
     def remove_tile(self, tile, dimensions=None):
         if tile.coord is None:
             return True
 
-        return self._get_level(tile.coord[2]).remove_tile(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.remove_tile(tile, dimensions=dimensions)
 
     def remove_level_tiles_before(self, level, timestamp=None, remove_all=False):
+        if self.read_only:
+            log.warning('unable to remove tiles from read_only %s', self.cache_dir)
+            return False
         level_cache = self._get_level(level)
+        if level_cache is None:
+            return True
         if remove_all:
             level_cache.cleanup()
             os.unlink(level_cache.geopackage_file)
@@ -542,7 +639,9 @@ class GeopackageLevelCache(TileCacheBase):
             return level_cache.remove_level_tiles_before(level, timestamp)
 
     def load_tile_metadata(self, tile, dimensions=None):
-        return self._get_level(tile.coord[2]).load_tile_metadata(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is not None:
+            level_cache.load_tile_metadata(tile, dimensions=dimensions)
 
 
 def is_close(a, b, rel_tol=1e-09, abs_tol=0.0):
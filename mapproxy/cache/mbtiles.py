@@ -24,10 +24,10 @@ from typing import Optional
 
 from mapproxy.cache.tile import Tile, TileCollection
 from mapproxy.image import ImageResult
-from mapproxy.cache.base import TileCacheBase, tile_buffer, REMOVE_ON_UNLOCK
+from mapproxy.cache.base import TileCacheBase, tile_buffer, tile_range, tile_content_hash, REMOVE_ON_UNLOCK
 from mapproxy.util.fs import ensure_directory
 from mapproxy.util.lock import FileLock
-from mapproxy.util.sqlite3 import sqlite3
+from mapproxy.util.sqlite3 import sqlite3, connect as sqlite_connect
 
 import logging
 
@@ -55,7 +55,8 @@ class MBTilesCache(TileCacheBase):
     supports_timestamp = False
 
     def __init__(self, mbtile_file, with_timestamps=False, timeout=30, wal=False, ttl=0,
-                 coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None):
+                 coverage: Optional[Coverage] = None, directory_permissions=None, file_permissions=None,
+                 read_only=False, cache_size_mb=None, mmap_size_mb=None, deduplicate=False):
         super().__init__(coverage)
         md5 = hashlib.new('md5', mbtile_file.encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = 'mbtiles-' + md5.hexdigest()
@@ -66,14 +67,28 @@ class MBTilesCache(TileCacheBase):
         self.ttl = with_timestamps and ttl or 0
         self.timeout = timeout
         self.wal = wal
-        self.ensure_mbtile()
+        self.read_only = read_only
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        self.deduplicate = deduplicate
+        # whether the file uses the map/images layout, detected on first write
+        self._deduplicated = None
+        if read_only:
+            if not os.path.exists(self.mbtile_file):
+                raise ValueError('read_only MBTiles file %s does not exist' % self.mbtile_file)
+        else:
+            self.ensure_mbtile()
         self._db_conn_cache = threading.local()
 
     @property
     def db(self):
         if not getattr(self._db_conn_cache, 'db', None):
-            self.ensure_mbtile()
-            self._db_conn_cache.db = sqlite3.connect(self.mbtile_file, self.timeout)
+            if not self.read_only:
+                self.ensure_mbtile()
+            self._db_conn_cache.db = sqlite_connect(
+                self.mbtile_file, self.timeout, read_only=self.read_only,
+                cache_size_mb=self.cache_size_mb, mmap_size_mb=self.mmap_size_mb,
+            )
         return self._db_conn_cache.db
 
     def cleanup(self):
@@ -98,30 +113,68 @@ class MBTilesCache(TileCacheBase):
             if self.wal:
                 db.execute('PRAGMA journal_mode=wal')
 
-            stmt = """
-                CREATE TABLE tiles (
-                    zoom_level integer,
-                    tile_column integer,
-                    tile_row integer,
-                    tile_data blob
-            """
-
+            timestamp_column = ''
             if self.supports_timestamp:
-                stmt += """
-                    , last_modified datetime DEFAULT (datetime('now','localtime'))
-                """
-            stmt += """
-                );
-            """
-            db.execute(stmt)
+                timestamp_column = ", last_modified datetime DEFAULT (datetime('now','localtime'))"
+
+            if self.deduplicate:
+                # Store each distinct tile_data only once in images. tiles is a view
+                # that joins map and images (layout of the MBTiles specification).
+                db.execute("""
+                    CREATE TABLE map (
+                        zoom_level integer,
+                        tile_column integer,
+                        tile_row integer,
+                        tile_id text
+                        %s
+                    );
+                """ % timestamp_column)
+                db.execute("""
+                    CREATE TABLE images (tile_id text PRIMARY KEY, tile_data blob);
+                """)
+                db.execute("""
+                    CREATE UNIQUE INDEX idx_tile on map
+                        (zoom_level, tile_column, tile_row);
+                """)
+                db.execute("""
+                    CREATE INDEX idx_tile_id on map (tile_id);
+                """)
+                db.execute("""
+                    CREATE VIEW tiles AS
+                        SELECT map.zoom_level AS zoom_level,
+                               map.tile_column AS tile_column,
+                               map.tile_row AS tile_row,
+                               images.tile_data AS tile_data
+                               %s
+                        FROM map JOIN images ON images.tile_id = map.tile_id;
+                """ % (', map.last_modified AS last_modified' if self.supports_timestamp else ''))
+                # remove images that are no longer referenced
+                for event in ('DELETE', 'UPDATE OF tile_id'):
+                    db.execute("""
+                        CREATE TRIGGER remove_unused_images_%s AFTER %s ON map
+                        BEGIN
+                            DELETE FROM images WHERE tile_id = OLD.tile_id AND
+                                NOT EXISTS (SELECT 1 FROM map WHERE tile_id = OLD.tile_id);
+                        END;
+                    """ % (event.split()[0].lower(), event))
+            else:
+                db.execute("""
+                    CREATE TABLE tiles (
+                        zoom_level integer,
+                        tile_column integer,
+                        tile_row integer,
+                        tile_data blob
+                        %s
+                    );
+                """ % timestamp_column)
+                db.execute("""
+                    CREATE UNIQUE INDEX idx_tile on tiles
+                        (zoom_level, tile_column, tile_row);
+                """)
 
             db.execute("""
                 CREATE TABLE metadata (name text, value text);
             """)
-            db.execute("""
-                CREATE UNIQUE INDEX idx_tile on tiles
-                    (zoom_level, tile_column, tile_row);
-            """)
             db.commit()
 
         if self.file_permissions:
@@ -129,6 +182,17 @@ class MBTilesCache(TileCacheBase):
             log.info("setting file permissions on MBTile file: %s", permission)
             os.chmod(self.mbtile_file, permission)
 
+    @property
+    def _tiles_table(self):
+        """
+        Name of the table to store and remove tiles. This is ``map`` for
+        deduplicated files, where ``tiles`` is a view.
+        """
+        if self._deduplicated is None:
+            row = self.db.execute("SELECT type FROM sqlite_master WHERE name = 'tiles'").fetchone()
+            self._deduplicated = bool(row and row[0] == 'view')
+        return 'map' if self._deduplicated else 'tiles'
+
     def update_metadata(self, name='', description='', version=1, overlay=True, format='png'):
         self.db.execute("""
             CREATE TABLE IF NOT EXISTS metadata (name text, value text);
@@ -171,6 +235,9 @@ class MBTilesCache(TileCacheBase):
         return self._store_bulk(tiles)
 
     def _store_bulk(self, tiles):
+        if self.read_only:
+            log.warning('unable to store tile in read_only %s', self.mbtile_file)
+            return False
         records = []
         # tile_buffer (as_buffer) will encode the tile to the target format
         # we collect all tiles before, to avoid having the db transaction
@@ -186,7 +253,9 @@ class MBTilesCache(TileCacheBase):
 
         cursor = self.db.cursor()
         try:
-            if self.supports_timestamp:
+            if self._tiles_table == 'map':
+                self._store_deduplicated(cursor, records)
+            elif self.supports_timestamp:
                 stmt = ("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data, last_modified)"
                         " VALUES (?,?,?,?, datetime(?, 'unixepoch', 'localtime'))")
                 cursor.executemany(stmt, records)
@@ -199,6 +268,29 @@ class MBTilesCache(TileCacheBase):
             return False
         return True
 
+    def _store_deduplicated(self, cursor, records):
+        images = {}
+        map_records = []
+        for record in records:
+            tile_id = tile_content_hash(record[3])
+            images[tile_id] = record[3]
+            map_records.append(record[:3] + (tile_id, ) + record[4:])
+
+        # upsert instead of INSERT OR REPLACE, as REPLACE does not fire the
+        # trigger that removes unused images
+        if self.supports_timestamp:
+            stmt = ("INSERT INTO map (zoom_level, tile_column, tile_row, tile_id, last_modified)"
+                    " VALUES (?,?,?,?, datetime(?, 'unixepoch', 'localtime'))"
+                    " ON CONFLICT (zoom_level, tile_column, tile_row)"
+                    " DO UPDATE SET tile_id = excluded.tile_id, last_modified = excluded.last_modified")
+        else:
+            stmt = ("INSERT INTO map (zoom_level, tile_column, tile_row, tile_id) VALUES (?,?,?,?)"
+                    " ON CONFLICT (zoom_level, tile_column, tile_row) DO UPDATE SET tile_id = excluded.tile_id")
+        cursor.executemany(stmt, map_records)
+        # insert the images after the map, as the trigger removes images of
+        # updated tiles that are only referenced by new tiles of this batch
+        cursor.executemany("INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?,?)", images.items())
+
     def load_tile(self, tile: Tile, with_metadata=False, dimensions=None) -> bool:
         if tile.image_result or tile.coord is None:
             return True
@@ -233,6 +325,41 @@ class MBTilesCache(TileCacheBase):
             log.warning('unable to load tile from %s: %s' % (self.mbtile_file, ex))
             return False
 
+    def _query_tiles(self, columns, coords):
+        """
+        Yield the rows with `columns` for all tiles in `coords`. Also yields
+        rows of tiles that are not in `coords` if `coords` are queried as a range.
+        """
+        stmt_base = "SELECT %s FROM tiles WHERE " % columns
+        if self.supports_timestamp and self.ttl:
+            ttl_condition = "datetime('now', 'localtime', '%d seconds') < last_modified" % -self.ttl
+            stmt_base += ttl_condition + ' AND '
+
+        # Query contiguous tiles (e.g. from CacheMapLayer or the seeder) with a single
+        # range query. The statement does not depend on the number of tiles and
+        # SQLite can reuse the cached prepared statement.
+        rect = tile_range(coords)
+        if rect:
+            level, minx, miny, maxx, maxy = rect
+            queries = [(
+                stmt_base + '(zoom_level = ? AND tile_column BETWEEN ? AND ? AND tile_row BETWEEN ? AND ?)',
+                (level, minx, maxx, miny, maxy),
+            )]
+        else:
+            # SQLite is limited to 1000 args -> split into multiple requests if more arguments are needed
+            queries = []
+            for i in range(0, len(coords), 333):
+                cur_coords = coords[i:i + 333]
+                stmt = stmt_base + '(' + ' OR '.join(
+                    ['(tile_column = ? AND tile_row = ? AND zoom_level = ?)'] * len(cur_coords)) + ')'
+                queries.append((stmt, [c for coord in cur_coords for c in coord]))
+
+        for stmt, args in queries:
+            cursor = self.db.cursor()
+            cursor.execute(stmt, args)
+            yield from cursor
+            cursor.close()
+
     def load_tiles(self, tiles: TileCollection, with_metadata=False, dimensions=None) -> bool:
         # associate the right tiles with the cursor
         tile_dict = {}
@@ -240,59 +367,88 @@ class MBTilesCache(TileCacheBase):
         for tile in tiles:
             if tile.image_result or tile.coord is None:
                 continue
-            x, y, level = tile.coord
-            coords.append(x)
-            coords.append(y)
-            coords.append(level)
-            tile_dict[(x, y)] = tile
+            coords.append(tile.coord)
+            tile_dict[tile.coord[:2]] = tile
 
         if not tile_dict:
             # all tiles loaded or coords are None
             return True
 
         if self.supports_timestamp:
-            stmt_base = "SELECT tile_column, tile_row, tile_data, last_modified FROM tiles WHERE "
-            if self.ttl:
-                ttl_condition = "datetime('now', 'localtime', '%d seconds') < last_modified" % -self.ttl
-                stmt_base += ttl_condition + ' AND '
+            columns = "tile_column, tile_row, tile_data, last_modified"
         else:
-            stmt_base = "SELECT tile_column, tile_row, tile_data FROM tiles WHERE "
+            columns = "tile_column, tile_row, tile_data"
 
         loaded_tiles = 0
+        try:
+            for row in self._query_tiles(columns, coords):
+                tile = tile_dict.get((row[0], row[1]))
+                if tile is None:
+                    # range query includes tiles that were not requested
+                    continue
+                loaded_tiles += 1
+                data = row[2]
+                tile.size = len(data)
+                tile.image_result = ImageResult(BytesIO(data))
+                if self.supports_timestamp:
+                    tile.timestamp = sqlite_datetime_to_timestamp(row[3])
+        except sqlite3.DatabaseError as ex:
+            log.warning('unable to load tiles from %s: %s' % (self.mbtile_file, ex))
+            return False
 
-        # SQLite is limited to 1000 args -> split into multiple requests if more arguments are needed
-        while coords:
-            cur_coords = coords[:999]
+        return loaded_tiles == len(tile_dict)
 
-            stmt = stmt_base + '(' + ' OR '.join(
-                ['(tile_column = ? AND tile_row = ? AND zoom_level = ?)'] * (len(cur_coords) // 3)) + ')'
+    def are_cached(self, tiles, dimensions=None):
+        result = [True] * len(tiles)
+        tile_idx = {}
+        for i, tile in enumerate(tiles):
+            if tile.image_result or tile.coord is None:
+                continue
+            result[i] = False
+            tile_idx.setdefault(tuple(tile.coord), []).append(i)
 
-            cursor = self.db.cursor()
-            try:
-                cursor.execute(stmt, cur_coords)
-
-                for row in cursor:
-                    loaded_tiles += 1
-                    tile = tile_dict[(row[0], row[1])]
-                    data = row[2]
-                    tile.size = len(data)
-                    tile.image_result = ImageResult(BytesIO(data))
-                    if self.supports_timestamp:
-                        tile.timestamp = sqlite_datetime_to_timestamp(row[3])
-                cursor.close()
-            except sqlite3.DatabaseError as ex:
-                log.warning('unable to load tiles from %s: %s' % (self.mbtile_file, ex))
-                return False
+        if not tile_idx:
+            return result
 
-            coords = coords[999:]
+        try:
+            for row in self._query_tiles("tile_column, tile_row, zoom_level", list(tile_idx)):
+                for i in tile_idx.get(tuple(row), ()):
+                    result[i] = True
+        except sqlite3.DatabaseError as ex:
+            log.warning('unable to query tiles from %s: %s' % (self.mbtile_file, ex))
+            for idx in tile_idx.values():
+                for i in idx:
+                    result[i] = False
+        return result
 
-        return loaded_tiles == len(tile_dict)
+    def load_tiles_metadata(self, tiles, dimensions=None):
+        if not self.supports_timestamp:
+            for tile in tiles:
+                self.load_tile_metadata(tile, dimensions=dimensions)
+            return
+
+        tile_dict = {}
+        for tile in tiles:
+            if tile.coord is not None:
+                tile_dict.setdefault(tuple(tile.coord), []).append(tile)
+        if not tile_dict:
+            return
+
+        try:
+            rows = self._query_tiles(
+                "tile_column, tile_row, zoom_level, last_modified, length(tile_data)", list(tile_dict))
+            for row in rows:
+                for tile in tile_dict.get(tuple(row[:3]), ()):
+                    tile.timestamp = sqlite_datetime_to_timestamp(row[3])
+                    tile.size = row[4]
+        except sqlite3.DatabaseError as ex:
+            log.warning('unable to load tile metadata from %s: %s' % (self.mbtile_file, ex))
 
     def remove_tile(self, tile, dimensions=None):
         cursor = self.db.cursor()
         try:
             cursor.execute(
-                "DELETE FROM tiles WHERE (tile_column = ? AND tile_row = ? AND zoom_level = ?)",
+                "DELETE FROM %s WHERE (tile_column = ? AND tile_row = ? AND zoom_level = ?)" % self._tiles_table,
                 tile.coord)
             self.db.commit()
             if cursor.rowcount:
@@ -307,7 +463,7 @@ class MBTilesCache(TileCacheBase):
             try:
                 cursor = self.db.cursor()
                 cursor.execute(
-                    "DELETE FROM tiles WHERE (zoom_level = ?)",
+                    "DELETE FROM %s WHERE (zoom_level = ?)" % self._tiles_table,
                     (level, ))
                 self.db.commit()
                 if cursor.rowcount:
@@ -321,8 +477,8 @@ class MBTilesCache(TileCacheBase):
             try:
                 cursor = self.db.cursor()
                 cursor.execute(
-                    '''DELETE FROM tiles WHERE
-                    (zoom_level = ? AND last_modified < datetime(?, 'unixepoch', 'localtime'))''',
+                    '''DELETE FROM %s WHERE
+                    (zoom_level = ? AND last_modified < datetime(?, 'unixepoch', 'localtime'))''' % self._tiles_table,
                     (level, timestamp))
                 self.db.commit()
                 if cursor.rowcount:
@@ -345,26 +501,38 @@ class MBTilesLevelCache(TileCacheBase):
     supports_timestamp = True
 
     def __init__(self, mbtiles_dir, timeout=30, wal=False, ttl=0, coverage: Optional[Coverage] = None,
-                 directory_permissions=None, file_permissions=None):
+                 directory_permissions=None, file_permissions=None,
+                 read_only=False, cache_size_mb=None, mmap_size_mb=None, deduplicate=False):
         super().__init__(coverage)
         md5 = hashlib.new('md5', mbtiles_dir.encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = 'sqlite-' + md5.hexdigest()
         self.cache_dir = mbtiles_dir
         self.directory_permissions = directory_permissions
         self.file_permissions = file_permissions
-        self._mbtiles: dict[int, MBTilesCache] = {}
+        self._mbtiles: dict[int, Optional[MBTilesCache]] = {}
         self.timeout = timeout
         self.wal = wal
         self.ttl = ttl
+        self.read_only = read_only
+        self.cache_size_mb = cache_size_mb
+        self.mmap_size_mb = mmap_size_mb
+        self.deduplicate = deduplicate
         self._mbtiles_lock = threading.Lock()
 
     def _get_level(self, level):
+        """
+        Return the cache for `level`. Returns ``None`` for read_only caches
+        without a file for this level.
+        """
         if level in self._mbtiles:
             return self._mbtiles[level]
 
         with self._mbtiles_lock:
             if level not in self._mbtiles:
                 mbtile_filename = os.path.join(self.cache_dir, '%s.mbtiles' % level)
+                if self.read_only and not os.path.exists(mbtile_filename):
+                    self._mbtiles[level] = None
+                    return None
                 self._mbtiles[level] = MBTilesCache(
                     mbtile_filename,
                     with_timestamps=True,
@@ -373,7 +541,11 @@ class MBTilesLevelCache(TileCacheBase):
                     ttl=self.ttl,
                     coverage=self.coverage,
                     directory_permissions=self.directory_permissions,
-                    file_permissions=self.file_permissions
+                    file_permissions=self.file_permissions,
+                    read_only=self.read_only,
+                    cache_size_mb=self.cache_size_mb,
+                    mmap_size_mb=self.mmap_size_mb,
+                    deduplicate=self.deduplicate,
                 )
 
         return self._mbtiles[level]
@@ -384,7 +556,8 @@ class MBTilesLevelCache(TileCacheBase):
         """
         with self._mbtiles_lock:
             for mbtile in self._mbtiles.values():
-                mbtile.cleanup()
+                if mbtile is not None:
+                    mbtile.cleanup()
 
     def is_cached(self, tile, dimensions=None):
         if tile.coord is None:
@@ -392,28 +565,62 @@ class MBTilesLevelCache(TileCacheBase):
         if tile.image_result:
             return True
 
-        return self._get_level(tile.coord[2]).is_cached(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.is_cached(tile, dimensions=dimensions)
 
     def store_tile(self, tile, dimensions=None):
         if tile.stored:
             return True
 
-        return self._get_level(tile.coord[2]).store_tile(tile, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.store_tile(tile, dimensions=dimensions)
 
     def store_tiles(self, tiles, dimensions=None):
         failed = False
         for level, tiles in groupby(tiles, key=lambda t: t.coord[2]):
             tiles = [t for t in tiles if not t.stored]
-            res = self._get_level(level).store_tiles(tiles, dimensions=dimensions)
-            if not res:
+            level_cache = self._get_level(level)
+            if level_cache is None or not level_cache.store_tiles(tiles, dimensions=dimensions):
                 failed = True
         return failed
 
+    def are_cached(self, tiles, dimensions=None):
+        result = [True] * len(tiles)
+        tiles_by_level: dict[int, list[int]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.image_result or tile.coord is None:
+                continue
+            tiles_by_level.setdefault(tile.coord[2], []).append(i)
+
+        for level, idx in tiles_by_level.items():
+            level_cache = self._get_level(level)
+            if level_cache is None:
+                level_result = [False] * len(idx)
+            else:
+                level_result = level_cache.are_cached([tiles[i] for i in idx], dimensions=dimensions)
+            for i, cached in zip(idx, level_result):
+                result[i] = cached
+        return result
+
+    def load_tiles_metadata(self, tiles, dimensions=None):
+        tiles = [t for t in tiles if t.coord is not None]
+        for level, level_tiles in groupby(sorted(tiles, key=lambda t: t.coord[2]), key=lambda t: t.coord[2]):
+            level_cache = self._get_level(level)
+            if level_cache is not None:
+                level_cache.load_tiles_metadata(list(level_tiles), dimensions=dimensions)
+
     def load_tile(self, tile, with_metadata=False, dimensions=None):
         if tile.image_result or tile.coord is None:
             return True
 
-        return self._get_level(tile.coord[2]).load_tile(tile, with_metadata=with_metadata, dimensions=dimensions)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.load_tile(tile, with_metadata=with_metadata, dimensions=dimensions)
 
     def load_tiles(self, tiles: TileCollection, with_metadata=False, dimensions=None) -> bool:
         level = None
@@ -426,19 +633,30 @@ class MBTilesLevelCache(TileCacheBase):
         if not level:
             return True
 
-        return self._get_level(level).load_tiles(tiles, with_metadata=with_metadata, dimensions=dimensions)
+        level_cache = self._get_level(level)
+        if level_cache is None:
+            return False
+        return level_cache.load_tiles(tiles, with_metadata=with_metadata, dimensions=dimensions)
 
     def remove_tile(self, tile, dimensions=None):
         if tile.coord is None:
             return True
 
-        return self._get_level(tile.coord[2]).remove_tile(tile)
+        level_cache = self._get_level(tile.coord[2])
+        if level_cache is None:
+            return False
+        return level_cache.remove_tile(tile)
 
     def load_tile_metadata(self, tile, dimensions=None):
         self.load_tile(tile, dimensions=dimensions)
 
     def remove_level_tiles_before(self, level, timestamp=None, remove_all=False):
+        if self.read_only:
+            log.warning('unable to remove tiles from read_only %s', self.cache_dir)
+            return False
         level_cache = self._get_level(level)
+        if level_cache is None:
+            return True
         if remove_all:
             level_cache.cleanup()
             os.unlink(level_cache.mbtile_file)
@@ -0,0 +1,264 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process LRU cache for encoded tiles in front of another tile cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, Optional
+
+from mapproxy.cache.base import TileCacheBase
+from mapproxy.cache.tile import Tile
+from mapproxy.image import ImageResult
+
+import logging
+log = logging.getLogger('mapproxy.cache.memory')
+
+
+class _MemoryTile(object):
+    __slots__ = ('data', 'image_opts', 'timestamp', 'created', 'metadata')
+
+    def __init__(self, data, image_opts, timestamp, created, metadata):
+        self.data = data
+        self.image_opts = image_opts
+        self.timestamp = timestamp
+        self.created = created
+        # True if the tile was loaded with_metadata
+        self.metadata = metadata
+
+
+def _dimensions_key(dimensions):
+    if not dimensions:
+        return None
+    return tuple(sorted((k, str(v)) for k, v in dimensions.items()))
+
+
+class MemoryTileCache(TileCacheBase):
+    """
+    Keeps the encoded data of recently used tiles in memory and only
+    accesses the wrapped `cache` for tiles that are not in memory.
+
+    Tiles are evicted in least-recently-used order when the total size
+    of all tiles exceeds `max_bytes`, and they are reloaded from the
+    wrapped cache after `ttl` seconds. Tiles older than the
+    `expire_timestamp` (set by the `TileManager` for ``refresh_before``)
+    are not served from memory.
+
+    The tiles are kept per process. Tiles that are modified by other
+    processes (e.g. by ``mapproxy-seed``) are served from memory until
+    the `ttl` expires.
+    """
+
+    def __init__(self, cache: TileCacheBase, max_bytes=64 * 1024 * 1024, ttl=300):
+        super().__init__(cache.coverage)
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.supports_timestamp = cache.supports_timestamp
+        self.supports_dimensions = cache.supports_dimensions
+        self.expire_timestamp: Optional[Callable[[], Optional[float]]] = None
+        self._tiles: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        # lock_cache_id, cleanup, level_location, etc. of the wrapped cache
+        if name == 'cache':
+            raise AttributeError(name)
+        return getattr(self.cache, name)
+
+    def _get(self, tile: Tile, with_metadata=False, dimensions=None):
+        key = (tile.coord, _dimensions_key(dimensions))
+        max_timestamp = self.expire_timestamp() if self.expire_timestamp else None
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is None or (with_metadata and not entry.metadata):
+                self.misses += 1
+                return None
+            if (entry.created + self.ttl < time.time() or
+                    (max_timestamp is not None and entry.timestamp is not None and
+                     int(entry.timestamp) <= max_timestamp)):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, tile: Tile, with_metadata=False, dimensions=None, replace_result=False):
+        if tile.coord is None or tile.image_result is None:
+            return
+        image_opts = tile.image_result.image_opts
+        try:
+            buf = tile.image_result.as_buffer(seekable=True)
+            buf.seek(0)
+            data = buf.read()
+            buf.seek(0)
+        except Exception as ex:
+            log.warning('unable to keep tile %r in memory: %s', tile.coord, ex)
+            return
+        if replace_result:
+            # we already read the data, no need to keep the file open
+            tile.image_result.close_buffers()
+            tile.image_result = ImageResult(BytesIO(data), image_opts=image_opts)
+        if len(data) > self.max_bytes:
+            return
+        if tile.timestamp is None and self.expire_timestamp and self.expire_timestamp() is not None:
+            # timestamp is required to check if the tile expired
+            self.cache.load_tile_metadata(tile, dimensions=dimensions)
+
+        key = (tile.coord, _dimensions_key(dimensions))
+        entry = _MemoryTile(data, image_opts, tile.timestamp, time.time(),
+                            with_metadata or tile.timestamp is not None)
+        with self._lock:
+            self._remove(key)
+            self._tiles[key] = entry
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._tiles))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._tiles.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.data)
+
+    def _invalidate(self, tile: Tile, dimensions=None):
+        with self._lock:
+            self._remove((tile.coord, _dimensions_key(dimensions)))
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Return a dictionary with the hit/miss counters and the current size.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'tiles': len(self._tiles),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _load_from_memory(self, tile: Tile, with_metadata=False, dimensions=None) -> bool:
+        entry = self._get(tile, with_metadata=with_metadata, dimensions=dimensions)
+        if entry is None:
+            return False
+        tile.image_result = ImageResult(BytesIO(entry.data), image_opts=entry.image_opts)
+        tile.timestamp = entry.timestamp
+        tile.size = len(entry.data)
+        return True
+
+    def load_tile(self, tile: Tile, with_metadata=False, dimensions=None) -> bool:
+        if not tile.is_missing():
+            return True
+        if self._load_from_memory(tile, with_metadata=with_metadata, dimensions=dimensions):
+            return True
+        if not self.cache.load_tile(tile, with_metadata=with_metadata, dimensions=dimensions):
+            return False
+        self._put(tile, with_metadata=with_metadata, dimensions=dimensions, replace_result=True)
+        return True
+
+    def load_tiles(self, tiles, with_metadata=False, dimensions=None) -> bool:
+        missing = []
+        for tile in tiles:
+            if tile.is_missing() and not self._load_from_memory(tile, with_metadata=with_metadata,
+                                                                dimensions=dimensions):
+                missing.append(tile)
+
+        if not missing:
+            return True
+
+        # tiles loaded from memory are skipped by the wrapped cache
+        result = self.cache.load_tiles(tiles, with_metadata=with_metadata, dimensions=dimensions)
+        for tile in missing:
+            if not tile.is_missing():
+                self._put(tile, with_metadata=with_metadata, dimensions=dimensions, replace_result=True)
+        return result
+
+    def store_tile(self, tile: Tile, dimensions=None):
+        self._invalidate(tile, dimensions=dimensions)
+        return self.cache.store_tile(tile, dimensions=dimensions)
+
+    def store_tiles(self, tiles, dimensions=None):
+        for tile in tiles:
+            self._invalidate(tile, dimensions=dimensions)
+        return self.cache.store_tiles(tiles, dimensions=dimensions)
+
+    def remove_tile(self, tile: Tile, dimensions=None):
+        self._invalidate(tile, dimensions=dimensions)
+        return self.cache.remove_tile(tile, dimensions=dimensions)
+
+    def remove_tiles(self, tiles, dimensions=None):
+        for tile in tiles:
+            self._invalidate(tile, dimensions=dimensions)
+        return self.cache.remove_tiles(tiles, dimensions=dimensions)
+
+    def is_cached(self, tile: Tile, dimensions=None) -> bool:
+        if not tile.is_missing():
+            return True
+        if self._get(tile, dimensions=dimensions) is not None:
+            return True
+        return self.cache.is_cached(tile, dimensions=dimensions)
+
+    def are_cached(self, tiles, dimensions=None):
+        result = []
+        query_tiles = []
+        for tile in tiles:
+            cached = not tile.is_missing() or self._get(tile, dimensions=dimensions) is not None
+            if not cached:
+                query_tiles.append(tile)
+            result.append(cached)
+        if query_tiles:
+            query_result = iter(self.cache.are_cached(query_tiles, dimensions=dimensions))
+            result = [cached or next(query_result) for cached in result]
+        return result
+
+    def load_tile_metadata(self, tile: Tile, dimensions=None):
+        if tile.timestamp:
+            return
+        self.cache.load_tile_metadata(tile, dimensions=dimensions)
+        self._update_timestamp(tile, dimensions=dimensions)
+
+    def load_tiles_metadata(self, tiles, dimensions=None):
+        tiles = [t for t in tiles if not t.timestamp]
+        if not tiles:
+            return
+        self.cache.load_tiles_metadata(tiles, dimensions=dimensions)
+        for tile in tiles:
+            self._update_timestamp(tile, dimensions=dimensions)
+
+    def _update_timestamp(self, tile: Tile, dimensions=None):
+        with self._lock:
+            entry = self._tiles.get((tile.coord, _dimensions_key(dimensions)))
+            if entry is not None and entry.timestamp is None:
+                entry.timestamp = tile.timestamp
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.cache)
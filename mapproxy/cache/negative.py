@@ -0,0 +1,168 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Negative cache for tiles without any source data (``negative_cache``).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from mapproxy.util.fs import ensure_directory
+from mapproxy.util.sqlite3 import sqlite3
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _dimensions_key(dimensions):
+    if not dimensions:
+        return ''
+    return ','.join('%s=%s' % (k, v) for k, v in sorted(dimensions.items()))
+
+
+class NegativeTileCache(object):
+    """
+    Remembers tiles where all sources returned no image for `ttl` seconds.
+
+    Entries are kept in memory (up to `max_entries`, least recently added
+    entries are removed first) and optionally in an SQLite file, so that
+    they are shared by all processes and survive restarts. Expired entries
+    are removed from the file when new entries are added.
+    """
+
+    def __init__(self, ttl=3600, max_entries=100000, filename=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.filename = filename
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_initialized = False
+
+    def add(self, tile_coords, dimensions=None):
+        """
+        Mark all `tile_coords` as empty.
+        """
+        dims = _dimensions_key(dimensions)
+        expires = time.time() + self.ttl
+        keys = [(coord, dims) for coord in tile_coords if coord is not None]
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._entries[key] = expires
+            self._trim_entries()
+        if self.filename and keys:
+            try:
+                with self._db() as db:
+                    db.execute("DELETE FROM negative_tiles WHERE expires < ?", (time.time(), ))
+                    db.executemany(
+                        "INSERT OR REPLACE INTO negative_tiles (level, x, y, dimensions, expires)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        [(z, x, y, dims, expires) for (x, y, z), dims in keys],
+                    )
+            except sqlite3.Error as ex:
+                log.warning('unable to store negative cache entries in %s: %s', self.filename, ex)
+
+    def contains(self, tile_coords, dimensions=None):
+        """
+        Return a list with ``True`` for each of `tile_coords` that is known
+        to be empty.
+        """
+        dims = _dimensions_key(dimensions)
+        now = time.time()
+        result = []
+        missing = []
+        with self._lock:
+            for coord in tile_coords:
+                expires = self._entries.get((coord, dims))
+                if expires is not None and expires < now:
+                    del self._entries[(coord, dims)]
+                    expires = None
+                result.append(expires is not None)
+                if expires is None and coord is not None:
+                    missing.append(coord)
+
+        if self.filename and missing:
+            found = self._load_entries(missing, dims, now)
+            if found:
+                result = [r or coord in found for r, coord in zip(result, tile_coords)]
+        return result
+
+    def _load_entries(self, tile_coords, dims, now):
+        found = {}
+        try:
+            with self._db() as db:
+                for x, y, z in tile_coords:
+                    row = db.execute(
+                        "SELECT expires FROM negative_tiles"
+                        " WHERE level = ? AND x = ? AND y = ? AND dimensions = ? AND expires >= ?",
+                        (z, x, y, dims, now)).fetchone()
+                    if row:
+                        found[(x, y, z)] = row[0]
+        except sqlite3.Error as ex:
+            log.warning('unable to load negative cache entries from %s: %s', self.filename, ex)
+            return found
+        if found:
+            with self._lock:
+                for coord, expires in found.items():
+                    self._entries[(coord, dims)] = expires
+                self._trim_entries()
+        return found
+
+    def _trim_entries(self):
+        # requires the lock
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _initialize_db(self):
+        ensure_directory(self.filename)
+        db = sqlite3.connect(self.filename, timeout=30)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS negative_tiles (
+                level INTEGER,
+                x INTEGER,
+                y INTEGER,
+                dimensions TEXT,
+                expires REAL,
+                PRIMARY KEY (level, x, y, dimensions)
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS negative_tiles_expires ON negative_tiles (expires)")
+        db.commit()
+        db.close()
+        self._db_initialized = True
+
+    @contextmanager
+    def _db(self):
+        if not self._db_initialized:
+            self._initialize_db()
+        db = sqlite3.connect(self.filename, timeout=30)
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.filename:
+            with self._db() as db:
+                db.execute("DELETE FROM negative_tiles")
@@ -0,0 +1,137 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Background prefetch of neighbouring and child tiles (``prefetch``).
+"""
+
+import threading
+
+from mapproxy.cache.refresh import StaleTileRefresher
+from mapproxy.config import base_config
+from mapproxy.grid import GridError
+
+
+def prefetch_tile_coords(tile_mgr, tile_coord):
+    """
+    Return the (main) tile coords of the meta tiles next to the meta tile of
+    `tile_coord` and of the meta tiles covering `tile_coord` on the next
+    level. Tiles on the next level come first.
+    """
+    grid = tile_mgr.grid
+    meta_grid = tile_mgr.meta_grid
+    x, y, z = tile_coord
+
+    def main_tile(coord):
+        if meta_grid:
+            return meta_grid.main_tile(coord)
+        return coord
+
+    coords = []
+    if z + 1 < grid.levels:
+        try:
+            _, _, tiles = grid.get_affected_level_tiles(grid.tile_bbox(tile_coord), z + 1)
+        except GridError:
+            tiles = []
+        for coord in tiles:
+            if coord is not None:
+                coord = main_tile(coord)
+                if coord not in coords:
+                    coords.append(coord)
+
+    meta_size = meta_grid.meta_size if meta_grid else (1, 1)
+    x0, y0, _ = main_tile(tile_coord)
+    for dy in (0, -1, 1):
+        for dx in (0, -1, 1):
+            if dx == 0 and dy == 0:
+                continue
+            coord = grid.limit_tile((x0 + dx * meta_size[0], y0 + dy * meta_size[1], z))
+            if coord is not None:
+                coord = main_tile(coord)
+                if coord not in coords:
+                    coords.append(coord)
+    return coords
+
+
+class TilePrefetcher(StaleTileRefresher):
+    """
+    Process-wide pool of threads that create tiles next to requested tiles
+    in the background, so that the following requests of panning and
+    zooming clients are served from the cache.
+
+    Each tile manager (cache/grid) has at most `budget` meta tiles queued.
+    Prefetches that do not fit into the budget or queue are dropped.
+    """
+
+    thread_name = 'mapproxy-prefetch'
+    task_name = 'prefetch tile'
+    done_counter = 'prefetched'
+
+    def __init__(self, size=1, queue_size=256, budget=32):
+        StaleTileRefresher.__init__(self, size=size, queue_size=queue_size)
+        self.budget = budget
+        self._counters['cached'] = 0
+
+    def prefetch(self, tile_mgr, tile_coords, dimensions=None):
+        """
+        Queue the creation of the tiles around all `tile_coords`.
+        Returns immediately.
+        """
+        prefetch_coords = []
+        for tile_coord in tile_coords:
+            if tile_coord is None:
+                continue
+            for coord in prefetch_tile_coords(tile_mgr, tile_coord):
+                if coord not in prefetch_coords:
+                    prefetch_coords.append(coord)
+        if tile_mgr.negative_cache is not None and prefetch_coords:
+            known_empty = tile_mgr.negative_cache.contains(prefetch_coords, dimensions=dimensions)
+            prefetch_coords = [c for c, empty in zip(prefetch_coords, known_empty) if not empty]
+        if prefetch_coords:
+            self.refresh(tile_mgr, prefetch_coords, dimensions=dimensions)
+
+    def _accept(self, key):
+        tile_mgr_id = key[0]
+        return sum(1 for k in self._pending if k[0] == tile_mgr_id) < self.budget
+
+    def _create(self, tile_mgr, tile_coord, dimensions):
+        if tile_mgr.is_cached(tile_coord, dimensions=dimensions):
+            with self._lock:
+                self._counters['cached'] += 1
+            return False
+        return StaleTileRefresher._create(self, tile_mgr, tile_coord, dimensions)
+
+
+_tile_prefetcher = None
+_tile_prefetcher_lock = threading.Lock()
+
+
+def tile_prefetcher():
+    """
+    Return the process-wide `TilePrefetcher`. The prefetcher is created on
+    first use with the ``cache.prefetch_workers``, ``cache.prefetch_queue_size``
+    and ``cache.prefetch_budget`` options of the current `base_config`.
+    """
+    global _tile_prefetcher
+    if _tile_prefetcher is None:
+        with _tile_prefetcher_lock:
+            if _tile_prefetcher is None:
+                conf = base_config().get('cache', {})
+                _tile_prefetcher = TilePrefetcher(
+                    size=conf.get('prefetch_workers', 1),
+                    queue_size=conf.get('prefetch_queue_size', 256),
+                    budget=conf.get('prefetch_budget', 32),
+                )
+    return _tile_prefetcher
@@ -17,6 +17,7 @@ from __future__ import absolute_import
 
 import hashlib
 import datetime
+import re
 import time
 from io import BytesIO
 from typing import Optional, cast
@@ -26,6 +27,7 @@ from mapproxy.image import ImageResult
 from mapproxy.cache.base import (
     TileCacheBase,
     tile_buffer,
+    tile_content_hash,
 )
 from mapproxy.util.coverage import Coverage
 
@@ -39,10 +41,14 @@ import logging
 log = logging.getLogger(__name__)
 
 
+# value of tile keys that reference the data of a deduplicated tile
+REF_PREFIX = b'mapproxy-ref:'
+
+
 class RedisCache(TileCacheBase):
     def __init__(
             self, host, port, prefix, ttl=0, db=0, username=None, password=None, coverage: Optional[Coverage] = None,
-            ssl_certfile=None, ssl_keyfile=None, ssl_ca_certs=None):
+            ssl_certfile=None, ssl_keyfile=None, ssl_ca_certs=None, max_connections=None, deduplicate=False):
         super().__init__(coverage)
 
         if redis is None:
@@ -57,6 +63,7 @@ class RedisCache(TileCacheBase):
         md5 = hashlib.new('md5', (host + str(port) + prefix + str(db)).encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = 'redis-' + md5.hexdigest()
         self.ttl = ttl
+        self.deduplicate = deduplicate
         # Enable SSL only if certificate and key are provided (CA certificates are not mandatory, but if provided use
         # them)
         ssl_enabled = all([self.ssl_certfile, self.ssl_keyfile])
@@ -72,13 +79,41 @@ class RedisCache(TileCacheBase):
             ssl_certfile=ssl_certfile,
             ssl_keyfile=ssl_keyfile,
             ssl_ca_certs=ssl_ca_certs,
-            ssl=ssl_enabled
+            ssl=ssl_enabled,
+            max_connections=max_connections,
         )
 
     def _key(self, tile):
         x, y, z = tile.coord
         return self.prefix + '-%d-%d-%d' % (z, x, y)
 
+    def _blob_key(self, content_hash):
+        return self.prefix + '-blob-' + content_hash
+
+    def _set_tile_data(self, pipe, tile, data):
+        if not self.deduplicate:
+            pipe.set(self._key(tile), data, px=self._expire_ms())
+            return
+        # Store the data once under its hash and reference it from the tile key.
+        # Setting the data again resets the expire time, so it always outlives
+        # the references.
+        content_hash = tile_content_hash(data)
+        pipe.set(self._blob_key(content_hash), data, px=self._expire_ms())
+        pipe.set(self._key(tile), REF_PREFIX + content_hash.encode('ascii'), px=self._expire_ms())
+
+    def _resolve_refs(self, tiles_data):
+        """
+        Replace references to deduplicated data in `tiles_data` with the actual data.
+        """
+        refs = [i for i, data in enumerate(tiles_data) if data and data.startswith(REF_PREFIX)]
+        if not refs:
+            return tiles_data
+        tiles_data = list(tiles_data)
+        blob_keys = [self._blob_key(tiles_data[i][len(REF_PREFIX):].decode('ascii')) for i in refs]
+        for i, data in zip(refs, cast(list, self.r.mget(blob_keys))):
+            tiles_data[i] = data
+        return tiles_data
+
     def is_cached(self, tile: Tile, dimensions=None) -> bool:
         if tile.coord is None or tile.image_result:
             return True
@@ -95,9 +130,43 @@ class RedisCache(TileCacheBase):
             log.error('REDIS:exists_key error  %s' % e)
             return False
 
+    def _expire_ms(self):
+        if self.ttl:
+            # use ms expire times for unit-tests
+            return int(self.ttl * 1000)
+        return None
+
+    def are_cached(self, tiles, dimensions=None) -> list[bool]:
+        """
+        Return a list with the cached state of each tile.
+        Checks all missing tiles with a single pipelined request.
+        """
+        result = [True] * len(tiles)
+        idx = [i for i, tile in enumerate(tiles) if not (tile.coord is None or tile.image_result)]
+        if not idx:
+            return result
+
+        try:
+            pipe = self.r.pipeline(transaction=False)
+            for i in idx:
+                pipe.exists(self._key(tiles[i]))
+            for i, exists in zip(idx, pipe.execute()):
+                result[i] = bool(exists)
+        except redis.exceptions.ConnectionError as e:
+            log.error('Error during connection %s' % e)
+            for i in idx:
+                result[i] = False
+        except Exception as e:
+            log.error('REDIS:exists_key error  %s' % e)
+            for i in idx:
+                result[i] = False
+        return result
+
     def store_tile(self, tile: Tile, dimensions=None) -> bool:
         if tile.stored:
             return True
+        if self.deduplicate:
+            return self.store_tiles([tile], dimensions=dimensions)
         key = self._key(tile)
 
         with tile_buffer(tile) as buf:
@@ -106,7 +175,7 @@ class RedisCache(TileCacheBase):
         try:
             log.debug('store_key, key: %s' % key)
             # TODO: according to documentation set returns an Awaitable
-            r = cast(bool, self.r.set(key, data))
+            return cast(bool, self.r.set(key, data, px=self._expire_ms()))
         except redis.exceptions.ConnectionError as e:
             log.error('Error during connection %s' % e)
             return False
@@ -114,10 +183,32 @@ class RedisCache(TileCacheBase):
             log.error('REDIS:store_key error  %s' % e)
             return False
 
-        if self.ttl:
-            # use ms expire times for unit-tests
-            self.r.pexpire(key, int(self.ttl * 1000))
-        return r
+    def store_tiles(self, tiles, dimensions=None) -> bool:
+        """
+        Store all tiles with a single pipelined request.
+        """
+        pipe = self.r.pipeline(transaction=False)
+        num_tiles = 0
+        for tile in tiles:
+            if tile.stored or tile.coord is None:
+                continue
+            with tile_buffer(tile) as buf:
+                data = buf.read()
+            self._set_tile_data(pipe, tile, data)
+            num_tiles += 1
+
+        if not num_tiles:
+            return True
+
+        try:
+            log.debug('store_keys, %d keys' % num_tiles)
+            return all(pipe.execute())
+        except redis.exceptions.ConnectionError as e:
+            log.error('Error during connection %s' % e)
+            return False
+        except Exception as e:
+            log.error('REDIS:store_key error  %s' % e)
+            return False
 
     def load_tile_metadata(self, tile: Tile, dimensions=None):
         if tile.timestamp:
@@ -129,6 +220,23 @@ class RedisCache(TileCacheBase):
         tile.timestamp = time.mktime(datetime.datetime.now().timetuple()) - self.ttl - int(pipe_res[0])
         tile.size = pipe_res[1]
 
+    def load_tiles_metadata(self, tiles, dimensions=None):
+        """
+        Load the metadata of all tiles with a single pipelined request.
+        """
+        tiles = [t for t in tiles if not t.timestamp and t.coord is not None]
+        if not tiles:
+            return
+        pipe = self.r.pipeline(transaction=False)
+        for tile in tiles:
+            pipe.ttl(self._key(tile))
+            pipe.memory_usage(self._key(tile))
+        pipe_res = pipe.execute()
+        now = time.mktime(datetime.datetime.now().timetuple())
+        for i, tile in enumerate(tiles):
+            tile.timestamp = now - self.ttl - int(pipe_res[i * 2])
+            tile.size = pipe_res[i * 2 + 1]
+
     def load_tile(self, tile: Tile, with_metadata=False, dimensions=None) -> bool:
         if tile.image_result or tile.coord is None:
             return True
@@ -137,6 +245,8 @@ class RedisCache(TileCacheBase):
         try:
             log.debug('get_key, key: %s' % key)
             tile_data = self.r.get(key)
+            if self.deduplicate:
+                tile_data = self._resolve_refs([tile_data])[0]
             if tile_data:
                 # TODO: according to documentation get returns an Awaitable
                 tile.image_result = ImageResult(BytesIO(cast(bytes, tile_data)))
@@ -149,6 +259,34 @@ class RedisCache(TileCacheBase):
             log.error('REDIS:get_key error  %s' % e)
             return False
 
+    def load_tiles(self, tiles, with_metadata=False, dimensions=None) -> bool:
+        """
+        Load all missing tiles with a single MGET request.
+        """
+        missing_tiles = [t for t in tiles if not (t.image_result or t.coord is None)]
+        if not missing_tiles:
+            return True
+
+        try:
+            log.debug('get_keys, %d keys' % len(missing_tiles))
+            tiles_data = cast(list, self.r.mget([self._key(t) for t in missing_tiles]))
+            if self.deduplicate:
+                tiles_data = self._resolve_refs(tiles_data)
+        except redis.exceptions.ConnectionError as e:
+            log.error('Error during connection %s' % e)
+            return False
+        except Exception as e:
+            log.error('REDIS:get_key error  %s' % e)
+            return False
+
+        all_loaded = True
+        for tile, tile_data in zip(missing_tiles, tiles_data):
+            if tile_data:
+                tile.image_result = ImageResult(BytesIO(tile_data))
+            else:
+                all_loaded = False
+        return all_loaded
+
     def remove_tile(self, tile: Tile, dimensions=None):
         if tile.coord is None:
             return True
@@ -156,3 +294,45 @@ class RedisCache(TileCacheBase):
         key = self._key(tile)
         self.r.delete(key)
         return True
+
+    def remove_unreferenced_blobs(self, min_age=3600, dry_run=False):
+        """
+        Remove deduplicated tile data that is no longer referenced by any tile.
+
+        Data that was stored or loaded in the last `min_age` seconds is kept, as
+        it might be referenced by tiles that are stored concurrently.
+        Data with an unknown idle time (LFU ``maxmemory-policy``) is kept.
+        Returns the number of removed (or unreferenced for `dry_run`) blobs.
+        """
+        prefix = re.sub(r'([*?\[\]\\])', r'\\\1', self.prefix)
+
+        referenced = set()
+        tile_keys = list(self.r.scan_iter(match=prefix + '-[0-9]*', count=1000))
+        for i in range(0, len(tile_keys), 1000):
+            for data in cast(list, self.r.mget(tile_keys[i:i + 1000])):
+                if data and data.startswith(REF_PREFIX):
+                    referenced.add(self._blob_key(data[len(REF_PREFIX):].decode('ascii')).encode('utf-8'))
+
+        # check the blobs after the references, as stores set the blob before the reference
+        blob_keys = [k for k in self.r.scan_iter(match=prefix + '-blob-*', count=1000) if k not in referenced]
+        pipe = self.r.pipeline(transaction=False)
+        for key in blob_keys:
+            pipe.object('idletime', key)
+        idle_times = pipe.execute(raise_on_error=False) if blob_keys else []
+        unreferenced = []
+        unknown_idle = 0
+        for key, idle in zip(blob_keys, idle_times):
+            if isinstance(idle, Exception):
+                # OBJECT IDLETIME fails for LFU maxmemory policies. keep these
+                # blobs, they might have been stored after the references were checked
+                unknown_idle += 1
+            elif idle is not None and idle >= min_age:
+                unreferenced.append(key)
+        if unknown_idle:
+            log.warning('unable to get the idle time of %d unreferenced blobs of %s, keeping them'
+                        ' (OBJECT IDLETIME is not supported with LFU maxmemory-policy)' % (unknown_idle, self.prefix))
+
+        if not dry_run:
+            for i in range(0, len(unreferenced), 1000):
+                self.r.delete(*unreferenced[i:i + 1000])
+        return len(unreferenced)
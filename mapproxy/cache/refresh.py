@@ -0,0 +1,169 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Background refresh of stale tiles (``serve_stale``).
+"""
+
+import os
+import queue
+import threading
+
+from mapproxy.cache.tile import Tile
+from mapproxy.config import base_config, local_base_config
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class StaleTileRefresher(object):
+    """
+    Process-wide pool of threads that recreate stale tiles in the background.
+
+    Each meta tile is only queued once until its refresh is done. Refreshs
+    that do not fit into the queue are dropped, the tile is queued again
+    with the next request.
+    """
+
+    thread_name = 'mapproxy-refresh'
+    task_name = 'refresh stale tile'
+    done_counter = 'refreshed'
+
+    def __init__(self, size=2, queue_size=256):
+        self.size = size
+        self.queue_size = queue_size
+        self.task_queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._counters = {
+            'queued': 0,
+            'duplicate': 0,
+            'dropped': 0,
+            self.done_counter: 0,
+            'failed': 0,
+        }
+
+    def refresh(self, tile_mgr, tile_coords, dimensions=None):
+        """
+        Queue the recreation of the (meta) tiles of all `tile_coords`.
+        Returns immediately.
+        """
+        self._ensure_workers()
+        dims = tuple(sorted((k, str(v)) for k, v in dimensions.items())) if dimensions else None
+        conf = base_config()
+        for tile_coord in tile_coords:
+            main_coord = tile_coord
+            if tile_mgr.meta_grid:
+                main_coord = tile_mgr.meta_grid.main_tile(tile_coord)
+            key = (id(tile_mgr), main_coord, dims)
+            with self._lock:
+                if key in self._pending:
+                    self._counters['duplicate'] += 1
+                    continue
+                if not self._accept(key):
+                    self._counters['dropped'] += 1
+                    continue
+                try:
+                    self.task_queue.put_nowait((key, tile_mgr, tile_coord, dimensions, conf))
+                except queue.Full:
+                    self._counters['dropped'] += 1
+                    continue
+                self._pending.add(key)
+                self._counters['queued'] += 1
+
+    def _accept(self, key):
+        return True
+
+    def _ensure_workers(self):
+        if len(self._workers) >= self.size and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # we were forked, threads are gone
+                self._pid = os.getpid()
+                self._workers = []
+                self._pending = set()
+                self.task_queue = queue.Queue(maxsize=self.queue_size)
+            while len(self._workers) < self.size:
+                t = threading.Thread(target=self._work,
+                                     name='%s-%d' % (self.thread_name, len(self._workers)))
+                t.daemon = True
+                t.start()
+                self._workers.append(t)
+
+    def _work(self):
+        task_queue = self.task_queue
+        while True:
+            key, tile_mgr, tile_coord, dimensions, conf = task_queue.get()
+            try:
+                with local_base_config(conf):
+                    with tile_mgr.session():
+                        created = self._create(tile_mgr, tile_coord, dimensions)
+            except Exception as ex:
+                log.warning('unable to %s %s: %s', self.task_name, tile_coord, ex)
+                with self._lock:
+                    self._counters['failed'] += 1
+            else:
+                if created:
+                    with self._lock:
+                        self._counters[self.done_counter] += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+                task_queue.task_done()
+
+    def _create(self, tile_mgr, tile_coord, dimensions):
+        tile_mgr.creator(dimensions=dimensions).create_tiles([Tile(tile_coord)])
+        return True
+
+    def join(self):
+        """
+        Wait till all queued refreshs are done.
+        """
+        self.task_queue.join()
+
+    def stats(self):
+        """
+        Return a dictionary with the number of pending refreshs and counters
+        since startup.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        return stats
+
+
+_stale_refresher = None
+_stale_refresher_lock = threading.Lock()
+
+
+def stale_refresher():
+    """
+    Return the process-wide `StaleTileRefresher`. The refresher is created on
+    first use with the ``cache.serve_stale_workers`` and
+    ``cache.serve_stale_queue_size`` options of the current `base_config`.
+    """
+    global _stale_refresher
+    if _stale_refresher is None:
+        with _stale_refresher_lock:
+            if _stale_refresher is None:
+                conf = base_config().get('cache', {})
+                _stale_refresher = StaleTileRefresher(
+                    size=conf.get('serve_stale_workers', 2),
+                    queue_size=conf.get('serve_stale_queue_size', 256),
+                )
+    return _stale_refresher
@@ -16,16 +16,19 @@
 
 import calendar
 import hashlib
+import os
 import sys
 import threading
+import time
 from typing import Optional
 
 from mapproxy.cache.tile import TileCollection
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageResult
 from mapproxy.cache import path
-from mapproxy.cache.base import tile_buffer, TileCacheBase
+from mapproxy.cache.base import tile_buffer, tile_content_hash, TileCacheBase
 from mapproxy.util import async_
+from mapproxy.util.lru import LRU
 from mapproxy.util.py import reraise_exception
 from urllib import request as urllib2
 
@@ -34,6 +37,7 @@ from mapproxy.util.coverage import Coverage
 try:
     import boto3
     import botocore
+    import botocore.config
 except ImportError:
     boto3 = None
 
@@ -53,16 +57,30 @@ def s3_session(profile_name=None):
     return _s3_sessions_cache.sessions[profile_name]
 
 
+# metadata of tile objects that reference deduplicated data
+REF_METADATA = 'mapproxy-ref'
+# metadata with the size of the referenced data
+SIZE_METADATA = 'mapproxy-size'
+
+
 class S3ConnectionError(Exception):
     pass
 
 
 class S3Cache(TileCacheBase):
 
+    # min. number of tiles with the same key prefix to list the prefix in
+    # are_cached, instead of checking each tile
+    list_min_tiles = 32
+
+    # seconds after which deduplicated data is uploaded again, even if this
+    # process already stored it, see remove_unreferenced_blobs
+    blob_reupload_interval = 600
+
     def __init__(self, base_path, file_ext, directory_layout='tms',
                  bucket_name='mapproxy', profile_name=None, region_name=None, endpoint_url=None,
-                 _concurrent_writer=4, access_control_list=None, coverage: Optional[Coverage] = None,
-                 use_http_get=False):
+                 _concurrent_writer=4, _concurrent_reader=4, access_control_list=None,
+                 coverage: Optional[Coverage] = None, use_http_get=False, deduplicate=False, max_connections=None):
         super().__init__(coverage)
         md5 = hashlib.new('md5', base_path.encode('utf-8') + bucket_name.encode('utf-8'), usedforsecurity=False)
         self.lock_cache_id = md5.hexdigest()
@@ -72,6 +90,16 @@ class S3Cache(TileCacheBase):
         self.endpoint_url = endpoint_url
         self.access_control_list = access_control_list
         self.use_http_get = use_http_get
+        self.deduplicate = deduplicate
+        # keys of deduplicated tile data this process already stored, with the store time
+        self._stored_blobs = LRU(1024)
+        self._stored_blobs_lock = threading.Lock()
+        self.max_connections = max_connections
+        # (pid, client) of the shared client, see conn()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._concurrent_writer = _concurrent_writer
+        self._concurrent_reader = _concurrent_reader
 
         try:
             self.bucket = self.conn().head_bucket(Bucket=bucket_name)
@@ -88,25 +116,53 @@ class S3Cache(TileCacheBase):
 
         self.base_path = base_path
         self.file_ext = file_ext
-        self._concurrent_writer = _concurrent_writer
 
         self._tile_location, _ = path.location_funcs(layout=directory_layout)
 
     def get_bucket_url(self, tile):
-        return f"https://{self.bucket_name}.s3.{self.region_name}.amazonaws.com/{self.tile_key(tile)}"
+        return self._key_url(self.tile_key(tile))
+
+    def _key_url(self, key):
+        return f"https://{self.bucket_name}.s3.{self.region_name}.amazonaws.com/{key}"
 
     def tile_key(self, tile):
         return self._tile_location(tile, self.base_path, self.file_ext).lstrip('/')
 
+    def blob_key(self, content_hash):
+        """
+        Key of the deduplicated tile data with `content_hash`.
+        """
+        return '%s%s/%s.%s' % (self._blob_prefix(), content_hash[:2], content_hash, self.file_ext)
+
+    def _blob_prefix(self):
+        return '%s/blobs/' % self.base_path.strip('/')
+
     def conn(self):
+        """
+        Return the S3 client of this cache. The client is thread-safe and
+        created once for each process, as creating clients is expensive.
+        """
         if boto3 is None:
             raise ImportError("S3 Cache requires 'boto3' package.")
 
-        try:
-            return s3_session(self.profile_name).client(
-                "s3", region_name=self.region_name, endpoint_url=self.endpoint_url)
-        except Exception as e:
-            raise S3ConnectionError('Error during connection %s' % e)
+        client = self._client
+        if client is not None and client[0] == os.getpid():
+            return client[1]
+
+        with self._client_lock:
+            # create a new client after fork (e.g. by the seeder), as the
+            # connection pool can not be shared between processes
+            if self._client is None or self._client[0] != os.getpid():
+                config = None
+                if self.max_connections:
+                    config = botocore.config.Config(max_pool_connections=self.max_connections)
+                try:
+                    client = s3_session(self.profile_name).client(
+                        "s3", region_name=self.region_name, endpoint_url=self.endpoint_url, config=config)
+                except Exception as e:
+                    raise S3ConnectionError('Error during connection %s' % e)
+                self._client = (os.getpid(), client)
+            return self._client[1]
 
     def load_tile_metadata(self, tile: Tile, dimensions=None):
         if tile.timestamp:
@@ -118,6 +174,11 @@ class S3Cache(TileCacheBase):
             tile.timestamp = calendar.timegm(response['LastModified'].timetuple())
         if 'ContentLength' in response:
             tile.size = response['ContentLength']
+        metadata = response.get('Metadata') or {}
+        if REF_METADATA in metadata:
+            # size of the referenced data, unknown for references without size
+            size = metadata.get(SIZE_METADATA)
+            tile.size = int(size) if size else None
 
     def is_cached(self, tile: Tile, dimensions=None) -> bool:
         if tile.is_missing():
@@ -142,9 +203,61 @@ class S3Cache(TileCacheBase):
 
         return True
 
+    def are_cached(self, tiles, dimensions=None):
+        """
+        Check all tiles with one ``ListObjectsV2`` request per key prefix
+        (directory) instead of one ``HeadObject`` request per tile, if the
+        prefix contains many of the requested tiles (e.g. while seeding).
+        """
+        if self.use_http_get:
+            return [self.is_cached(t, dimensions=dimensions) for t in tiles]
+
+        result = [True] * len(tiles)
+        prefixes: dict[str, list[tuple[int, str, Tile]]] = {}
+        for i, tile in enumerate(tiles):
+            if tile.coord is not None and tile.is_missing():
+                key = self.tile_key(tile)
+                prefixes.setdefault(key.rpartition('/')[0] + '/', []).append((i, key, tile))
+
+        for prefix, entries in prefixes.items():
+            if len(entries) < self.list_min_tiles:
+                for i, _, tile in entries:
+                    result[i] = self.is_cached(tile, dimensions=dimensions)
+                continue
+            for i, found in self._list_cached(prefix, entries):
+                result[i] = found
+        return result
+
+    def _list_cached(self, prefix, entries):
+        wanted = dict((key, (i, tile)) for i, key, tile in entries)
+        keys = sorted(wanted)
+        found = set()
+        paginator = self.conn().get_paginator('list_objects_v2')
+        # only list the keys between the first and last requested key
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/',
+                                   StartAfter=keys[0][:-1])
+        for page in pages:
+            for obj in page.get('Contents', []):
+                if obj['Key'] not in wanted:
+                    continue
+                found.add(obj['Key'])
+                _, tile = wanted[obj['Key']]
+                tile.timestamp = calendar.timegm(obj['LastModified'].timetuple())
+                if obj['Size'] or not self.deduplicate:
+                    tile.size = obj['Size']
+                # else: the size of deduplicated data is only in the
+                # metadata, it is set when the tile is loaded
+            contents = page.get('Contents')
+            if len(found) == len(wanted) or not contents or contents[-1]['Key'] >= keys[-1]:
+                break
+        return [(i, key in found) for key, (i, _) in wanted.items()]
+
     def load_tiles(self, tiles: TileCollection, with_metadata=True, dimensions=None) -> bool:
-        p = async_.Pool(min(4, len(tiles)))
-        return all(p.map(self.load_tile, tiles))
+        missing_tiles = [t for t in tiles if t.is_missing()]
+        if not missing_tiles:
+            return True
+        p = async_.Pool(min(self._concurrent_reader, len(missing_tiles)))
+        return all(p.map(self.load_tile, missing_tiles))
 
     def load_tile(self, tile: Tile, with_metadata=True, dimensions=None) -> bool:
         if not tile.is_missing():
@@ -156,7 +269,11 @@ class S3Cache(TileCacheBase):
         if self.use_http_get:
             try:
                 req = urllib2.Request(self.get_bucket_url(tile))
-                tile.image_result = ImageResult(urllib2.urlopen(req))
+                response = urllib2.urlopen(req)
+                ref = response.info().get('x-amz-meta-' + REF_METADATA)
+                if ref:
+                    response = urllib2.urlopen(urllib2.Request(self._key_url(ref)))
+                tile.image_result = ImageResult(response)
             except urllib2.HTTPError as e:
                 if e.code == 403:
                     return False
@@ -165,6 +282,10 @@ class S3Cache(TileCacheBase):
             try:
                 r = self.conn().get_object(Bucket=self.bucket_name, Key=key)
                 self._set_metadata(r, tile)
+                ref = r.get('Metadata', {}).get(REF_METADATA)
+                if ref:
+                    r = self.conn().get_object(Bucket=self.bucket_name, Key=ref)
+                    tile.size = r['ContentLength']
                 tile.image_result = ImageResult(r['Body'])
             except botocore.exceptions.ClientError as e:
                 # moto get_object can return Error wrapped in Errors...
@@ -180,6 +301,20 @@ class S3Cache(TileCacheBase):
         log.debug('remove_tile, key: %s' % key)
         self.conn().delete_object(Bucket=self.bucket_name, Key=key)
 
+    def remove_tiles(self, tiles, dimensions=None):
+        """
+        Remove all tiles with ``DeleteObjects`` requests of up to 1000 keys.
+        """
+        keys = [self.tile_key(t) for t in tiles if t.coord is not None]
+        for i in range(0, len(keys), 1000):
+            log.debug('remove_tiles, %d keys' % len(keys[i:i + 1000]))
+            r = self.conn().delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]], 'Quiet': True},
+            )
+            for error in r.get('Errors', []):
+                log.warning('unable to remove %s: %s' % (error.get('Key'), error.get('Message')))
+
     def store_tiles(self, tiles, dimensions=None):
         p = async_.Pool(min(self._concurrent_writer, len(tiles)))
         p.map(self.store_tile, tiles)
@@ -197,12 +332,89 @@ class S3Cache(TileCacheBase):
         if self.access_control_list:
             extra_args['ACL'] = self.access_control_list
         with tile_buffer(tile) as buf:
+            if self.deduplicate:
+                # store an empty object that references the data
+                data = buf.read()
+                blob_key = self._store_blob(data, extra_args)
+                self.conn().put_object(
+                    Bucket=self.bucket_name, Key=key, Body=b'',
+                    Metadata={REF_METADATA: blob_key, SIZE_METADATA: str(len(data))}, **extra_args)
+                return
             self.conn().upload_fileobj(
                 NopCloser(buf),  # upload_fileobj closes buf, wrap in NopCloser
                 self.bucket_name,
                 key,
                 ExtraArgs=extra_args)
 
+    def _store_blob(self, data, extra_args):
+        """
+        Store `data` once under its content hash and return the key.
+        """
+        blob_key = self.blob_key(tile_content_hash(data))
+        with self._stored_blobs_lock:
+            if time.time() - self._stored_blobs.get(blob_key, 0) < self.blob_reupload_interval:
+                return blob_key
+        self.conn().put_object(Bucket=self.bucket_name, Key=blob_key, Body=data, **extra_args)
+        with self._stored_blobs_lock:
+            self._stored_blobs[blob_key] = time.time()
+        return blob_key
+
+    def remove_unreferenced_blobs(self, min_age=3600, dry_run=False):
+        """
+        Remove deduplicated tile data that is no longer referenced by any tile.
+        Requires one ``HeadObject`` request for each deduplicated tile.
+
+        Data that was stored in the last `min_age` seconds is kept, as it
+        might be referenced by tiles that are stored concurrently.
+        Returns the number of removed (or unreferenced for `dry_run`) blobs.
+        """
+        started = time.time()
+        blob_prefix = self._blob_prefix()
+        tiles_prefix = blob_prefix[:-len('blobs/')]
+        paginator = self.conn().get_paginator('list_objects_v2')
+
+        ref_keys = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=tiles_prefix):
+            for obj in page.get('Contents', []):
+                if obj['Size'] == 0 and not obj['Key'].startswith(blob_prefix):
+                    ref_keys.append(obj['Key'])
+
+        def ref(key):
+            try:
+                r = self.conn().head_object(Bucket=self.bucket_name, Key=key)
+            except botocore.exceptions.ClientError as e:
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    return None
+                raise
+            return r.get('Metadata', {}).get(REF_METADATA)
+
+        referenced = set()
+        if ref_keys:
+            p = async_.Pool(min(self._concurrent_reader, len(ref_keys)))
+            referenced.update(p.map(ref, ref_keys))
+
+        # list blobs after the references, so that blobs that were stored
+        # again in the meantime have a new modification time
+        unreferenced = []
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=blob_prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'] in referenced:
+                    continue
+                if calendar.timegm(obj['LastModified'].timetuple()) > started - min_age:
+                    continue
+                unreferenced.append(obj['Key'])
+
+        if not dry_run:
+            for i in range(0, len(unreferenced), 1000):
+                log.debug('remove_unreferenced_blobs, %d keys' % len(unreferenced[i:i + 1000]))
+                r = self.conn().delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in unreferenced[i:i + 1000]], 'Quiet': True},
+                )
+                for error in r.get('Errors', []):
+                    log.warning('unable to remove %s: %s' % (error.get('Key'), error.get('Message')))
+        return len(unreferenced)
+
 
 class NopCloser(object):
     def __init__(self, wrapped):
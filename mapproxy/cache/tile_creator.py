@@ -1,11 +1,13 @@
 import sys
+from io import BytesIO
 from typing import Optional, Callable, TypeVar, Union, TYPE_CHECKING
 
+from mapproxy.cache.dummy import DummyCache
 from mapproxy.cache.tile import TileCollection
 from mapproxy.grid import TileCoord
 from mapproxy.grid.meta_grid import MetaTile
 from mapproxy.cache.tile import Tile
-from mapproxy.image import BaseImageResult
+from mapproxy.image import BaseImageResult, ImageResult
 from mapproxy.image.merge import merge_images
 from mapproxy.image.tile import TileSplitter
 from mapproxy.layer import BlankImageError
@@ -14,6 +16,7 @@ from mapproxy.query import MapQuery
 from mapproxy.source import SourceError
 from mapproxy.util import async_
 from mapproxy.util.coverage import Coverage
+from mapproxy.util.lock import SingleFlight
 from mapproxy.util.py import reraise_exception, reraise
 if TYPE_CHECKING:
     from mapproxy.cache.tile_manager import TileManager
@@ -21,6 +24,9 @@ if TYPE_CHECKING:
 # TypeVar for _create_threaded method
 TTile = TypeVar('TTile', bound=Union[Tile, MetaTile])
 
+# coalesces concurrent requests for the same meta tile within this process
+meta_tile_flights = SingleFlight()
+
 
 class TileCreator:
     def __init__(self, tile_mgr: 'TileManager', dimensions=None, image_merger=None, bulk_meta_tiles=False):
@@ -100,6 +106,9 @@ class TileCreator:
                         self.cache.load_tile(tile)
                     else:
                         raise reraise_exception(e, sys.exc_info())
+                else:
+                    if not image_result:
+                        self._mark_empty([tile.coord])
                 if not image_result:
                     return []
                 if image_result.authorize_stale and self.is_stale(tile):
@@ -120,6 +129,13 @@ class TileCreator:
                 self.cache.load_tile(tile)
         return [tile]
 
+    def _mark_empty(self, tile_coords):
+        """
+        Add `tile_coords` without any source image to the negative cache.
+        """
+        if self.tile_mgr.negative_cache is not None:
+            self.tile_mgr.negative_cache.add(tile_coords, dimensions=self.dimensions)
+
     def _query_sources(self, query: MapQuery) -> Optional[BaseImageResult]:
         """
         Query all sources and return the results as a single ImageResult.
@@ -168,11 +184,25 @@ class TileCreator:
             created_tiles.extend(self._create_meta_tile(meta_tile))
         return created_tiles
 
+    def _meta_tile_key(self, meta_tile: MetaTile):
+        dimensions = None
+        if self.dimensions:
+            dimensions = tuple(sorted((k, str(v)) for k, v in self.dimensions.items()))
+        return (id(self.cache), tuple(meta_tile.tiles), dimensions)
+
     def _create_meta_tile(self, meta_tile: MetaTile) -> list[Tile]:
         """
         _create_meta_tile queries a single meta tile and splits it into
-        tiles.
+        tiles. Concurrent calls for the same meta tile wait for the first
+        call and return copies of its tiles.
         """
+        return meta_tile_flights.call(
+            self._meta_tile_key(meta_tile),
+            lambda: self._create_meta_tile_locked(meta_tile),
+            freeze_tiles, thaw_tiles,
+        )
+
+    def _create_meta_tile_locked(self, meta_tile: MetaTile) -> list[Tile]:
         tile_size = self.grid.tile_size
         query = MapQuery(meta_tile.bbox, meta_tile.size, self.grid.srs, self.tile_mgr.request_format,
                          dimensions=self.dimensions)
@@ -181,11 +211,13 @@ class TileCreator:
             if not all(self.is_cached(t, dimensions=self.dimensions) for t in meta_tile.tiles if t is not None):
                 meta_tile_image = self._query_sources(query)
                 if not meta_tile_image:
+                    self._mark_empty(meta_tile.tiles)
                     return []
                 splitted_tiles = split_meta_tiles(meta_tile_image, meta_tile.tile_patterns,
-                                                  tile_size, self.tile_mgr.image_opts)
+                                                  tile_size, self.tile_mgr.image_opts, quantize=True)
                 splitted_tiles = [self.tile_mgr.apply_tile_filter(t) for t in splitted_tiles]
                 if meta_tile_image.cacheable:
+                    self._encode_tiles(splitted_tiles)
                     self.cache.store_tiles(splitted_tiles, dimensions=self.dimensions)
                 return splitted_tiles
             # else
@@ -193,11 +225,35 @@ class TileCreator:
         self.cache.load_tiles(tiles, dimensions=self.dimensions)
         return tiles.tiles
 
+    def _encode_tiles(self, tiles: list[Tile]):
+        """
+        _encode_tiles encodes the images of all `tiles` before they are stored
+        (using concurrent_tile_encoders). Pillow releases the GIL while encoding.
+        """
+        concurrency = self.tile_mgr.concurrent_tile_encoders
+        if concurrency < 2 or isinstance(self.cache, DummyCache):
+            return
+        tiles = [t for t in tiles if t.image_result is not None and not t.stored]
+        if len(tiles) < 2:
+            return
+
+        def encode(tile):
+            tile.image_result.as_buffer(seekable=True)
+
+        async_.Pool(min(concurrency, len(tiles))).map(encode, tiles)
+
     def _create_bulk_meta_tile(self, meta_tile):
         """
         _create_bulk_meta_tile queries each tile of the meta tile in parallel
         (using concurrent_tile_creators).
         """
+        return meta_tile_flights.call(
+            self._meta_tile_key(meta_tile),
+            lambda: self._create_bulk_meta_tile_locked(meta_tile),
+            freeze_tiles, thaw_tiles,
+        )
+
+    def _create_bulk_meta_tile_locked(self, meta_tile):
         tile_size = self.grid.tile_size
         main_tile = Tile(meta_tile.main_tile_coord)
         with self.tile_mgr.lock(main_tile):
@@ -211,6 +267,7 @@ class TileCreator:
                             dimensions=self.dimensions)
                         tile_image = self._query_sources(query)
                         if tile_image is None:
+                            self._mark_empty([coord])
                             return None
 
                         if self.tile_mgr.image_opts != tile_image.image_opts:
@@ -249,13 +306,45 @@ class TileCreator:
         return tile_collection
 
 
+def freeze_tiles(tiles) -> list:
+    """
+    Return the encoded data of all `tiles`, for `thaw_tiles`.
+    """
+    frozen = []
+    for tile in tiles:
+        data = None
+        image_opts = None
+        if tile.image_result is not None:
+            image_opts = tile.image_result.image_opts
+            buf = tile.image_result.as_buffer(seekable=True)
+            buf.seek(0)
+            data = buf.read()
+            buf.seek(0)
+        frozen.append((tile.coord, data, image_opts, tile.cacheable))
+    return frozen
+
+
+def thaw_tiles(frozen: list) -> list[Tile]:
+    """
+    Return new tiles from the output of `freeze_tiles`.
+    """
+    tiles = []
+    for coord, data, image_opts, cacheable in frozen:
+        tile = Tile(coord, cacheable=cacheable)
+        if data is not None:
+            tile.image_result = ImageResult(BytesIO(data), image_opts=image_opts)
+        tiles.append(tile)
+    return tiles
+
+
 def split_meta_tiles(meta_tile: BaseImageResult, tiles: list[tuple[Optional[TileCoord], tuple[int, int]]],
-                     tile_size: tuple[int, int], image_opts):
+                     tile_size: tuple[int, int], image_opts, quantize=False):
+    """
+    Split `meta_tile` into `tiles`. With `quantize`, paletted tiles are
+    quantized once for the whole meta tile.
+    """
     try:
-        # TODO png8
-        # if not self.transparent and format == 'png':
-        #     format = 'png8'
-        splitter = TileSplitter(meta_tile, image_opts)
+        splitter = TileSplitter(meta_tile, image_opts, quantize=quantize)
     except IOError:
         # TODO
         raise
@@ -7,6 +7,9 @@ from mapproxy.image import BaseImageResult
 from mapproxy.grid import TileCoord
 from mapproxy.image import BlankImageResult
 from mapproxy.cache.base import TileCacheBase
+from mapproxy.cache.memory import MemoryTileCache
+from mapproxy.cache.prefetch import tile_prefetcher
+from mapproxy.cache.refresh import stale_refresher
 from mapproxy.cache.tile import Tile, TileCollection
 from mapproxy.grid.meta_grid import MetaGrid
 from mapproxy.grid.tile_grid import TileGrid
@@ -36,7 +39,8 @@ class TileManager:
     def __init__(self, grid: TileGrid, cache: TileCacheBase, sources: list[MapLayer], format, locker, image_opts=None,
                  request_format=None, meta_buffer=None, meta_size=None, minimize_meta_requests=False, identifier=None,
                  pre_store_filter=None, concurrent_tile_creators=1, tile_creator_class=None,
-                 bulk_meta_tiles=False, rescale_tiles=0, cache_rescaled_tiles=False, dimensions=None
+                 bulk_meta_tiles=False, rescale_tiles=0, cache_rescaled_tiles=False, dimensions=None,
+                 concurrent_tile_encoders=1, serve_stale=False, negative_cache=None, prefetch=False,
                  ):
         self.grid = grid
         self.cache = cache
@@ -52,12 +56,20 @@ class TileManager:
         self._refresh_before: dict[str, Any] = {}
         self.pre_store_filter = pre_store_filter or []
         self.concurrent_tile_creators = concurrent_tile_creators
+        self.concurrent_tile_encoders = concurrent_tile_encoders
+        self.serve_stale = serve_stale
+        self.negative_cache = negative_cache
+        self.prefetch = prefetch
         self.tile_creator_class = tile_creator_class or TileCreator
         self.dimensions = dimensions
 
         self.rescale_tiles = rescale_tiles
         self.cache_rescaled_tiles = cache_rescaled_tiles
 
+        if isinstance(cache, MemoryTileCache):
+            # do not serve tiles from memory that are expired for this manager
+            cache.expire_timestamp = self.expire_timestamp
+
         if meta_buffer or (meta_size and not meta_size == [1, 1]):
             if all(source.supports_meta_tiles for source in sources):
                 self.meta_grid = MetaGrid(grid, meta_size=meta_size, meta_buffer=meta_buffer)
@@ -86,12 +98,18 @@ class TileManager:
         if hasattr(self.cache, 'cleanup'):
             self.cache.cleanup()
 
-    def load_tile_coord(self, tile_coord: TileCoord, dimensions=None, with_metadata=False) -> Tile:
+    def load_tile_coord(self, tile_coord: TileCoord, dimensions=None, with_metadata=False, prefetch=False) -> Tile:
         return self.load_tile_coords(
-            [tile_coord], dimensions=dimensions, with_metadata=with_metadata,
+            [tile_coord], dimensions=dimensions, with_metadata=with_metadata, prefetch=prefetch,
         )[0]
 
-    def load_tile_coords(self, tile_coords: list[TileCoord], dimensions=None, with_metadata=False) -> TileCollection:
+    def load_tile_coords(self, tile_coords: list[TileCoord], dimensions=None, with_metadata=False,
+                         prefetch=False) -> TileCollection:
+        """
+        Load all tiles from the cache and create missing tiles. With `prefetch`,
+        the tiles around missing tiles are created in the background if the
+        ``prefetch`` option is enabled.
+        """
         tiles = TileCollection(tile_coords)
         rescale_till_zoom = 0
         if self.rescale_tiles:
@@ -119,6 +137,7 @@ class TileManager:
         tiles = self._load_tile_coords(
             tiles, dimensions=dimensions, with_metadata=with_metadata,
             rescale_till_zoom=rescale_till_zoom, rescaled_tiles={},
+            prefetch=prefetch and self.prefetch,
         )
 
         for t in tiles.tiles:
@@ -137,18 +156,27 @@ class TileManager:
                 t.image_result = None
         return tiles
 
-    def _is_tile_missing(self, tile, cache_only, dimensions=None):
-        if tile.coord is None:
-            return False
-        if cache_only:
-            # in cache_only mode, we already fetched the tile from cache
-            return tile.is_missing()
-        else:
-            # missing or staled
-            return not self.is_cached(tile, dimensions=dimensions)
+    def load_tile_coord_metadata(self, tile_coord: TileCoord, dimensions=None) -> Optional[Tile]:
+        """
+        Return the tile with the timestamp and size from the cache, without
+        loading the tile data. Returns ``None`` if the tile is not cached,
+        is expired or if the cache does not provide timestamps.
+        """
+        tile = Tile(tile_coord)
+        if self.cache.coverage:
+            tile_bbox = self.grid.tile_bbox(tile_coord)
+            if not self.cache.coverage.intersects(tile_bbox, self.grid.srs):
+                return None
+        if not self.is_cached(tile, dimensions=dimensions):
+            return None
+        if tile.timestamp is None:
+            self.cache.load_tile_metadata(tile, dimensions=dimensions)
+        if not tile.timestamp or tile.timestamp < 0:
+            return None
+        return tile
 
     def _load_tile_coords(self, tiles: TileCollection, dimensions=None, with_metadata=False,
-                          rescale_till_zoom=None, rescaled_tiles=None
+                          rescale_till_zoom=None, rescaled_tiles=None, prefetch=False,
                           ) -> TileCollection:
         uncached_tiles = []
 
@@ -166,13 +194,38 @@ class TileManager:
         if self.rescale_tiles == 0 and cache_only:
             return tiles
 
-        for tile in tiles:
-            if self._is_tile_missing(tile, cache_only, dimensions=dimensions):
-                uncached_tiles.append(tile)
+        if cache_only:
+            # in cache_only mode, we already fetched the tile from cache
+            uncached_tiles = [t for t in tiles if t.coord is not None and t.is_missing()]
+        else:
+            # missing or staled
+            tiles_list = list(tiles)
+            uncached_tiles = [
+                t for t, cached in zip(tiles_list, self.are_cached(tiles_list, dimensions=dimensions))
+                if not cached
+            ]
+
+        if uncached_tiles and self.serve_stale and not cache_only:
+            # return loaded stale tiles and refresh them in the background
+            stale_tiles = [t for t in uncached_tiles
+                           if not t.is_missing() and not (rescaled_tiles and t.coord in rescaled_tiles)]
+            if stale_tiles:
+                stale_refresher().refresh(self, [t.coord for t in stale_tiles], dimensions=dimensions)
+                stale_ids = set(id(t) for t in stale_tiles)
+                uncached_tiles = [t for t in uncached_tiles if id(t) not in stale_ids]
 
         if uncached_tiles:
-            creator = self.creator(dimensions=dimensions)
-            created_tiles = creator.create_tiles(uncached_tiles)
+            create_tiles = uncached_tiles
+            if self.negative_cache is not None:
+                # skip tiles where the sources returned no image
+                known_empty = self.negative_cache.contains([t.coord for t in uncached_tiles], dimensions=dimensions)
+                create_tiles = [t for t, empty in zip(uncached_tiles, known_empty) if not empty]
+            created_tiles = []
+            if create_tiles:
+                creator = self.creator(dimensions=dimensions)
+                created_tiles = creator.create_tiles(create_tiles)
+                if prefetch:
+                    tile_prefetcher().prefetch(self, [t.coord for t in create_tiles], dimensions=dimensions)
             if not created_tiles and self.rescale_tiles:
                 created_tiles = [self._scaled_tile(t, rescale_till_zoom, rescaled_tiles) for t in uncached_tiles]
 
@@ -214,6 +267,63 @@ class TileManager:
                 cached = False
         return cached
 
+    def are_cached(self, tiles: list[Union[Tile, TileCoord]], dimensions=None) -> list[bool]:
+        """
+        Return a list with ``True`` for each tile of `tiles` that is cached and
+        not expired. Same as `is_cached`, but with a single query to the cache.
+        """
+        tile_objs: list[Tile] = [t if isinstance(t, Tile) else Tile(t) for t in tiles]
+        query_tiles = [t for t in tile_objs if t.coord is not None]
+        cached = dict(zip(
+            (id(t) for t in query_tiles),
+            self._cache_are_cached(query_tiles, dimensions=dimensions),
+        ))
+        max_mtime = self.expire_timestamp()
+        if max_mtime is not None:
+            self._load_missing_metadata([t for t in query_tiles if cached[id(t)]], dimensions=self.dimensions)
+            for t in query_tiles:
+                # see is_cached
+                if cached[id(t)]:
+                    assert t.timestamp is not None
+                    if int(t.timestamp) <= max_mtime:
+                        cached[id(t)] = False
+        return [t.coord is None or cached[id(t)] for t in tile_objs]
+
+    def are_stale(self, tiles: list[Union[Tile, TileCoord]], dimensions=None) -> list[bool]:
+        """
+        Return a list with ``True`` for each tile of `tiles` that exists _and_ is expired.
+        Same as `is_stale`, but with a single query to the cache.
+        """
+        tile_objs: list[Tile] = [t if isinstance(t, Tile) else Tile(t) for t in tiles]
+        max_mtime = self.expire_timestamp()
+        if max_mtime is None:
+            return [False] * len(tile_objs)
+        query_tiles = [t for t in tile_objs if t.coord is not None]
+        exists = dict(zip(
+            (id(t) for t in query_tiles),
+            self._cache_are_cached(query_tiles, dimensions=dimensions),
+        ))
+        existing_tiles = [t for t in query_tiles if exists[id(t)]]
+        self._load_missing_metadata(existing_tiles, dimensions=self.dimensions)
+        stale = set(id(t) for t in existing_tiles if t.timestamp is not None and int(t.timestamp) <= max_mtime)
+        return [id(t) in stale for t in tile_objs]
+
+    def _cache_are_cached(self, tiles, dimensions=None):
+        # caches from plugins are not required to extend TileCacheBase
+        if hasattr(self.cache, 'are_cached'):
+            return self.cache.are_cached(tiles, dimensions=dimensions)
+        return [self.cache.is_cached(t, dimensions=dimensions) for t in tiles]
+
+    def _load_missing_metadata(self, tiles, dimensions=None):
+        tiles = [t for t in tiles if t.timestamp is None]
+        if not tiles:
+            return
+        if hasattr(self.cache, 'load_tiles_metadata'):
+            self.cache.load_tiles_metadata(tiles, dimensions=dimensions)
+        else:
+            for t in tiles:
+                self.cache.load_tile_metadata(t, dimensions=dimensions)
+
     def is_stale(self, tile: Tile, dimensions=None) -> bool:
         """
         Return True if tile exists _and_ is expired.
@@ -307,3 +417,34 @@ class TileManager:
         if self.cache_rescaled_tiles:
             self.cache.store_tile(tile)
         return tile
+
+    def build_tile_coords(self, tile_coords: list[TileCoord], dimensions=None) -> list[Tile]:
+        """
+        Build the tiles of `tile_coords` by downscaling the cached tiles of the
+        next level and store them in the cache. Tiles without any cached tile
+        in the next level are not built.
+        Returns the built tiles.
+        """
+        built = []
+        for tile in TileCollection(tile_coords):
+            if tile.coord is None:
+                continue
+            tile_bbox = self.grid.tile_bbox(tile.coord)
+            src_bbox, src_tile_grid, src_coords = self.grid.get_affected_level_tiles(tile_bbox, tile.coord[2] + 1)
+            src_tiles = TileCollection(list(src_coords))
+            self.cache.load_tiles(src_tiles, dimensions=dimensions)
+
+            tile_results: list[Optional[BaseImageResult]] = [
+                t.image_result if not t.is_missing() else None for t in src_tiles]
+            if not any(tile_results):
+                continue
+
+            tiled_image = TiledImage(tile_results, src_bbox=src_bbox, src_srs=self.grid.srs,
+                                     tile_grid_size=src_tile_grid, tile_size=self.grid.tile_size)
+            # tile filters were already applied to the source tiles, like in _scaled_tile
+            tile.image_result = tiled_image.transform(tile_bbox, self.grid.srs, self.grid.tile_size, self.image_opts)
+            built.append(tile)
+
+        if built:
+            self.cache.store_tiles(built, dimensions=dimensions)
+        return built
@@ -16,7 +16,9 @@
 """
 Tile retrieval (WMS, TMS, etc.).
 """
+import os
 import sys
+import threading
 import time
 from typing import Any
 
@@ -42,7 +44,7 @@ class HTTPClientError(Exception):
         self.full_msg = full_msg
 
 
-def build_https_handler(ssl_ca_certs, insecure):
+def build_https_handler(ssl_ca_certs, insecure, connection_pool=None):
     if insecure:
         ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
         ctx.check_hostname = False
@@ -51,9 +53,231 @@ def build_https_handler(ssl_ca_certs, insecure):
         ctx = ssl.create_default_context(cafile=ssl_ca_certs)
     else:
         ctx = ssl.create_default_context()
+    if connection_pool is not None:
+        return KeepAliveHTTPSHandler(connection_pool, context=ctx)
     return urllib2.HTTPSHandler(context=ctx)
 
 
+class HTTPConnectionPool(object):
+    """
+    Keeps idle HTTP connections open for reuse.
+
+    Up to `max_connections` idle connections are kept for each host.
+    Connections that are idle for more than `idle_timeout` seconds are
+    closed on the next request to the same host. Idle connections are not
+    shared with forked processes.
+    """
+
+    def __init__(self, max_connections=10, idle_timeout=30):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.active = 0
+
+    def get(self, key):
+        """
+        Return an idle connection for `key` or ``None``.
+        """
+        expired = []
+        conn = None
+        now = time.time()
+        with self._lock:
+            self._check_fork()
+            idle = self._idle.get(key)
+            while idle:
+                conn, last_used = idle.pop()
+                if last_used + self.idle_timeout >= now:
+                    break
+                expired.append(conn)
+                conn = None
+            self.discarded += len(expired)
+            if conn is not None:
+                self.reused += 1
+                self.active += 1
+        for c in expired:
+            c.close()
+        return conn
+
+    def created_connection(self):
+        with self._lock:
+            self.created += 1
+            self.active += 1
+
+    def release(self, key, conn, reuse):
+        """
+        Return `conn` to the pool. The connection is closed if it is not
+        reusable or if the pool is full.
+        """
+        with self._lock:
+            if self._check_fork():
+                # connection of the parent process
+                reuse = False
+            else:
+                self.active -= 1
+            if reuse:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_connections:
+                    idle.append((conn, time.time()))
+                    return
+            self.discarded += 1
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            self._check_fork()
+            idle = self._idle
+            self._idle = {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+    def _check_fork(self):
+        """
+        Forget all connections of the parent process after a fork (e.g. by
+        the seeder), as the sockets can not be shared. They are not closed,
+        as the parent still uses them. Returns ``True`` after a fork.
+        Requires the lock.
+        """
+        if self._pid == os.getpid():
+            return False
+        self._pid = os.getpid()
+        self._idle = {}
+        self.active = 0
+        return True
+
+    def stats(self):
+        """
+        Return a dictionary with the usage counters of this pool.
+        """
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'active': self.active,
+                'idle': sum(len(conns) for conns in self._idle.values()),
+                'hosts': len(self._idle),
+            }
+
+
+class _PooledHTTPResponse(httplib.HTTPResponse):
+    """
+    HTTPResponse that returns its connection to the pool once the response
+    is read completely or closed.
+    """
+    _on_release = None
+    _closing = False
+    _consumed = False
+
+    def _close_conn(self):
+        super()._close_conn()
+        if not self._closing:
+            # called after the complete body was read
+            self._consumed = True
+        self._release()
+
+    def close(self):
+        self._closing = True
+        super().close()
+        self._release()
+
+    def _release(self):
+        on_release = self._on_release
+        if on_release is not None:
+            self._on_release = None
+            on_release(self._consumed and not self.will_close)
+
+
+# methods that can be sent again if an idle connection was closed by the server
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _KeepAliveMixin(object):
+    def __init__(self, connection_pool, **kw):
+        super().__init__(**kw)
+        self.connection_pool = connection_pool
+
+    def do_open(self, http_class, req, **http_conn_args):
+        """
+        Like AbstractHTTPHandler.do_open, but reuses connections from
+        `connection_pool` instead of closing them after each request.
+        """
+        host = req.host
+        if not host:
+            raise URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update({k: v for k, v in req.headers.items() if k not in headers})
+        headers['Connection'] = 'keep-alive'
+        headers = {name.title(): val for name, val in headers.items()}
+
+        tunnel_headers = {}
+        if 'Proxy-Authorization' in headers:
+            tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+
+        pool = self.connection_pool
+        key = (http_class, host, req.timeout, req._tunnel_host)
+        retry = req.get_method() in IDEMPOTENT_METHODS
+        while True:
+            conn = pool.get(key)
+            reused = conn is not None
+            if not reused:
+                conn = http_class(host, timeout=req.timeout, **http_conn_args)
+                conn.response_class = _PooledHTTPResponse
+                if req._tunnel_host:
+                    conn.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+                pool.created_connection()
+            closed = False
+            try:
+                try:
+                    conn.request(req.get_method(), req.selector, req.data, headers,
+                                 encode_chunked=req.has_header('Transfer-encoding'))
+                except (BrokenPipeError, ConnectionResetError):
+                    closed = True
+                    raise
+                try:
+                    resp = conn.getresponse()
+                except ConnectionResetError:
+                    # includes RemoteDisconnected: closed without any response
+                    closed = True
+                    raise
+            except (OSError, httplib.HTTPException) as err:
+                pool.release(key, conn, reuse=False)
+                if reused and retry and closed:
+                    # connection was closed by the server while idle
+                    continue
+                if isinstance(err, OSError):
+                    raise URLError(err)
+                raise
+            except BaseException:
+                pool.release(key, conn, reuse=False)
+                raise
+            break
+
+        resp._on_release = lambda reuse: pool.release(key, conn, reuse)
+        if resp.fp is None:
+            # response without body
+            resp._release()
+
+        resp.url = req.get_full_url()
+        resp.msg = resp.reason
+        return resp
+
+
+class KeepAliveHTTPHandler(_KeepAliveMixin, urllib2.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(httplib.HTTPConnection, req)
+
+
+class KeepAliveHTTPSHandler(_KeepAliveMixin, urllib2.HTTPSHandler):
+    pass
+
+
 class VerifiedHTTPSConnection(httplib.HTTPSConnection):
     def __init__(self, *args, **kw):
         self._ca_certs = kw.pop('ca_certs', None)
@@ -115,12 +339,24 @@ class _URLOpenerCache(object):
 
     def __init__(self):
         self._opener = {}
-
-    def __call__(self, ssl_ca_certs, url, username, password, insecure=False, manage_cookies=False):
-        cache_key = (ssl_ca_certs, insecure, manage_cookies)
+        self._connection_pools = {}
+
+    def __call__(self, ssl_ca_certs, url, username, password, insecure=False, manage_cookies=False,
+                 keep_alive=False):
+        pool_opts = None
+        if keep_alive:
+            if keep_alive is True:
+                keep_alive = {}
+            pool_opts = (keep_alive.get('max_connections', 10), keep_alive.get('idle_timeout', 30))
+        cache_key = (ssl_ca_certs, insecure, manage_cookies, pool_opts)
         if cache_key not in self._opener:
             handlers = []
-            https_handler = build_https_handler(ssl_ca_certs, insecure)
+            connection_pool = None
+            if pool_opts:
+                connection_pool = HTTPConnectionPool(*pool_opts)
+                self._connection_pools[cache_key] = connection_pool
+                handlers.append(KeepAliveHTTPHandler(connection_pool))
+            https_handler = build_https_handler(ssl_ca_certs, insecure, connection_pool=connection_pool)
             if https_handler:
                 handlers.append(https_handler)
             passman = urllib2.HTTPPasswordMgrWithDefaultRealm()
@@ -145,20 +381,32 @@ class _URLOpenerCache(object):
 
         return opener
 
+    def connection_pool_stats(self):
+        """
+        Return the combined usage counters of all keep-alive connection pools.
+        """
+        stats = {'created': 0, 'reused': 0, 'discarded': 0, 'active': 0, 'idle': 0, 'hosts': 0}
+        for pool in list(self._connection_pools.values()):
+            for k, v in pool.stats().items():
+                stats[k] += v
+        return stats
+
 
 create_url_opener = _URLOpenerCache()
+connection_pool_stats = create_url_opener.connection_pool_stats
 
 
 class HTTPClient(object):
     def __init__(self, url=None, username=None, password=None, insecure=False,
                  ssl_ca_certs=None, timeout=None, headers=None, hide_error_details=False,
-                 manage_cookies=False):
+                 manage_cookies=False, keep_alive=False):
         self._timeout = timeout
         if url and url.startswith('https') and insecure:
             ssl_ca_certs = None
 
         self.opener = create_url_opener(ssl_ca_certs, url, username, password,
-                                        insecure=insecure, manage_cookies=manage_cookies)
+                                        insecure=insecure, manage_cookies=manage_cookies,
+                                        keep_alive=keep_alive)
         self.headers = headers if headers else {}
         self.hide_error_details = hide_error_details
 
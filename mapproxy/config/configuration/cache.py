@@ -134,7 +134,16 @@ class CacheConfiguration(ConfigurationBase):
             wal=wal,
             coverage=coverage,
             directory_permissions=self.directory_permissions(),
-            file_permissions=self.file_permissions()
+            file_permissions=self.file_permissions(),
+            deduplicate=self.conf['cache'].get('deduplicate', False),
+            **self._sqlite_read_opts()
+        )
+
+    def _sqlite_read_opts(self):
+        return dict(
+            read_only=self.conf.get('cache', {}).get('read_only', False),
+            cache_size_mb=self.context.globals.get_value('cache.sqlite_cache_size_mb', self.conf),
+            mmap_size_mb=self.context.globals.get_value('cache.sqlite_mmap_size_mb', self.conf),
         )
 
     def _geopackage_cache(self, grid_conf, image_opts):
@@ -174,7 +183,8 @@ class CacheConfiguration(ConfigurationBase):
                 table_name,
                 coverage=coverage,
                 directory_permissions=self.directory_permissions(),
-                file_permissions=self.file_permissions()
+                file_permissions=self.file_permissions(),
+                **self._sqlite_read_opts()
             )
         else:
             return GeopackageCache(
@@ -183,7 +193,8 @@ class CacheConfiguration(ConfigurationBase):
                 table_name,
                 coverage=coverage,
                 directory_permissions=self.directory_permissions(),
-                file_permissions=self.file_permissions()
+                file_permissions=self.file_permissions(),
+                **self._sqlite_read_opts()
             )
 
     def _azureblob_cache(self, grid_conf, image_opts):
@@ -214,7 +225,11 @@ class CacheConfiguration(ConfigurationBase):
             directory_layout=directory_layout,
             container_name=container_name,
             connection_string=connection_string,
-            coverage=coverage
+            coverage=coverage,
+            deduplicate=self.conf['cache'].get('deduplicate', False),
+            max_connections=self.conf['cache'].get('max_connections', None),
+            _concurrent_reader=self.conf['cache'].get('concurrent_reader', 4),
+            _concurrent_writer=self.conf['cache'].get('concurrent_writer', 4),
         )
 
     def _s3_cache(self, grid_conf, image_opts):
@@ -266,7 +281,11 @@ class CacheConfiguration(ConfigurationBase):
             endpoint_url=endpoint_url,
             access_control_list=access_control_list,
             coverage=coverage,
-            use_http_get=use_http_get
+            use_http_get=use_http_get,
+            deduplicate=self.conf['cache'].get('deduplicate', False),
+            max_connections=self.conf['cache'].get('max_connections', None),
+            _concurrent_reader=self.conf['cache'].get('concurrent_reader', 4),
+            _concurrent_writer=self.conf['cache'].get('concurrent_writer', 4),
         )
 
     def _sqlite_cache(self, grid_conf, image_opts):
@@ -297,7 +316,9 @@ class CacheConfiguration(ConfigurationBase):
             ttl=self.conf.get('cache', {}).get('ttl', 0),
             coverage=coverage,
             directory_permissions=self.directory_permissions(),
-            file_permissions=self.file_permissions()
+            file_permissions=self.file_permissions(),
+            deduplicate=self.conf.get('cache', {}).get('deduplicate', False),
+            **self._sqlite_read_opts()
         )
 
     def _couchdb_cache(self, grid_conf, image_opts):
@@ -339,6 +360,7 @@ class CacheConfiguration(ConfigurationBase):
         ssl_certfile = self.conf['cache'].get('ssl_certfile', None)
         ssl_keyfile = self.conf['cache'].get('ssl_keyfile', None)
         ssl_ca_certs = self.conf['cache'].get('ssl_ca_certs', None)
+        max_connections = self.conf['cache'].get('max_connections', None)
         prefix = self.conf['cache'].get('prefix')
         if not prefix:
             prefix = self.conf['name'] + '_' + grid_conf.tile_grid().name
@@ -354,7 +376,9 @@ class CacheConfiguration(ConfigurationBase):
             coverage=coverage,
             ssl_certfile=ssl_certfile,
             ssl_keyfile=ssl_keyfile,
-            ssl_ca_certs=ssl_ca_certs
+            ssl_ca_certs=ssl_ca_certs,
+            max_connections=max_connections,
+            deduplicate=self.conf['cache'].get('deduplicate', False),
         )
 
     def _compact_cache(self, grid_conf, image_opts):
@@ -373,7 +397,11 @@ class CacheConfiguration(ConfigurationBase):
             cache_dir = os.path.join(cache_dir, self.conf['name'], grid_conf.tile_grid().name)
 
         version = self.conf['cache']['version']
+        deduplicate = self.conf['cache'].get('deduplicate', False)
         if version == 1:
+            if deduplicate:
+                raise ConfigurationError(
+                    "deduplicate is only supported by compact caches with version 2 in %s" % self.conf['name'])
             return CompactCacheV1(
                 cache_dir=cache_dir,
                 coverage=coverage,
@@ -385,7 +413,8 @@ class CacheConfiguration(ConfigurationBase):
                 cache_dir=cache_dir,
                 coverage=coverage,
                 directory_permissions=self.directory_permissions(),
-                file_permissions=self.file_permissions()
+                file_permissions=self.file_permissions(),
+                deduplicate=deduplicate,
             )
 
         raise ConfigurationError("compact cache only supports version 1 or 2")
@@ -397,7 +426,20 @@ class CacheConfiguration(ConfigurationBase):
 
         grid_conf.tile_grid()  # create to resolve `base` in grid_conf.conf
         cache_type = self.conf.get('cache', {}).get('type', 'file')
-        return getattr(self, '_%s_cache' % cache_type)(grid_conf, image_opts)
+        cache = getattr(self, '_%s_cache' % cache_type)(grid_conf, image_opts)
+
+        memory_cache = self.context.globals.get_value('memory_cache', self.conf,
+                                                      global_key='cache.memory_cache')
+        if memory_cache not in (None, False) and not self.context.seed:
+            from mapproxy.cache.memory import MemoryTileCache
+            if memory_cache is True:
+                memory_cache = {}
+            cache = MemoryTileCache(
+                cache,
+                max_bytes=int(memory_cache.get('max_size_mb', 64) * 1024 * 1024),
+                ttl=memory_cache.get('ttl', 300),
+            )
+        return cache
 
     def _tile_filter(self):
         filters = []
@@ -577,6 +619,26 @@ class CacheConfiguration(ConfigurationBase):
                                                                 global_key='cache.minimize_meta_requests')
         concurrent_tile_creators = self.context.globals.get_value('concurrent_tile_creators', self.conf,
                                                                   global_key='cache.concurrent_tile_creators')
+        concurrent_tile_encoders = self.context.globals.get_value('concurrent_tile_encoders', self.conf,
+                                                                  global_key='cache.concurrent_tile_encoders')
+        serve_stale = self.context.globals.get_value('serve_stale', self.conf,
+                                                     global_key='cache.serve_stale')
+        if self.context.seed:
+            # always refresh tiles while seeding
+            serve_stale = False
+        prefetch = self.context.globals.get_value('prefetch', self.conf,
+                                                  global_key='cache.prefetch')
+        if self.context.seed or self.conf.get('disable_storage', False):
+            # the seeder requests all tiles anyway and
+            # prefetched tiles of caches without storage are lost
+            prefetch = False
+        negative_cache_conf = self.context.globals.get_value('negative_cache', self.conf,
+                                                             global_key='cache.negative_cache')
+        if self.context.seed:
+            # always query the sources while seeding
+            negative_cache_conf = None
+        if negative_cache_conf is True:
+            negative_cache_conf = {}
 
         cache_rescaled_tiles = self.conf.get('cache_rescaled_tiles')
         upscale_tiles = self.conf.get('upscale_tiles', 0)
@@ -693,6 +755,19 @@ class CacheConfiguration(ConfigurationBase):
                     file_permissions=global_file_permissions
                 )
 
+            negative_cache = None
+            if negative_cache_conf not in (None, False) and not isinstance(cache, DummyCache):
+                from mapproxy.cache.negative import NegativeTileCache
+                negative_cache_filename = None
+                if negative_cache_conf.get('persistent', False):
+                    negative_cache_filename = os.path.join(
+                        self.cache_dir(), 'negative_tiles', identifier + '.sqlite')
+                negative_cache = NegativeTileCache(
+                    ttl=negative_cache_conf.get('ttl', 3600),
+                    max_entries=negative_cache_conf.get('max_entries', 100000),
+                    filename=negative_cache_filename,
+                )
+
             mgr = TileManager(tile_grid, cache, sources, image_opts.format.ext,
                               locker=locker,
                               image_opts=image_opts, identifier=identifier,
@@ -700,6 +775,10 @@ class CacheConfiguration(ConfigurationBase):
                               meta_size=meta_size, meta_buffer=meta_buffer,
                               minimize_meta_requests=minimize_meta_requests,
                               concurrent_tile_creators=concurrent_tile_creators,
+                              concurrent_tile_encoders=concurrent_tile_encoders,
+                              serve_stale=bool(serve_stale),
+                              prefetch=bool(prefetch),
+                              negative_cache=negative_cache,
                               pre_store_filter=tile_filter,
                               tile_creator_class=tile_creator_class,
                               bulk_meta_tiles=bulk_meta_tiles,
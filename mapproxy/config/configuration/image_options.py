@@ -13,6 +13,8 @@ class ImageOptionsConfiguration(ConfigurationBase):
     def __init__(self, conf, context):
         super().__init__(conf, context)
         self._init_formats()
+        if self.conf.get('reprojection_method'):
+            self._check_reprojection(self.conf['reprojection_method'])
 
     def _init_formats(self):
         self.formats = {}
@@ -25,6 +27,8 @@ class ImageOptionsConfiguration(ConfigurationBase):
                 conf = tmp
             if 'resampling_method' in conf:
                 conf['resampling'] = conf.pop('resampling_method')
+            if 'reprojection_method' in conf:
+                conf['reprojection'] = conf.pop('reprojection_method')
             if 'encoding_options' in conf:
                 self._check_encoding_options(conf['encoding_options'])
             if 'merge_method' in conf:
@@ -55,6 +59,14 @@ class ImageOptionsConfiguration(ConfigurationBase):
         if options:
             raise ConfigurationError('unknown encoding_options: %r' % options)
 
+    def _check_reprojection(self, reprojection):
+        if reprojection not in ('mesh', 'grid'):
+            raise ConfigurationError('unknown reprojection_method: %r' % reprojection)
+        if reprojection == 'grid':
+            from mapproxy.image import transform
+            if transform.numpy is None:
+                raise ConfigurationError('reprojection_method grid requires numpy')
+
     def image_opts(self, image_conf, format):
         from mapproxy.image.opts import ImageOptions
         if not image_conf:
@@ -67,6 +79,10 @@ class ImageOptionsConfiguration(ConfigurationBase):
         resampling = image_conf.get('resampling_method') or conf.get('resampling')
         if resampling is None:
             resampling = self.context.globals.get_value('image.resampling_method', {})
+        reprojection = image_conf.get('reprojection_method') or conf.get('reprojection')
+        if reprojection is None:
+            reprojection = self.context.globals.get_value('image.reprojection_method', {})
+        self._check_reprojection(reprojection)
         transparent = image_conf.get('transparent')
         opacity = image_conf.get('opacity')
         img_format = image_conf.get('format')
@@ -81,7 +97,7 @@ class ImageOptionsConfiguration(ConfigurationBase):
 
         # only overwrite default if it is not None
         for k, v in dict(
-                transparent=transparent, opacity=opacity, resampling=resampling,
+                transparent=transparent, opacity=opacity, resampling=resampling, reprojection=reprojection,
                 format=img_format, colors=colors, mode=mode, encoding_options=encoding_options,
         ).items():
             if v is not None:
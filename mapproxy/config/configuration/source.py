@@ -124,13 +124,26 @@ class SourceConfiguration(ConfigurationBase):
         headers = self.context.globals.get_value('http.headers', self.conf)
         hide_error_details = self.context.globals.get_value('http.hide_error_details', self.conf)
         manage_cookies = self.context.globals.get_value('http.manage_cookies', self.conf)
+        keep_alive = self.context.globals.get_value('http.keep_alive', self.conf)
 
         http_client = HTTPClient(url, username, password, insecure=insecure,
                                  ssl_ca_certs=ssl_ca_certs, timeout=timeout,
                                  headers=headers, hide_error_details=hide_error_details,
-                                 manage_cookies=manage_cookies)
+                                 manage_cookies=manage_cookies, keep_alive=keep_alive)
         return http_client, url
 
+    def concurrent_requests_lock(self, lock_file, concurrent_requests, **kw):
+        from mapproxy.util.lock import concurrent_requests_lock
+
+        mode = self.context.globals.get_value('concurrent_requests_lock', self.conf,
+                                              global_key='http.concurrent_requests_lock')
+        adaptive = self.context.globals.get_value('concurrent_requests_adaptive', self.conf,
+                                                  global_key='http.concurrent_requests_adaptive')
+        try:
+            return concurrent_requests_lock(lock_file, concurrent_requests, mode=mode, adaptive=adaptive, **kw)
+        except ValueError as e:
+            raise ConfigurationError(str(e))
+
     @memoize
     def on_error_handler(self):
         if 'on_error' not in self.conf:
@@ -313,7 +326,6 @@ class WMSSourceConfiguration(SourceConfiguration):
         concurrent_requests = self.context.globals.get_value('concurrent_requests', self.conf,
                                                              global_key='http.concurrent_requests')
         if concurrent_requests:
-            from mapproxy.util.lock import SemLock
             lock_dir = self.context.globals.get_path('cache.lock_dir', self.conf)
             lock_timeout = self.context.globals.get_value('http.client_timeout', self.conf)
             url = urlparse(self.conf['req']['url'])
@@ -332,9 +344,9 @@ class WMSSourceConfiguration(SourceConfiguration):
 
             md5 = hashlib.new('md5', url.netloc.encode('ascii'), usedforsecurity=False)
             lock_file = os.path.join(lock_dir, md5.hexdigest() + '.lck')
-            lock = lambda: SemLock(lock_file, concurrent_requests, timeout=lock_timeout,  # noqa
-                                   directory_permissions=global_directory_permissions,
-                                   file_permissions=global_file_permissions)
+            lock = self.concurrent_requests_lock(lock_file, concurrent_requests, timeout=lock_timeout,
+                                                 directory_permissions=global_directory_permissions,
+                                                 file_permissions=global_file_permissions)
 
         coverage = self.coverage()
         res_range = resolution_range(self.conf)
@@ -492,7 +504,6 @@ class MapnikSourceConfiguration(SourceConfiguration):
         concurrent_requests = self.context.globals.get_value('concurrent_requests', self.conf,
                                                              global_key='http.concurrent_requests')
         if concurrent_requests:
-            from mapproxy.util.lock import SemLock
             lock_dir = self.context.globals.get_path('cache.lock_dir', self.conf)
             mapfile = self.conf['mapfile']
 
@@ -510,9 +521,9 @@ class MapnikSourceConfiguration(SourceConfiguration):
 
             md5 = hashlib.new('md5', mapfile.encode('utf-8'), usedforsecurity=False)
             lock_file = os.path.join(lock_dir, md5.hexdigest() + '.lck')
-            lock = lambda: SemLock(lock_file, concurrent_requests, # noqa
-                                   directory_permissions=global_directory_permissions,
-                                   file_permissions=global_file_permissions)
+            lock = self.concurrent_requests_lock(lock_file, concurrent_requests,
+                                                 directory_permissions=global_directory_permissions,
+                                                 file_permissions=global_file_permissions)
 
         coverage = self.coverage()
         res_range = resolution_range(self.conf)
@@ -51,6 +51,8 @@ srs = dict(
 image = dict(
     # nearest, bilinear, bicubic
     resampling_method='bicubic',
+    # mesh, grid
+    reprojection_method='mesh',
     jpeg_quality=90,
     stretch_factor=1.15,
     max_shrink_factor=4.0,
@@ -72,6 +74,12 @@ cache = dict(
     lock_dir='./cache_data/tile_locks',
     max_tile_limit=500,
     concurrent_tile_creators=2,
+    concurrent_tile_encoders=4,
+    serve_stale_workers=2,
+    serve_stale_queue_size=256,
+    prefetch_workers=1,
+    prefetch_queue_size=256,
+    prefetch_budget=32,
     meta_size=(4, 4),
     meta_buffer=80,
     minimize_meta_requests=False,
@@ -83,6 +91,12 @@ grid = dict(
     tile_size=(256, 256),
 )
 
+# process-wide worker threads for concurrent tile creation, layer rendering, etc.
+thread_pool = dict(
+    size=32,
+    queue_size=256,
+)
+
 grids = dict(
     GLOBAL_GEODETIC=dict(
         srs='EPSG:4326', origin='sw', name='GLOBAL_GEODETIC'
@@ -104,8 +118,11 @@ http = dict(
     ssl_no_cert_checks=False,
     client_timeout=60,
     concurrent_requests=0,
+    concurrent_requests_lock='fcntl',
+    concurrent_requests_adaptive=False,
     method='AUTO',
     access_control_allow_origin='*',
     hide_error_details=True,
     manage_cookies=False,
+    keep_alive=False,
 )
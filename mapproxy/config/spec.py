@@ -70,6 +70,7 @@ image_opts = {
     'colors': number(),
     'transparent': bool(),
     'resampling_method': str(),
+    'reprojection_method': str(),
     'format': str(),
     'encoding_options': {
         anything(): anything()
@@ -87,6 +88,10 @@ http_opts = {
         anything(): str()
     },
     'manage_cookies': bool(),
+    'keep_alive': one_of(bool(), {
+        'max_connections': int(),
+        'idle_timeout': number(),
+    }),
 }
 
 mapserver_opts = {
@@ -105,6 +110,8 @@ source_commons = combined(
     scale_hints,
     {
         'concurrent_requests': int(),
+        'concurrent_requests_lock': one_of('memory', 'fcntl', 'file'),
+        'concurrent_requests_adaptive': bool(),
         'coverage': coverage,
         'seed_only': bool(),
     }
@@ -116,6 +123,17 @@ cache_commons = combined(
     }
 )
 
+memory_cache_opts = {
+    'max_size_mb': number(),
+    'ttl': number(),
+}
+
+negative_cache_opts = {
+    'ttl': number(),
+    'max_entries': int(),
+    'persistent': bool(),
+}
+
 cache_types = {
     'file': combined(cache_commons, {
         'directory_layout': str(),
@@ -129,6 +147,10 @@ cache_types = {
         'directory': str(),
         'sqlite_timeout': number(),
         'sqlite_wal': bool(),
+        'sqlite_cache_size_mb': number(),
+        'sqlite_mmap_size_mb': number(),
+        'read_only': bool(),
+        'deduplicate': bool(),
         'tile_lock_dir': str(),
         'ttl': int(),
         'directory_permissions': str(),
@@ -138,6 +160,10 @@ cache_types = {
         'filename': str(),
         'sqlite_timeout': number(),
         'sqlite_wal': bool(),
+        'sqlite_cache_size_mb': number(),
+        'sqlite_mmap_size_mb': number(),
+        'read_only': bool(),
+        'deduplicate': bool(),
         'tile_lock_dir': str(),
         'directory_permissions': str(),
         'file_permissions': str(),
@@ -148,6 +174,9 @@ cache_types = {
         'tile_lock_dir': str(),
         'table_name': str(),
         'levels': bool(),
+        'sqlite_cache_size_mb': number(),
+        'sqlite_mmap_size_mb': number(),
+        'read_only': bool(),
         'directory_permissions': str(),
         'file_permissions': str(),
     }),
@@ -171,6 +200,10 @@ cache_types = {
         'tile_lock_dir': str(),
         'use_http_get': bool(),
         'include_grid_name': bool(),
+        'deduplicate': bool(),
+        'max_connections': int(),
+        'concurrent_reader': int(),
+        'concurrent_writer': int(),
     }),
     'redis': combined(cache_commons, {
         'host': str(),
@@ -183,10 +216,13 @@ cache_types = {
         'ssl_certfile': str(),
         'ssl_keyfile': str(),
         'ssl_ca_certs': str(),
+        'max_connections': int(),
+        'deduplicate': bool(),
     }),
     'compact': combined(cache_commons, {
         'directory': str(),
         required('version'): number(),
+        'deduplicate': bool(),
         'tile_lock_dir': str(),
         'directory_permissions': str(),
         'file_permissions': str(),
@@ -197,6 +233,10 @@ cache_types = {
         'directory_layout': str(),
         'directory': str(),
         'tile_lock_dir': str(),
+        'deduplicate': bool(),
+        'max_connections': int(),
+        'concurrent_reader': int(),
+        'concurrent_writer': int(),
     }),
 }
 
@@ -369,6 +409,7 @@ mapproxy_yaml_spec = {
     'globals': {
         'image': {
             'resampling_method': 'method',
+            'reprojection_method': str(),
             'paletted': bool(),
             'stretch_factor': number(),
             'max_shrink_factor': number(),
@@ -383,6 +424,9 @@ mapproxy_yaml_spec = {
             http_opts,
             {
                 'access_control_allow_origin': one_of(str(), {}),
+                'concurrent_requests': int(),
+                'concurrent_requests_lock': one_of('memory', 'fcntl', 'file'),
+                'concurrent_requests_adaptive': bool(),
             }
         ),
         'cache': {
@@ -397,7 +441,19 @@ mapproxy_yaml_spec = {
             'max_tile_limit': number(),
             'minimize_meta_requests': bool(),
             'concurrent_tile_creators': int(),
+            'concurrent_tile_encoders': int(),
+            'serve_stale': bool(),
+            'negative_cache': one_of(bool(), negative_cache_opts),
+            'prefetch': bool(),
+            'serve_stale_workers': int(),
+            'serve_stale_queue_size': int(),
+            'prefetch_workers': int(),
+            'prefetch_queue_size': int(),
+            'prefetch_budget': int(),
             'link_single_color_images': one_of(bool(), 'symlink', 'hardlink'),
+            'memory_cache': one_of(bool(), memory_cache_opts),
+            'sqlite_cache_size_mb': number(),
+            'sqlite_mmap_size_mb': number(),
             's3': {
                 'bucket_name': str(),
                 'profile_name': str(),
@@ -424,7 +480,11 @@ mapproxy_yaml_spec = {
         'mapserver': mapserver_opts,
         'renderd': {
             'address': str(),
-        }
+        },
+        'thread_pool': {
+            'size': int(),
+            'queue_size': int(),
+        },
     },
     'grids': {
         anything(): grid_opts,
@@ -440,6 +500,10 @@ mapproxy_yaml_spec = {
             'bulk_meta_tiles': bool(),
             'minimize_meta_requests': bool(),
             'concurrent_tile_creators': int(),
+            'concurrent_tile_encoders': int(),
+            'serve_stale': bool(),
+            'negative_cache': one_of(bool(), negative_cache_opts),
+            'prefetch': bool(),
             'disable_storage': bool(),
             'format': str(),
             'image': image_opts,
@@ -451,6 +515,7 @@ mapproxy_yaml_spec = {
             'upscale_tiles': int(),
             'downscale_tiles': int(),
             'refresh_before': time_spec,
+            'memory_cache': one_of(bool(), memory_cache_opts),
             'watermark': {
                 'text': str,
                 'font_size': number(),
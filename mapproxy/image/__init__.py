@@ -367,10 +367,8 @@ def img_to_buf(img: Image.Image, image_opts, georef=None) -> BytesIO:
     if image_opts.mode and img.mode[0] in ('I', 'L') and img.mode != image_opts.mode:
         img = img.convert(image_opts.mode)
 
-    if (image_opts.colors is None and base_config().image.paletted
-            and image_opts.format.endswith('png')):
-        # force 255 colors for png with globals.image.paletted
-        image_opts.colors = 255
+    if image_opts.colors is None:
+        image_opts.colors = paletted_colors(image_opts)
 
     format = filter_format(image_opts.format.ext)
     if format == 'mixed':
@@ -383,16 +381,9 @@ def img_to_buf(img: Image.Image, image_opts, georef=None) -> BytesIO:
             image_opts.transparent = False
 
     # quantize if colors is set, but not if we already have a paletted image
-    if image_opts.colors and not (img.mode == 'P' and len(img.getpalette() or []) == image_opts.colors*3):
-        quantizer = None
-        if 'quantizer' in image_opts.encoding_options:
-            quantizer = image_opts.encoding_options['quantizer']
-        if image_opts.transparent:
-            img = quantize(img, colors=image_opts.colors, alpha=True,
-                           defaults=defaults, quantizer=quantizer)
-        else:
-            img = quantize(img, colors=image_opts.colors,
-                           quantizer=quantizer)
+    if image_opts.colors:
+        if not (img.mode == 'P' and len(img.getpalette() or []) <= image_opts.colors*3):
+            img = quantize_image(img, image_opts, defaults=defaults)
         if hasattr(Image, 'RLE'):
             defaults['compress_type'] = Image.RLE
 
@@ -432,6 +423,37 @@ def img_to_buf(img: Image.Image, image_opts, georef=None) -> BytesIO:
     return buf
 
 
+def paletted_colors(image_opts) -> Optional[int]:
+    """
+    Return the number of colors for images with `image_opts`, or ``None``
+    if they are not paletted. PNG images are paletted with 255 colors if
+    ``globals.image.paletted`` is enabled.
+    """
+    if image_opts.colors is not None:
+        return image_opts.colors
+    if image_opts.format and image_opts.format.endswith('png') and base_config().image.paletted:
+        # force 255 colors for png with globals.image.paletted
+        return 255
+    return None
+
+
+def quantize_image(img: Image.Image, image_opts, defaults=None) -> Image.Image:
+    """
+    Quantize `img` to the colors of `image_opts` (see `paletted_colors`).
+    """
+    colors = paletted_colors(image_opts)
+    quantizer = image_opts.encoding_options.get('quantizer')
+    if image_opts.transparent:
+        if defaults is None:
+            defaults = {}
+        img = quantize(img, colors=colors, alpha=True, defaults=defaults, quantizer=quantizer)
+        if 'transparency' in defaults:
+            # keep transparency for images that are encoded later
+            img.info['transparency'] = defaults['transparency']
+        return img
+    return quantize(img, colors=colors, quantizer=quantizer)
+
+
 def quantize(img: Image.Image, colors=256, alpha=False, defaults=None, quantizer=None) -> Image.Image:
     if hasattr(Image, 'FASTOCTREE') and quantizer in (None, 'fastoctree'):
         if not alpha:
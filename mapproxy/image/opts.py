@@ -20,10 +20,11 @@ from typing import Optional
 
 class ImageOptions:
     def __init__(self, mode=None, transparent=None, opacity: Optional[float] = None, resampling=None,
-                 format=None, bgcolor=None, colors=None, encoding_options=None):
+                 format=None, bgcolor=None, colors=None, encoding_options=None, reprojection=None):
         self.transparent = transparent
         self.opacity = opacity
         self.resampling = resampling
+        self.reprojection = reprojection
         if format is not None:
             format = ImageFormat(format)
         self.format = format
@@ -50,6 +51,7 @@ class ImageOptions:
             self.transparent == other.transparent
             and self.opacity == other.opacity
             and self.resampling == other.resampling
+            and self.reprojection == other.reprojection
             and self.format == other.format
             and self.mode == other.mode
             and self.bgcolor == other.bgcolor
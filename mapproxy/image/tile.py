@@ -14,10 +14,12 @@
 # limitations under the License.
 
 import os
+from io import BytesIO
 from typing import Optional
 
 from mapproxy.image import BaseImageResult
 from mapproxy.image import ImageResult
+from mapproxy.image import img_to_buf, is_single_color_image, paletted_colors, quantize_image
 from mapproxy.image.transform import ImageTransformer
 from mapproxy.image.opts import create_image
 
@@ -102,9 +104,20 @@ class TileSplitter:
     Splits a large image into multiple tiles.
     """
 
-    def __init__(self, meta_tile, image_opts):
+    def __init__(self, meta_tile, image_opts, quantize=False):
+        """
+        :param quantize: quantize the whole image once for paletted
+            `image_opts` (see `paletted_colors`), instead of each tile.
+            All tiles share the same palette.
+        """
         self.meta_img = meta_tile.as_image()
         self.image_opts = image_opts
+        if (quantize and image_opts and image_opts.format and image_opts.format.ext.startswith('png')
+                and paletted_colors(image_opts) and self.meta_img.mode in ('RGB', 'RGBA')):
+            self.meta_img = quantize_image(self.meta_img, image_opts)
+        # all tiles of single color images are identical and encoded only once
+        self.single_color = quantize and is_single_color_image(self.meta_img) is not False
+        self._single_color_bufs: dict[tuple[int, int], bytes] = {}
 
     def get_tile(self, crop_coord: tuple[int, int], tile_size: tuple[int, int]) -> ImageResult:
         """
@@ -128,6 +141,12 @@ class TileSplitter:
             result = create_image(tile_size, self.image_opts)
             result.paste(crop, (abs(min(minx, 0)), abs(min(miny, 0))))
             crop = result
+        elif self.single_color:
+            if tile_size not in self._single_color_bufs:
+                crop = self.meta_img.crop((minx, miny, maxx, maxy))
+                self._single_color_bufs[tile_size] = img_to_buf(crop, self.image_opts).getvalue()
+            buf = BytesIO(self._single_color_bufs[tile_size])
+            return ImageResult(buf, size=tile_size, image_opts=self.image_opts)
         else:
             crop = self.meta_img.crop((minx, miny, maxx, maxy))
         return ImageResult(crop, size=tile_size, image_opts=self.image_opts)
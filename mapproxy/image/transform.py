@@ -15,11 +15,20 @@
 
 from __future__ import division
 
+import threading
+from typing import Any, Callable, Optional
+
 from PIL import Image
 
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore
+
 from mapproxy.image import ImageResult, image_filter
 from mapproxy.srs import make_lin_transf, _SRS
 from mapproxy.util.bbox import bbox_equals, BBOX
+from mapproxy.util.lru import LRU
 
 
 class ImageTransformer:
@@ -39,6 +48,14 @@ class ImageTransformer:
            .. _PIL Image.transform:
               http://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.Image.transform
 
+           With ``reprojection_method: grid`` in the `image_opts`, the source
+           coordinates are interpolated for each pixel from a coarse grid of
+           transformed coordinates and the image is resampled with NumPy
+           (see `transform_grid`).
+
+           Meshes and grids are kept in the `transform_cache` for requests
+           with the same geometry.
+
            ::
 
                     src quad                   dst quad
@@ -87,6 +104,8 @@ class ImageTransformer:
         if self.src_srs == self.dst_srs:
             result = self._transform_simple(src_img, src_bbox, dst_size, dst_bbox,
                                             image_opts)
+        elif image_opts.reprojection == 'grid':
+            result = self._transform_grid(src_img, src_bbox, dst_size, dst_bbox, image_opts)
         else:
             result = self._transform(src_img, src_bbox, dst_size, dst_bbox, image_opts)
 
@@ -134,7 +153,9 @@ class ImageTransformer:
         Do a 'real' transformation with a transformed mesh (see above).
         """
 
-        meshes = transform_meshes(
+        key = transform_cache_key('mesh', src_img.size, src_bbox, self.src_srs,
+                                  dst_size, dst_bbox, self.dst_srs, self.max_px_err)
+        meshes = transform_cache.get(key, lambda: transform_meshes(
             src_size=src_img.size,
             src_bbox=src_bbox,
             src_srs=self.src_srs,
@@ -143,7 +164,7 @@ class ImageTransformer:
             dst_srs=self.dst_srs,
             max_px_err=self.max_px_err,
             use_center_px=False,
-        )
+        ))
 
         img = img_for_resampling(src_img.as_image(), image_opts.resampling)
         # Pillow==8
@@ -160,6 +181,30 @@ class ImageTransformer:
 
         return ImageResult(result, size=dst_size, image_opts=image_opts)
 
+    def _transform_grid(self, src_img: ImageResult, src_bbox: BBOX, dst_size: tuple[int, int],
+                        dst_bbox: BBOX, image_opts) -> ImageResult:
+        """
+        Do a 'real' transformation with interpolated source coordinates
+        for each pixel (see `transform_grid`).
+        """
+        if src_img.as_image().mode not in GRID_MODES:
+            return self._transform(src_img, src_bbox, dst_size, dst_bbox, image_opts)
+
+        key = transform_cache_key('grid', src_img.size, src_bbox, self.src_srs,
+                                  dst_size, dst_bbox, self.dst_srs, self.max_px_err)
+        grid = transform_cache.get(key, lambda: transform_grid(
+            src_size=src_img.size,
+            src_bbox=src_bbox,
+            src_srs=self.src_srs,
+            dst_size=dst_size,
+            dst_bbox=dst_bbox,
+            dst_srs=self.dst_srs,
+            max_px_err=self.max_px_err,
+        ))
+        img = img_for_resampling(src_img.as_image(), image_opts.resampling)
+        result = resample_grid(img, grid, image_opts.resampling)
+        return ImageResult(result, size=dst_size, image_opts=image_opts)
+
     def _no_transformation_needed(self, src_size: tuple[int, int], src_bbox: BBOX,
                                   dst_size: tuple[int, int], dst_bbox: BBOX):
         """
@@ -179,6 +224,92 @@ class ImageTransformer:
                 bbox_equals(src_bbox, dst_bbox, xres/10, yres/10))
 
 
+class TransformCache:
+    """
+    Least recently used cache for the results of `transform_meshes`
+    and `transform_grid`.
+
+    Tiled sources and caches transform requests with the same geometry over
+    and over again (e.g. the same tile in a non-native SRS). The meshes and grids
+    only depend on the SRS, bbox and size of the source and destination
+    and they can be reused for all these requests.
+    """
+
+    def __init__(self, size=256):
+        self._lru = LRU(size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, create):
+        """
+        Return the cached value for `key`, or create and cache it by calling `create`.
+        """
+        with self._lock:
+            if key in self._lru:
+                self.hits += 1
+                return self._lru[key]
+            self.misses += 1
+
+        # create outside of the lock, concurrent calls might create the same value
+        value = create()
+        with self._lock:
+            self._lru[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._lru = LRU(self._lru.size)
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return a dictionary with the hit/miss counters and the number of cached entries.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._lru),
+                'size': self._lru.size,
+            }
+
+
+transform_cache = TransformCache()
+
+
+def transform_cache_key(kind: str, src_size: tuple[int, int], src_bbox: BBOX, src_srs: _SRS,
+                        dst_size: tuple[int, int], dst_bbox: BBOX, dst_srs: _SRS, *args):
+    """
+    Return a key for the `transform_cache`.
+
+    The bbox coordinates are quantized to 1/100 of a pixel, so that requests
+    that only differ by floating point errors share the same key.
+
+    >>> from mapproxy.srs import SRS
+    >>> (transform_cache_key('mesh', (256, 256), (0, 0, 2560, 2560), SRS(3857),
+    ...                      (256, 256), (0, 0, 1, 1), SRS(4326), 1) ==
+    ...  transform_cache_key('mesh', (256, 256), (0.0000001, 0, 2560, 2560.0000001), SRS(3857),
+    ...                      (256, 256), (0, 0, 1, 1), SRS(4326), 1))
+    True
+    """
+    return (
+        kind,
+        src_srs.srs_code, tuple(src_size), _quantize_bbox(src_bbox, src_size),
+        dst_srs.srs_code, tuple(dst_size), _quantize_bbox(dst_bbox, dst_size),
+    ) + args
+
+
+def _quantize_bbox(bbox: BBOX, size: tuple[int, int]):
+    # round the quantum to three digits, so that it is the same for all
+    # bboxes with (nearly) the same resolution
+    quantum = float('%.3g' % (max(bbox[2] - bbox[0], bbox[3] - bbox[1]) / max(size) / 100))
+    if not quantum:
+        return tuple(bbox)
+    return (quantum, ) + tuple(int(round(c / quantum)) for c in bbox)
+
+
 def transform_meshes(
     src_size: tuple[int, int], src_bbox: BBOX, src_srs: _SRS,
     dst_size: tuple[int, int], dst_bbox: BBOX, dst_srs: _SRS,
@@ -264,6 +395,293 @@ def transform_meshes(
     return meshes
 
 
+# smallest grid cell (in pixel) of transform_grid
+GRID_MIN_CELL_SIZE = 8
+# size of the first grid cells (in pixel) of transform_grid
+GRID_START_CELL_SIZE = 256
+
+
+class TransformGrid:
+    """
+    Source pixel coordinates for the nodes of a regular grid over
+    the destination image.
+
+    `xs` and `ys` are the destination pixel coordinates of the grid columns
+    and rows. `src_x` and `src_y` are arrays with the source pixel coordinates
+    of each node (``len(ys)`` x ``len(xs)``). Nodes that could not be
+    transformed are ``nan``.
+    """
+
+    def __init__(self, dst_size: tuple[int, int], xs, ys, src_x, src_y):
+        self.dst_size = dst_size
+        self.xs = xs
+        self.ys = ys
+        self.src_x = src_x
+        self.src_y = src_y
+        self._columns: Optional[tuple[Any, Any]] = None
+
+    def src_coords(self, row_start: int, row_end: int):
+        """
+        Return the interpolated source pixel coordinates for the
+        center of each destination pixel between `row_start` and `row_end`.
+        """
+        if self._columns is None:
+            self._columns = _grid_cells(self.xs, numpy.arange(self.dst_size[0]) + 0.5)
+        cx, tx = self._columns
+        cy, ty = _grid_cells(self.ys, numpy.arange(row_start, row_end) + 0.5)
+        ty = ty[:, numpy.newaxis]
+
+        def interpolate(values):
+            # interpolate the grid columns for each row, then each pixel within the rows
+            rows = values[cy] * (1 - ty) + values[cy + 1] * ty
+            return rows[:, cx] * (1 - tx) + rows[:, cx + 1] * tx
+
+        return interpolate(self.src_x), interpolate(self.src_y)
+
+
+def _grid_cells(nodes, px):
+    """
+    Return the index of the grid cell and the relative position within
+    the cell for each pixel coordinate in `px`.
+    """
+    cells = numpy.searchsorted(nodes, px, side='right') - 1
+    cells = numpy.clip(cells, 0, len(nodes) - 2)
+    t = (px - nodes[cells]) / (nodes[cells + 1] - nodes[cells])
+    return cells, t.astype(numpy.float32)
+
+
+def transform_grid(
+    src_size: tuple[int, int], src_bbox: BBOX, src_srs: _SRS,
+    dst_size: tuple[int, int], dst_bbox: BBOX, dst_srs: _SRS,
+    max_px_err: float = 1,
+) -> TransformGrid:
+    """
+    transform_grid creates a `TransformGrid` with the source pixel coordinates
+    for a regular grid of destination pixel coordinates.
+
+    All nodes of a grid are transformed with a single call to `SRS.transform_to`.
+    The grid starts with cells of `GRID_START_CELL_SIZE` pixel and it is refined
+    till the bilinear interpolation at the center of each cell deviates less
+    than `max_px_err` destination pixel from the actual transformation,
+    or till the cells are `GRID_MIN_CELL_SIZE` pixel small.
+    """
+    if numpy is None:
+        raise ImportError('reprojection_method grid requires numpy')
+
+    src_bbox = src_srs.align_bbox(src_bbox)
+    dst_bbox = dst_srs.align_bbox(dst_bbox)
+
+    src_res = (
+        (src_bbox[2] - src_bbox[0]) / src_size[0],
+        (src_bbox[3] - src_bbox[1]) / src_size[1],
+    )
+    dst_res = (
+        (dst_bbox[2] - dst_bbox[0]) / dst_size[0],
+        (dst_bbox[3] - dst_bbox[1]) / dst_size[1],
+    )
+
+    def to_src_px(dst_px_x, dst_px_y):
+        # transform all points with a single call, returns nan for failed points
+        dst_w_x = dst_bbox[0] + dst_px_x * dst_res[0]
+        dst_w_y = dst_bbox[3] - dst_px_y * dst_res[1]
+        points = list(zip(dst_w_x.ravel().tolist(), dst_w_y.ravel().tolist()))
+        src_w = numpy.array(list(dst_srs.transform_to(src_srs, points)), dtype=float)
+        src_w[~numpy.isfinite(src_w)] = numpy.nan
+        src_px_x = ((src_w[:, 0] - src_bbox[0]) / src_res[0]).astype(numpy.float32)
+        src_px_y = ((src_bbox[3] - src_w[:, 1]) / src_res[1]).astype(numpy.float32)
+        return src_px_x.reshape(dst_px_x.shape), src_px_y.reshape(dst_px_x.shape)
+
+    cell_size = GRID_START_CELL_SIZE
+    while True:
+        xs = _grid_nodes(dst_size[0], cell_size)
+        ys = _grid_nodes(dst_size[1], cell_size)
+
+        # transform grid nodes and cell centers at once
+        xc = (xs[:-1] + xs[1:]) / 2
+        yc = (ys[:-1] + ys[1:]) / 2
+        nodes_x, nodes_y = numpy.meshgrid(xs, ys)
+        centers_x, centers_y = numpy.meshgrid(xc, yc)
+        src_x, src_y = to_src_px(
+            numpy.concatenate([nodes_x.ravel(), centers_x.ravel()]),
+            numpy.concatenate([nodes_y.ravel(), centers_y.ravel()]),
+        )
+        n = nodes_x.size
+        grid = TransformGrid(
+            dst_size, xs, ys,
+            src_x[:n].reshape(nodes_x.shape), src_y[:n].reshape(nodes_x.shape),
+        )
+
+        if cell_size <= GRID_MIN_CELL_SIZE:
+            return grid
+
+        err = _grid_error(grid, src_x[n:].reshape(centers_x.shape), src_y[n:].reshape(centers_x.shape))
+        if err is None or err < max_px_err:
+            return grid
+
+        cell_size //= 2
+
+
+def _grid_nodes(size: int, cell_size: int):
+    """
+    Return the pixel coordinates of the grid nodes for one dimension.
+    """
+    cells = max(1, -(-size // cell_size))
+    return numpy.linspace(0, size, cells + 1)
+
+
+def _grid_error(grid: TransformGrid, center_x, center_y):
+    """
+    Return the maximum deviation (in destination pixel) between the interpolated
+    and the actual source coordinates of all cell centers.
+    Returns ``None`` if the error can't be calculated.
+    """
+    with numpy.errstate(invalid='ignore'):
+        # bilinear interpolation at the center is the mean of all four corners
+        interp_x = (grid.src_x[:-1, :-1] + grid.src_x[:-1, 1:] + grid.src_x[1:, :-1] + grid.src_x[1:, 1:]) / 4
+        interp_y = (grid.src_y[:-1, :-1] + grid.src_y[:-1, 1:] + grid.src_y[1:, :-1] + grid.src_y[1:, 1:]) / 4
+        err = numpy.maximum(numpy.abs(interp_x - center_x), numpy.abs(interp_y - center_y))
+
+        # number of source pixel for one destination pixel, to get the error in destination pixel
+        scale_x = numpy.hypot(numpy.diff(grid.src_x, axis=1), numpy.diff(grid.src_y, axis=1)) \
+            / numpy.diff(grid.xs)[numpy.newaxis, :]
+        scale_y = numpy.hypot(numpy.diff(grid.src_x, axis=0), numpy.diff(grid.src_y, axis=0)) \
+            / numpy.diff(grid.ys)[:, numpy.newaxis]
+        scale = numpy.minimum(
+            numpy.minimum(scale_x[:-1, :], scale_x[1:, :]),
+            numpy.minimum(scale_y[:, :-1], scale_y[:, 1:]),
+        )
+        err = err / scale
+
+    err = err[numpy.isfinite(err)]
+    if not err.size:
+        return None
+    return float(err.max())
+
+
+# modes supported by resample_grid
+GRID_MODES = ('L', 'LA', 'RGB', 'RGBA', 'P')
+# number of destination pixels to resample at once, to limit the memory usage
+GRID_BLOCK_PIXELS = 1024 * 1024
+
+
+def resample_grid(img: Image.Image, grid: TransformGrid, resampling) -> Image.Image:
+    """
+    Create a new image by sampling `img` at the source coordinates of `grid`.
+    Destination pixels outside of `img` are set to 0.
+
+    `resampling` is one of ``nearest``, ``bilinear`` or ``bicubic``. ``P`` images
+    are always sampled with ``nearest``.
+    """
+    mode = img.mode
+    if mode == 'P':
+        resampling = 'nearest'
+    src = numpy.asarray(img)
+    src_h, src_w = src.shape[:2]
+    bands = src.shape[2] if src.ndim == 3 else 1
+    src = src.reshape(src_h * src_w, bands)
+
+    dst_w, dst_h = grid.dst_size
+    dst = numpy.empty((dst_h * dst_w, bands), dtype=src.dtype)
+
+    offsets: tuple[int, ...] = ()
+    kernel: Optional[Callable] = None
+    if resampling == 'bilinear':
+        offsets, kernel = (0, 1), _bilinear_weights
+    elif resampling == 'bicubic':
+        offsets, kernel = (-1, 0, 1, 2), _bicubic_weights
+    # interpolate colors with premultiplied alpha, like PIL
+    alpha = mode in ('LA', 'RGBA')
+    if kernel is not None:
+        # contiguous float planes for each band are faster to sample and weight
+        planes = [src[:, band].astype(numpy.float32) for band in range(bands)]
+        if alpha:
+            for band in range(bands - 1):
+                planes[band] *= planes[-1] / 255
+
+    block_rows = max(1, GRID_BLOCK_PIXELS // dst_w)
+    for row_start in range(0, dst_h, block_rows):
+        row_end = min(dst_h, row_start + block_rows)
+        x, y = grid.src_coords(row_start, row_end)
+        x = x.ravel()
+        y = y.ravel()
+
+        with numpy.errstate(invalid='ignore'):
+            invalid = ~((x >= 0) & (x < src_w) & (y >= 0) & (y < src_h))
+        x[invalid] = 0
+        y[invalid] = 0
+
+        if kernel is None:
+            idx = y.astype(numpy.intp) * src_w + x.astype(numpy.intp)
+            values = src.take(idx, axis=0, mode='clip')
+        else:
+            # pixel centers are at .5
+            x -= 0.5
+            y -= 0.5
+            x0 = numpy.floor(x)
+            y0 = numpy.floor(y)
+            wx = kernel(x - x0)
+            wy = kernel(y - y0)
+            x0 = x0.astype(numpy.intp)
+            y0 = y0.astype(numpy.intp)
+
+            cols = [numpy.clip(x0 + dx, 0, src_w - 1) for dx in offsets]
+            values = numpy.zeros((bands, x.size), dtype=numpy.float32)
+            row = numpy.empty((bands, x.size), dtype=numpy.float32)
+            tmp = numpy.empty(x.size, dtype=numpy.float32)
+            for j, dy in enumerate(offsets):
+                row_idx = numpy.clip(y0 + dy, 0, src_h - 1) * src_w
+                row.fill(0)
+                for i, col_idx in enumerate(cols):
+                    idx = row_idx + col_idx
+                    for band in range(bands):
+                        planes[band].take(idx, out=tmp, mode='clip')
+                        tmp *= wx[i]
+                        row[band] += tmp
+                row *= wy[j]
+                values += row
+            if alpha:
+                numpy.clip(values[-1], 0, 255, out=values[-1])
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    unpremultiply = numpy.where(values[-1] > 0, 255 / values[-1], 0)
+                values[:-1] *= unpremultiply
+            numpy.rint(values, out=values)
+            numpy.clip(values, 0, 255, out=values)
+            values = values.T.astype(src.dtype)
+
+        values[invalid] = 0
+        dst[row_start * dst_w:row_end * dst_w] = values
+
+    result = Image.frombytes(mode, (dst_w, dst_h), dst.tobytes())
+    if mode == 'P':
+        palette_mode = img.palette.mode if img.palette else 'RGB'
+        palette = img.getpalette(rawmode=palette_mode)
+        if palette is not None:
+            result.putpalette(palette, rawmode=palette_mode)
+        if 'transparency' in img.info:
+            result.info['transparency'] = img.info['transparency']
+    return result
+
+
+def _bilinear_weights(t):
+    return (1 - t, t)
+
+
+def _bicubic_weights(t, a=-0.5):
+    """
+    Weights of the cubic convolution kernel for the four pixels around `t`
+    (same kernel as PIL).
+    """
+    def near(d):
+        return ((a + 2) * d - (a + 3)) * d * d + 1
+
+    def far(d):
+        return ((a * d - 5 * a) * d + 8 * a) * d - 4 * a
+
+    t = t.astype(numpy.float32)
+
+    return (far(t + 1), near(t), near(1 - t), far(2 - t))
+
+
 def center_quad_transform(quad, src_quad):
     """
     center_quad_transfrom transforms the center pixel coordinates
@@ -19,6 +19,9 @@ Service responses.
 
 import copy
 import hashlib
+import io
+import os
+import stat
 from mapproxy.util.times import format_httpdate, parse_httpdate, timestamp
 
 
@@ -125,6 +128,9 @@ class Response(object):
 
         if not_modified:
             self.status = 304
+            if hasattr(self.response, 'close'):
+                # e.g. open tile file
+                self.response.close()
             self.response = []
             if 'Content-type' in self.headers:
                 del self.headers['Content-type']
@@ -154,19 +160,38 @@ class Response(object):
             headers.append((key, value))
         return headers
 
+    def _file_size(self):
+        """
+        Return the size of a file response from the file system, without
+        seeking. Returns ``None`` for file-like objects (BytesIO, etc.).
+        """
+        try:
+            st = os.fstat(self.response.fileno())
+            if not stat.S_ISREG(st.st_mode) or self.response.tell() != 0:
+                # sockets, pipes, etc. or partly read files
+                return None
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            return None
+        return st.st_size
+
     def __call__(self, environ, start_response):
         if hasattr(self.response, 'read'):
-            if ((not hasattr(self.response, 'ok_to_seek') or
-                self.response.ok_to_seek) and
-               (hasattr(self.response, 'seek') and
+            file_size = self._file_size()
+            if file_size is not None:
+                self.headers['Content-length'] = str(file_size)
+            elif ((not hasattr(self.response, 'ok_to_seek') or
+                  self.response.ok_to_seek) and
+                 (hasattr(self.response, 'seek') and
                     hasattr(self.response, 'tell'))):
                 self.response.seek(0, 2)  # to EOF
                 self.headers['Content-length'] = str(self.response.tell())
                 self.response.seek(0)
             if 'wsgi.file_wrapper' in environ:
+                # allows the server to send files with sendfile without
+                # reading them into memory
                 resp_iter = environ['wsgi.file_wrapper'](self.response, self.block_size)
             else:
-                resp_iter = iter(lambda: self.response.read(self.block_size), b'')
+                resp_iter = FileIterator(self.response, self.block_size)
         elif not self.response:
             resp_iter = iter([])
         elif isinstance(self.response, str):
@@ -189,6 +214,30 @@ class Response(object):
             yield chunk
 
 
+class FileIterator(object):
+    """
+    Iterates over a file in blocks and closes the file when the
+    server closes the iterator (like the ``wsgi.file_wrapper`` of PEP 3333).
+    """
+
+    def __init__(self, filelike, block_size):
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.filelike.read(self.block_size)
+        if not data:
+            raise StopIteration
+        return data
+
+    def close(self):
+        if hasattr(self.filelike, 'close'):
+            self.filelike.close()
+
+
 # http://www.faqs.org/rfcs/rfc2616.html
 _status_codes = {
     100: 'Continue',
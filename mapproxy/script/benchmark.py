@@ -0,0 +1,541 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks for the tile serving and seeding hot paths.
+
+All benchmarks run offline. Sources are replaced by a local stand-in that
+returns a generated image and caches are created in a temporary directory.
+The results are written as JSON, so that they can be compared between
+releases.
+"""
+
+from __future__ import print_function
+
+import datetime
+import json
+import optparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+
+from PIL import Image, ImageDraw, features
+
+from mapproxy.cache.base import TileCacheBase
+from mapproxy.cache.dummy import DummyLocker
+from mapproxy.cache.tile import Tile
+from mapproxy.cache.tile_creator import split_meta_tiles
+from mapproxy.cache.tile_manager import TileManager
+from mapproxy.grid.meta_grid import MetaGrid
+from mapproxy.grid.tile_grid import tile_grid_for_epsg
+from mapproxy.image import ImageResult, img_to_buf
+from mapproxy.image.merge import LayerMerger
+from mapproxy.image.opts import ImageOptions
+from mapproxy.image.transform import ImageTransformer, transform_cache
+from mapproxy.layer.map_layer import MapLayer
+from mapproxy.seed.seeder import SeedTask, TileWalker
+from mapproxy.srs import SRS
+from mapproxy.util.coverage import BBOXCoverage
+from mapproxy.version import version
+
+
+class BenchmarkSkipped(Exception):
+    pass
+
+
+class BenchmarkContext(object):
+    """
+    Options and a temporary directory for the benchmarks.
+    """
+
+    def __init__(self, tmp_dir, redis=None):
+        self.tmp_dir = tmp_dir
+        self.redis = redis
+
+
+# name -> setup function, see `benchmark`
+benchmarks = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Register a benchmark.
+
+    The decorated function is used as a context manager with a
+    `BenchmarkContext` and it yields a function that runs the benchmark
+    once and the number of operations (e.g. tiles) of each run.
+    """
+    def wrapper(func):
+        benchmarks[name] = contextmanager(func)
+        return func
+    return wrapper
+
+
+def create_test_image(size, mode='RGBA'):
+    """
+    Create an image with gradients and lines, that compresses
+    similar to a typical map tile.
+    """
+    w, h = size
+    gradient = Image.linear_gradient('L').resize(size)
+    img = Image.merge('RGB', [
+        gradient, gradient.rotate(90), Image.radial_gradient('L').resize(size),
+    ])
+    if mode == 'RGBA':
+        img.putalpha(255)
+    draw = ImageDraw.Draw(img)
+    for i in range(0, w + h, 16):
+        draw.line((i, 0, i - h, h), fill=(255, 255, 255), width=2)
+        draw.line((0, i, w, i - w // 2), fill=(40, 40, 40), width=1)
+    if mode == 'RGBA':
+        draw.rectangle((w // 4, h // 4, w // 2, h // 2), fill=(0, 0, 0, 0))
+    return img
+
+
+class StandInSource(MapLayer):
+    """
+    Local replacement for a WMS or tile source. Returns a generated
+    image for each request.
+    """
+    supports_meta_tiles = True
+
+    def __init__(self, image_opts=None):
+        super().__init__(image_opts=image_opts)
+        self._images = {}
+
+    def get_map(self, query):
+        img = self._images.get(query.size)
+        if img is None:
+            img = self._images[query.size] = create_test_image(query.size)
+        return ImageResult(img, image_opts=self.image_opts)
+
+
+class EncodingCache(TileCacheBase):
+    """
+    Cache that encodes, but does not store new tiles.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.stored_bytes = 0
+
+    def is_cached(self, tile, dimensions=None):
+        return False
+
+    def load_tile(self, tile, with_metadata=False, dimensions=None):
+        return False
+
+    def store_tile(self, tile, dimensions=None):
+        self.stored_bytes += len(tile.image_result_buffer().read())
+        return True
+
+    def remove_tile(self, tile, dimensions=None):
+        return True
+
+    def load_tile_metadata(self, tile, dimensions=None):
+        pass
+
+
+CACHE_HIT_TILES = 16
+
+
+def _cache_hit_benchmark(cache):
+    """
+    Store a block of tiles in `cache` and return a function that loads all tiles.
+    """
+    data = img_to_buf(create_test_image((256, 256)), ImageOptions(format='image/png')).read()
+    coords = [(x, y, 8) for x in range(CACHE_HIT_TILES) for y in range(CACHE_HIT_TILES)]
+    for coord in coords:
+        cache.store_tile(Tile(coord, ImageResult(BytesIO(data))))
+    if hasattr(cache, 'cleanup'):
+        cache.cleanup()
+
+    def run():
+        for coord in coords:
+            tile = Tile(coord)
+            if not cache.load_tile(tile):
+                raise AssertionError('tile %r not cached' % (coord, ))
+            tile.image_result_buffer().read()
+            tile.image_result.close_buffers()
+
+    return run, len(coords)
+
+
+@benchmark('cache_hit.file')
+def bench_cache_hit_file(ctx):
+    from mapproxy.cache.file import FileCache
+    yield _cache_hit_benchmark(FileCache(ctx.tmp_dir + '/file', 'png'))
+
+
+@benchmark('cache_hit.mbtiles')
+def bench_cache_hit_mbtiles(ctx):
+    from mapproxy.cache.mbtiles import MBTilesCache
+    cache = MBTilesCache(ctx.tmp_dir + '/cache.mbtiles')
+    yield _cache_hit_benchmark(cache)
+    cache.cleanup()
+
+
+@benchmark('cache_hit.geopackage')
+def bench_cache_hit_geopackage(ctx):
+    from mapproxy.cache.geopackage import GeopackageCache
+    cache = GeopackageCache(ctx.tmp_dir + '/cache.gpkg', tile_grid_for_epsg(3857), 'tiles')
+    yield _cache_hit_benchmark(cache)
+    cache.cleanup()
+
+
+@benchmark('cache_hit.compact_v1')
+def bench_cache_hit_compact_v1(ctx):
+    from mapproxy.cache.compact import CompactCacheV1
+    yield _cache_hit_benchmark(CompactCacheV1(ctx.tmp_dir + '/compact_v1'))
+
+
+@benchmark('cache_hit.compact_v2')
+def bench_cache_hit_compact_v2(ctx):
+    from mapproxy.cache.compact import CompactCacheV2
+    yield _cache_hit_benchmark(CompactCacheV2(ctx.tmp_dir + '/compact_v2'))
+
+
+@benchmark('cache_hit.redis')
+def bench_cache_hit_redis(ctx):
+    from mapproxy.cache.redis import RedisCache, redis
+    if redis is None:
+        raise BenchmarkSkipped('redis package not installed')
+    if not ctx.redis:
+        raise BenchmarkSkipped('requires --redis host:port')
+    host, port = ctx.redis.rsplit(':', 1)
+    prefix = 'mapproxy-benchmark-%d:' % (time.time() * 1000, )
+    cache = RedisCache(host, int(port), prefix=prefix)
+    try:
+        yield _cache_hit_benchmark(cache)
+    finally:
+        keys = list(cache.r.scan_iter(prefix + '*'))
+        if keys:
+            cache.r.delete(*keys)
+
+
+def _tile_manager(cache, meta_size=(4, 4), meta_buffer=0):
+    return TileManager(
+        tile_grid_for_epsg(3857), cache, [StandInSource()], 'png', locker=DummyLocker(),
+        image_opts=ImageOptions(format='image/png'), meta_size=meta_size, meta_buffer=meta_buffer,
+    )
+
+
+@benchmark('meta_tile.create')
+def bench_meta_tile_create(ctx):
+    tile_mgr = _tile_manager(EncodingCache(), meta_buffer=80)
+    creator = tile_mgr.creator()
+
+    def run():
+        tiles = creator.create_tiles([Tile((16, 16, 8))])
+        assert len(tiles) == 16
+
+    yield run, 16
+
+
+@benchmark('meta_tile.split')
+def bench_meta_tile_split(ctx):
+    meta_grid = MetaGrid(tile_grid_for_epsg(3857), meta_size=(4, 4), meta_buffer=80)
+    meta_tile = meta_grid.meta_tile((16, 16, 8))
+    meta_img = ImageResult(create_test_image(meta_tile.size))
+    image_opts = ImageOptions(format='image/png')
+
+    def run():
+        tiles = split_meta_tiles(meta_img, meta_tile.tile_patterns, (256, 256), image_opts)
+        for tile in tiles:
+            tile.image_result.as_image()
+
+    yield run, 16
+
+
+@benchmark('meta_tile.split_paletted')
+def bench_meta_tile_split_paletted(ctx):
+    meta_grid = MetaGrid(tile_grid_for_epsg(3857), meta_size=(4, 4), meta_buffer=80)
+    meta_tile = meta_grid.meta_tile((16, 16, 8))
+    meta_img = ImageResult(create_test_image(meta_tile.size))
+    image_opts = ImageOptions(format='image/png', colors=256)
+
+    def run():
+        tiles = split_meta_tiles(meta_img, meta_tile.tile_patterns, (256, 256), image_opts, quantize=True)
+        for tile in tiles:
+            tile.image_result.as_buffer()
+
+    yield run, 16
+
+
+@benchmark('merge.layers')
+def bench_merge_layers(ctx):
+    size = (512, 512)
+    layers = [ImageResult(create_test_image(size)) for _ in range(3)]
+    image_opts = ImageOptions(transparent=True, format='image/png')
+
+    def run():
+        merger = LayerMerger()
+        for layer in layers:
+            merger.add(layer)
+        merger.merge(image_opts, size=size).as_image()
+
+    yield run, 1
+
+
+ENCODING_FORMATS = OrderedDict([
+    ('png', ImageOptions(format='image/png')),
+    ('png8', ImageOptions(format='image/png', colors=256)),
+    ('jpeg', ImageOptions(format='image/jpeg', encoding_options={'jpeg_quality': 90})),
+    ('webp', ImageOptions(format='image/webp')),
+    ('tiff', ImageOptions(format='image/tiff')),
+])
+
+
+def _encode_benchmark(image_opts):
+    if image_opts.format.ext == 'webp' and not features.check('webp'):
+        raise BenchmarkSkipped('Pillow without WebP support')
+    img = create_test_image((256, 256), mode='RGB' if 'jpeg' in image_opts.format else 'RGBA')
+
+    def run():
+        img_to_buf(img, image_opts)
+
+    return run, 1
+
+
+def _register_encode_benchmark(format, image_opts):
+    def bench_encode(ctx):
+        yield _encode_benchmark(image_opts)
+    benchmark('encode.' + format)(bench_encode)
+
+
+for format, image_opts in ENCODING_FORMATS.items():
+    _register_encode_benchmark(format, image_opts)
+
+
+def _transform_benchmark(reprojection):
+    if reprojection == 'grid':
+        from mapproxy.image.transform import numpy
+        if numpy is None:
+            raise BenchmarkSkipped('numpy not installed')
+
+    src_srs = SRS(3857)
+    dst_srs = SRS(25832)
+    dst_bbox = (158512, 4428236, 1012321, 6111268)
+    src_bbox = dst_srs.transform_bbox_to(src_srs, dst_bbox)
+    src_img = ImageResult(create_test_image((1024, 1024)))
+    image_opts = ImageOptions(resampling='bicubic', reprojection=reprojection)
+
+    def run():
+        # measure the full transformation, not cached meshes
+        transform_cache.clear()
+        ImageTransformer(src_srs, dst_srs).transform(src_img, src_bbox, (1024, 1024), dst_bbox, image_opts)
+
+    return run, 1
+
+
+@benchmark('transform.mesh')
+def bench_transform_mesh(ctx):
+    yield _transform_benchmark('mesh')
+
+
+@benchmark('transform.grid')
+def bench_transform_grid(ctx):
+    yield _transform_benchmark('grid')
+
+
+class InProcessSeedPool(object):
+    """
+    Seeds tiles in the current thread, instead of TileWorkerPool.
+    """
+
+    def __init__(self, tile_mgr, dry_run=False):
+        self.tile_mgr = tile_mgr
+        self.dry_run = dry_run
+        self.tiles = 0
+
+    def process(self, tiles, progress):
+        self.tiles += len([t for t in tiles if t is not None])
+        if not self.dry_run:
+            self.tile_mgr.load_tile_coords(tiles)
+
+
+def _seed_benchmark(levels, dry_run):
+    tile_mgr = _tile_manager(EncodingCache())
+    md = dict(name='benchmark', cache_name='benchmark', grid_name='GLOBAL_WEBMERCATOR')
+    # part of central europe
+    coverage = BBOXCoverage((5, 45, 15, 55), SRS(4326))
+    task = SeedTask(md, tile_mgr, levels, refresh_timestamp=None, refresh_all=False, coverage=coverage)
+
+    pool = InProcessSeedPool(tile_mgr, dry_run=dry_run)
+    TileWalker(task, pool, handle_uncached=True).walk()
+    num_tiles = pool.tiles
+
+    def run():
+        TileWalker(task, pool, handle_uncached=True).walk()
+
+    return run, num_tiles
+
+
+@benchmark('seed.walk')
+def bench_seed_walk(ctx):
+    yield _seed_benchmark(list(range(0, 13)), dry_run=True)
+
+
+@benchmark('seed.tiles')
+def bench_seed_tiles(ctx):
+    yield _seed_benchmark(list(range(0, 8)), dry_run=False)
+
+
+def run_benchmark(name, ctx, repeat=5, min_time=0.2):
+    """
+    Run a single benchmark and return the result as a dictionary.
+
+    Each benchmark runs `repeat` times. Each repetition runs the benchmark
+    as often as required to take at least `min_time` seconds.
+    """
+    result = OrderedDict(name=name)
+    try:
+        with benchmarks[name](ctx) as (func, ops):
+            func()  # warm up
+
+            number = 1
+            while True:
+                start = time.perf_counter()
+                for _ in range(number):
+                    func()
+                duration = time.perf_counter() - start
+                if duration >= min_time:
+                    break
+                number *= 2
+
+            timings = [duration / number]
+            for _ in range(repeat - 1):
+                start = time.perf_counter()
+                for _ in range(number):
+                    func()
+                timings.append((time.perf_counter() - start) / number)
+    except BenchmarkSkipped as ex:
+        result['skipped'] = str(ex)
+        return result
+
+    timings.sort()
+    best = timings[0]
+    result['ops'] = ops
+    result['number'] = number
+    result['repeat'] = len(timings)
+    result['best'] = best
+    result['median'] = timings[len(timings) // 2]
+    result['ops_per_sec'] = ops / best if best else None
+    return result
+
+
+def _is_selected(name, names):
+    """
+    Return whether the benchmark `name` is one of `names` or in one of
+    the groups in `names`.
+
+    >>> _is_selected('encode.png', ['encode'])
+    True
+    >>> _is_selected('encode.png', ['cache_hit', 'encode.png'])
+    True
+    >>> _is_selected('encode.png8', ['encode.png'])
+    False
+    """
+    return any(name == n or name.startswith(n.rstrip('.') + '.') for n in names)
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.2, redis=None, progress=None):
+    """
+    Run all benchmarks that are in `names` or in one of the groups in `names`
+    (or all benchmarks) and return the results as a dictionary.
+    """
+    selected = [n for n in benchmarks if not names or _is_selected(n, names)]
+    tmp_dir = tempfile.mkdtemp(prefix='mapproxy-benchmark-')
+    results = []
+    try:
+        for name in selected:
+            ctx = BenchmarkContext(os.path.join(tmp_dir, name), redis=redis)
+            os.makedirs(ctx.tmp_dir)
+            result = run_benchmark(name, ctx, repeat=repeat, min_time=min_time)
+            if progress:
+                progress(result)
+            results.append(result)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return OrderedDict([
+        ('mapproxy_version', version),
+        ('python_version', platform.python_version()),
+        ('platform', platform.platform()),
+        ('date', datetime.datetime.now(datetime.timezone.utc).isoformat()),
+        ('repeat', repeat),
+        ('min_time', min_time),
+        ('benchmarks', results),
+    ])
+
+
+def format_result(result):
+    if 'skipped' in result:
+        return '%-24s skipped: %s' % (result['name'], result['skipped'])
+    return '%-24s %12.1f ops/s  (%.3fms per run, %d ops)' % (
+        result['name'], result['ops_per_sec'], result['best'] * 1000, result['ops'])
+
+
+def benchmark_command(args=None):
+    parser = optparse.OptionParser("%prog benchmark [options]")
+    parser.add_option("-b", "--benchmarks", dest="benchmarks", metavar='name1,name2,...',
+                      help="only run these benchmarks or groups of benchmarks (e.g. cache_hit,encode.png)")
+    parser.add_option("-l", "--list", dest="list", action="store_true", default=False,
+                      help="list available benchmarks")
+    parser.add_option("-o", "--output", dest="output",
+                      help="write JSON results to this file (default: stdout)")
+    parser.add_option("--repeat", dest="repeat", type=int, default=5,
+                      help="repeat each benchmark (default: 5)")
+    parser.add_option("--min-time", dest="min_time", type=float, default=0.2,
+                      help="minimal duration of each repetition in seconds (default: 0.2)")
+    parser.add_option("--redis", dest="redis", metavar='host:port',
+                      help="Redis server for the cache_hit.redis benchmark")
+
+    if args:
+        args = args[1:]  # remove script name
+
+    (options, args) = parser.parse_args(args)
+
+    if options.list:
+        for name in benchmarks:
+            print(name)
+        return
+
+    names = options.benchmarks.split(',') if options.benchmarks else None
+    if names:
+        unknown = [n for n in names if not any(_is_selected(b, [n]) for b in benchmarks)]
+        if unknown:
+            print('ERROR: unknown benchmarks: %s' % (', '.join(unknown), ), file=sys.stderr)
+            sys.exit(1)
+
+    def progress(result):
+        print(format_result(result), file=sys.stderr)
+
+    results = run_benchmarks(names, repeat=options.repeat, min_time=options.min_time,
+                             redis=options.redis, progress=progress)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
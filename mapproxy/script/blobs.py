@@ -0,0 +1,97 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import optparse
+import sys
+from collections import OrderedDict
+
+from mapproxy.config import local_base_config
+from mapproxy.config.loader import load_configuration
+from mapproxy.config.configuration.base import ConfigurationError
+
+import logging
+
+
+def remove_blobs_command(args=None):
+    parser = optparse.OptionParser("%prog remove-unreferenced-blobs [options] -f mapproxy_conf")
+    parser.add_option("-f", "--mapproxy-conf", dest="mapproxy_conf",
+                      help="MapProxy configuration.")
+
+    parser.add_option(
+        "--min-age", type=float, default=60.0,
+        help="Only remove data that was stored at least this many minutes ago (default 60)")
+
+    parser.add_option("--dry-run", "-n", action="store_true",
+                      help="Do not remove, only print the number of unreferenced blobs")
+
+    parser.add_option("--caches", dest="cache_names", metavar='cache1,cache2,...',
+                      help="only clean up the named caches")
+
+    from mapproxy.script.util import setup_logging
+    setup_logging(logging.WARN)
+
+    if args:
+        args = args[1:]  # remove script name
+
+    (options, args) = parser.parse_args(args)
+    if not options.mapproxy_conf:
+        parser.print_help()
+        sys.exit(1)
+
+    try:
+        proxy_configuration = load_configuration(options.mapproxy_conf, seed=True)
+    except IOError as e:
+        print('ERROR: ', "%s: '%s'" % (e.strerror, e.filename), file=sys.stderr)
+        sys.exit(2)
+    except ConfigurationError as e:
+        print(e, file=sys.stderr)
+        print('ERROR: invalid configuration (see above)', file=sys.stderr)
+        sys.exit(2)
+
+    with local_base_config(proxy_configuration.base_config):
+        available_caches = OrderedDict()
+        for name, cache_conf in proxy_configuration.caches.items():
+            for grid, extent, tile_mgr in cache_conf.caches():
+                if deduplicated_blob_cache(tile_mgr.cache):
+                    available_caches.setdefault(name, []).append(tile_mgr.cache)
+
+        if options.cache_names:
+            cleanup_caches = options.cache_names.split(',')
+            missing = set(cleanup_caches).difference(available_caches.keys())
+            if missing:
+                print('unknown caches: %s' % (', '.join(missing), ))
+                print('available deduplicated s3, azureblob and redis caches: %s' %
+                      (', '.join(available_caches.keys()), ))
+                sys.exit(1)
+        else:
+            cleanup_caches = None
+
+        for name, caches in available_caches.items():
+            if cleanup_caches and name not in cleanup_caches:
+                continue
+            for cache in caches:
+                num = cache.remove_unreferenced_blobs(min_age=options.min_age * 60, dry_run=options.dry_run)
+                print('%s: %s %d unreferenced blobs' % (
+                    name, 'found' if options.dry_run else 'removed', num))
+
+
+def deduplicated_blob_cache(cache):
+    """
+    Return whether `cache` stores deduplicated tile data in separate blobs
+    that are not removed with the tiles.
+    """
+    return getattr(cache, 'deduplicate', False) and hasattr(cache, 'remove_unreferenced_blobs')
@@ -22,7 +22,7 @@ import re
 import sys
 from collections import OrderedDict
 
-from mapproxy.cache.compact import CompactCacheV1, CompactCacheV2
+from mapproxy.cache.compact import CompactCacheV1, CompactCacheV2, mapped_files
 from mapproxy.cache.tile import Tile
 from mapproxy.config import local_base_config
 from mapproxy.config.loader import load_configuration
@@ -64,7 +64,7 @@ def defrag_command(args=None):
         sys.exit(1)
 
     try:
-        proxy_configuration = load_configuration(options.mapproxy_conf)
+        proxy_configuration = load_configuration(options.mapproxy_conf, seed=True)
     except IOError as e:
         print('ERROR: ', "%s: '%s'" % (e.strerror, e.filename), file=sys.stderr)
         sys.exit(2)
@@ -161,7 +161,7 @@ def defrag_compact_cache(cache, min_percent=0.1, min_bytes=1024*1024, log_progre
             continue
 
         tmp_bundle = os.path.join(cache.cache_dir, 'tmp_defrag')
-        defb = cache.bundle_class(tmp_bundle, offset)
+        defb = cache.bundle_class(tmp_bundle, offset, deduplicate=cache.deduplicate)
         stored_tiles = False
 
         for y in range(128):
@@ -172,6 +172,12 @@ def defrag_compact_cache(cache, min_percent=0.1, min_bytes=1024*1024, log_progre
                 stored_tiles = True
                 defb.store_tiles(tiles)
 
+        # close mappings of the old files
+        mapped_files.invalidate(bundle_file)
+        mapped_files.invalidate(bundle_file[:-1] + 'x')
+        mapped_files.invalidate(tmp_bundle + '.bundle')
+        mapped_files.invalidate(tmp_bundle + '.bundlx')
+
         # remove first
         # - in case bundle is empty
         # - windows does not support rename to existing files
@@ -0,0 +1,151 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import os
+import sys
+import optparse
+
+from mapproxy.srs import SRS
+from mapproxy.config import local_base_config
+from mapproxy.config.coverage import load_coverage
+from mapproxy.config.loader import load_configuration
+from mapproxy.config.configuration.base import ConfigurationError
+from mapproxy.util.coverage import BBOXCoverage
+from mapproxy.script.export import parse_levels
+from mapproxy.seed.util import ProgressLog, format_bbox
+from mapproxy.seed.seeder import SeedTask, build_levels
+
+
+def format_build_task(task):
+    info = []
+    info.append("Building cache '%s' with grid '%s' in %s" % (
+        task.md['cache_name'], task.md['grid_name'], task.grid.srs.srs_code))
+    if task.coverage:
+        info.append('  Limited to: %s (EPSG:4326)' % (format_bbox(task.coverage.extent.llbbox), ))
+    info.append('  Levels: %d..%d from cached level %d' % (task.levels[0], task.levels[-1] - 1, task.levels[-1]))
+
+    return '\n'.join(info)
+
+
+def build_pyramid_command(args=None):
+    parser = optparse.OptionParser("%prog build-pyramid [options] -f mapproxy_conf")
+    parser.add_option("-f", "--mapproxy-conf", dest="mapproxy_conf",
+                      help="MapProxy configuration")
+
+    parser.add_option("-q", "--quiet",
+                      action="count", dest="quiet", default=0,
+                      help="reduce number of messages to stdout, repeat to disable progress output")
+
+    parser.add_option("--cache",
+                      help="the cache to build")
+
+    parser.add_option("--grid",
+                      help="the grid of the cache to build. defaults to the first grid of the cache")
+
+    parser.add_option("--levels",
+                      help="levels to build: e.g. 0..10 builds the levels 0 to 9 from"
+                      " the already cached tiles of level 10")
+
+    parser.add_option("--rebuild",
+                      action='store_true', default=False,
+                      help="also rebuild tiles that are already cached")
+
+    parser.add_option("-n", "--dry-run",
+                      action="store_true", default=False,
+                      help="do not build, just print output")
+
+    parser.add_option("-c", "--concurrency", type="int",
+                      dest="concurrency", default=2,
+                      help="number of parallel build processes")
+
+    parser.add_option("--coverage",
+                      help="the coverage as a BBOX string, WKT file "
+                      "or OGR datasource")
+    parser.add_option("--srs",
+                      help="the SRS of the coverage")
+    parser.add_option("--where",
+                      help="filter for OGR coverages")
+
+    from mapproxy.script.util import setup_logging
+    import logging
+    setup_logging(logging.WARN)
+
+    if args:
+        args = args[1:]  # remove script name
+
+    (options, args) = parser.parse_args(args)
+
+    required_options = ['mapproxy_conf', 'cache', 'levels']
+    for required in required_options:
+        if not getattr(options, required):
+            print('ERROR: missing required option --%s' % required.replace('_', '-'), file=sys.stderr)
+            parser.print_help()
+            sys.exit(1)
+
+    try:
+        conf = load_configuration(options.mapproxy_conf, seed=True)
+    except IOError as e:
+        print('ERROR: ', "%s: '%s'" % (e.strerror, e.filename), file=sys.stderr)
+        sys.exit(2)
+    except ConfigurationError as e:
+        print(e, file=sys.stderr)
+        print('ERROR: invalid configuration (see above)', file=sys.stderr)
+        sys.exit(2)
+
+    if options.cache not in conf.caches:
+        print('ERROR: unknown cache %s' % (options.cache, ), file=sys.stderr)
+        print('available caches: %s' % (', '.join(conf.caches.keys()), ), file=sys.stderr)
+        sys.exit(1)
+
+    levels = parse_levels(options.levels)
+    if len(levels) < 2:
+        print('ERROR: --levels needs at least two levels', file=sys.stderr)
+        sys.exit(1)
+
+    with local_base_config(conf.base_config):
+        tile_mgrs = dict((tile_grid.name, (tile_grid, mgr))
+                         for tile_grid, extent, mgr in conf.caches[options.cache].caches())
+        grid_name = options.grid or next(iter(tile_mgrs))
+        if grid_name not in tile_mgrs:
+            print('ERROR: cache %s has no grid %s' % (options.cache, grid_name), file=sys.stderr)
+            sys.exit(1)
+        tile_grid, mgr = tile_mgrs[grid_name]
+
+        if levels[-1] >= tile_grid.levels:
+            print('ERROR: grid only has %d levels' % tile_grid.levels, file=sys.stderr)
+            sys.exit(2)
+
+        if options.coverage:
+            srs = SRS(options.srs) if options.srs else tile_grid.srs
+            coverage = load_coverage(
+                {'datasource': options.coverage, 'srs': srs, 'where': options.where},
+                base_path=os.getcwd())
+        else:
+            coverage = BBOXCoverage(tile_grid.bbox, tile_grid.srs)
+
+        md = dict(name='build-pyramid', cache_name=options.cache, grid_name=grid_name)
+        task = SeedTask(md, mgr, levels, refresh_timestamp=None, refresh_all=options.rebuild, coverage=coverage)
+
+        print(format_build_task(task))
+
+        logger = ProgressLog(verbose=options.quiet == 0, silent=options.quiet >= 2)
+        try:
+            build_levels(task, concurrency=options.concurrency, dry_run=options.dry_run,
+                         progress_logger=logger)
+        except KeyboardInterrupt:
+            print('stopping...', file=sys.stderr)
+            sys.exit(2)
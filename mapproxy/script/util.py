@@ -26,10 +26,13 @@ import logging
 from logging.config import fileConfig
 
 from mapproxy.config.loader import load_plugins
+from mapproxy.script.benchmark import benchmark_command
+from mapproxy.script.blobs import remove_blobs_command
 from mapproxy.script.conf.app import config_command
 from mapproxy.script.defrag import defrag_command
 from mapproxy.script.export import export_command
 from mapproxy.script.grids import grids_command
+from mapproxy.script.pyramid import build_pyramid_command
 from mapproxy.script.scales import scales_command
 from mapproxy.script.wms_capabilities import wms_capabilities_command
 from mapproxy.script.gridconf_from_ogcapitilematrixset import gridconf_from_ogcapitilematrixset_command
@@ -323,14 +326,26 @@ commands: dict[str, dict[str, object]] = {
         'func': config_command,
         'help': 'Create config from WMS capabilities or a Geopackage file.'
     },
+    'build-pyramid': {
+        'func': build_pyramid_command,
+        'help': 'Build lower levels of a cache from already cached levels.'
+    },
     'defrag-compact-cache': {
         'func': defrag_command,
         'help': 'De-fragmentate compact caches.'
     },
+    'remove-unreferenced-blobs': {
+        'func': remove_blobs_command,
+        'help': 'Remove unreferenced data of deduplicated caches.'
+    },
     'gridconf-from-ogcapitilematrixset': {
         'func': gridconf_from_ogcapitilematrixset_command,
         'help': 'Export OGC API TileMatrixSet as MapProxy grid configuration.'
     },
+    'benchmark': {
+        'func': benchmark_command,
+        'help': 'Run benchmarks for tile serving and seeding.'
+    },
 }
 
 
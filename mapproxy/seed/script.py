@@ -30,11 +30,12 @@ from optparse import OptionParser, OptionValueError
 from mapproxy.config.loader import load_configuration
 from mapproxy.config.configuration.base import ConfigurationError
 from mapproxy.seed.config import load_seed_tasks_conf
-from mapproxy.seed.seeder import seed, SeedInterrupted
+from mapproxy.seed.seeder import seed, SeedInterrupted, enqueue_seed_tasks, seed_from_queue
 from mapproxy.seed.cleanup import cleanup
-from mapproxy.seed.util import (format_seed_task, format_cleanup_task,
+from mapproxy.seed.util import (format_seed_task, format_cleanup_task, format_queue_status,
                                 ProgressLog, ProgressStore)
 from mapproxy.seed.cachelock import CacheLocker
+from mapproxy.seed.workqueue import load_work_queue
 
 SECONDS_PER_DAY = 60 * 60 * 24
 SECONDS_PER_MINUTE = 60
@@ -111,6 +112,33 @@ class SeedScript(object):
                       help="only treat tiles which are already present in the cache."
                            " This can be used with the configuration entry `refresh_before`"
                            " to refresh only the existing cache.")
+    parser.add_option("--subtrees",
+                      action="store_true", dest="subtrees", default=False,
+                      help="partition the coverage into subtrees that are walked and seeded"
+                           " independently by each seed process")
+    parser.add_option("--subtree-level",
+                      type="int", dest="subtree_level", default=None,
+                      metavar="N",
+                      help="level of the subtree roots for --subtrees."
+                           " defaults to the first level with enough tiles for all seed processes")
+    parser.add_option("--downsample",
+                      action="store_true", dest="downsample", default=False,
+                      help="seed only the last level of each task from the sources and build"
+                           " all other levels by downscaling the cached tiles of the next level")
+    parser.add_option("--work-queue", dest="work_queue", default=None,
+                      metavar="URL",
+                      help="seed work units from a shared work queue (sqlite:///path/to/queue.sqlite"
+                           " or redis://host:port/db). only seeding tasks are supported")
+    parser.add_option("--enqueue",
+                      action="store_true", dest="enqueue", default=False,
+                      help="add the work units of all seeding tasks to --work-queue and exit")
+    parser.add_option("--queue-status",
+                      action="store_true", dest="queue_status", default=False,
+                      help="print the progress of --work-queue and exit")
+    parser.add_option("--lease-time",
+                      type="int", dest="lease_time", default=600,
+                      metavar="SECONDS",
+                      help="time until work units of unresponsive workers are leased again")
     parser.add_option("--summary",
                       action="store_true", dest="summary", default=False,
                       help="print summary with all seeding tasks and exit."
@@ -237,6 +265,9 @@ class SeedScript(object):
                     print(format_cleanup_task(task))
                 return 0
 
+            if options.work_queue:
+                return self.work_queue(options, seed_tasks)
+
             try:
                 if options.interactive:
                     seed_tasks, cleanup_tasks = self.interactive(seed_tasks, cleanup_tasks)
@@ -250,7 +281,10 @@ class SeedScript(object):
                     seed(seed_tasks, progress_logger=logger, dry_run=options.dry_run,
                          concurrency=options.concurrency, cache_locker=cache_locker,
                          skip_geoms_for_last_levels=options.geom_levels,
-                         skip_uncached=options.skip_uncached)
+                         skip_uncached=options.skip_uncached,
+                         subtrees=options.subtrees or options.subtree_level is not None,
+                         subtree_level=options.subtree_level,
+                         downsample=options.downsample)
                 if cleanup_tasks:
                     print('========== Cleanup tasks ==========')
                     print('Start cleanup process (%d task%s)' % (
@@ -270,6 +304,34 @@ class SeedScript(object):
             if progress:
                 progress.remove()
 
+    def work_queue(self, options, seed_tasks):
+        work_queue = load_work_queue(options.work_queue, lease_time=options.lease_time)
+        if options.queue_status:
+            print(format_queue_status(work_queue.status()))
+            return 0
+
+        if options.enqueue:
+            added = enqueue_seed_tasks(seed_tasks, work_queue, concurrency=options.concurrency,
+                                       subtree_level=options.subtree_level)
+            print('added %d work units to %s' % (added, options.work_queue))
+            print(format_queue_status(work_queue.status()))
+            return 0
+
+        print('========== Seeding from work queue ==========')
+        logger = ProgressLog(verbose=options.quiet == 0, silent=options.quiet >= 2)
+        try:
+            status = seed_from_queue(seed_tasks, options.work_queue, concurrency=options.concurrency,
+                                     dry_run=options.dry_run, skip_geoms_for_last_levels=options.geom_levels,
+                                     skip_uncached=options.skip_uncached, progress_logger=logger,
+                                     lease_time=options.lease_time)
+        except KeyboardInterrupt:
+            print('\nexiting...')
+            return 2
+        print(format_queue_status(status))
+        if status['failed']:
+            return 1
+        return 0
+
     def task_names(self, seed_conf, options):
         seed_names = cleanup_names = []
 
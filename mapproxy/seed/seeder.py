@@ -15,7 +15,10 @@
 
 from __future__ import print_function, division
 
+import os
+import socket
 import sys
+import time
 from collections import deque
 from contextlib import contextmanager
 from itertools import zip_longest
@@ -28,8 +31,9 @@ from mapproxy.grid.meta_grid import MetaGrid
 from mapproxy.source import SourceError
 from mapproxy.config import local_base_config
 from mapproxy.util.lock import LockTimeout
-from mapproxy.seed.util import format_seed_task
+from mapproxy.seed.util import format_seed_task, format_queue_status
 from mapproxy.seed.cachelock import DummyCacheLocker, CacheLockedError
+from mapproxy.seed.workqueue import LeaseRenewer, load_work_queue
 
 from mapproxy.seed.util import (exp_backoff, limit_sub_bbox,
                                 status_symbol, BackoffError)
@@ -147,16 +151,142 @@ class TileWorker(proc_class):
                 return
 
 
+def seed_tiles(tile_mgr, tiles):
+    with tile_mgr.session():
+        exp_backoff(tile_mgr.load_tile_coords, args=(tiles,),
+                    max_repeat=100, max_backoff=600,
+                    exceptions=(SourceError, IOError, HTTPException), ignore_exceptions=(LockTimeout, ))
+
+
 class TileSeedWorker(TileWorker):
+    def work_loop(self):
+        while True:
+            tiles = self.tiles_queue.get()
+            if tiles is None:
+                return
+            seed_tiles(self.tile_mgr, tiles)
+
+
+class TileBuildWorker(TileWorker):
+    """
+    Builds tiles from the cached tiles of the next level.
+    """
+
     def work_loop(self):
         while True:
             tiles = self.tiles_queue.get()
             if tiles is None:
                 return
             with self.tile_mgr.session():
-                exp_backoff(self.tile_mgr.load_tile_coords, args=(tiles,),
-                            max_repeat=100, max_backoff=600,
-                            exceptions=(SourceError, IOError, HTTPException), ignore_exceptions=(LockTimeout, ))
+                self.tile_mgr.build_tile_coords(tiles)
+
+
+class InlineSeedPool(object):
+    """
+    Seeds tiles directly in the calling process. Used by the TileWalker
+    of SubtreeSeedWorker and QueueSeedWorker.
+    """
+
+    def __init__(self, task, dry_run=False):
+        self.tile_mgr = task.tile_manager
+        self.dry_run = dry_run
+
+    def process(self, tiles, progress):
+        if not self.dry_run:
+            seed_tiles(self.tile_mgr, tiles)
+
+
+class SubtreeSeedWorker(TileWorker):
+    """
+    Walks and seeds complete subtrees. Gets ``(subtile, intersection)`` tuples
+    from `tiles_queue` and puts ``(subtile, number of handled meta tiles)``
+    into `done_queue` after each subtree.
+    """
+
+    def __init__(self, task, tiles_queue, conf, done_queue, levels, dry_run=False, walker_kw=None):
+        super().__init__(task, tiles_queue, conf)
+        self.done_queue = done_queue
+        self.levels = levels
+        self.dry_run = dry_run
+        self.walker_kw = walker_kw or {}
+
+    def work_loop(self):
+        walker = TileWalker(self.task, InlineSeedPool(self.task, dry_run=self.dry_run), **self.walker_kw)
+        while True:
+            subtree = self.tiles_queue.get()
+            if subtree is None:
+                return
+            subtile, intersection = subtree
+            walker.count = 0
+            walker.seed_progress = SeedProgress()
+            walker.walk_subtree(subtile, intersection, self.levels)
+            self.tile_mgr.cleanup()
+            self.done_queue.put((subtile, walker.count))
+
+
+class QueueSeedWorker(proc_class):
+    """
+    Leases work units from the work queue at `queue_url` and seeds them
+    until the queue is finished.
+    """
+
+    def __init__(self, tasks, queue_url, conf, dry_run=False, skip_geoms_for_last_levels=0,
+                 skip_uncached=False, lease_time=600, poll_interval=5):
+        super().__init__()
+        self.daemon = True
+        self.tasks = tasks
+        self.queue_url = queue_url
+        self.conf = conf
+        self.dry_run = dry_run
+        self.skip_geoms_for_last_levels = skip_geoms_for_last_levels
+        self.skip_uncached = skip_uncached
+        self.lease_time = lease_time
+        self.poll_interval = poll_interval
+
+    def run(self):
+        with local_base_config(self.conf):
+            try:
+                self.work_loop()
+            except KeyboardInterrupt:
+                return
+
+    def work_loop(self):
+        work_queue = load_work_queue(self.queue_url, lease_time=self.lease_time)
+        tasks = dict((unit_task_id(task), task) for task in self.tasks)
+        worker_id = '%s:%d:%s' % (socket.gethostname(), os.getpid(), self.name)
+        try:
+            while True:
+                leased = work_queue.lease(worker_id)
+                if leased is None:
+                    if work_queue.is_finished():
+                        return
+                    # wait for units leased by other workers
+                    time.sleep(self.poll_interval)
+                    continue
+                unit_id, unit = leased
+                task = tasks.get(tuple(unit['task']))
+                if task is None:
+                    log.warning('unknown seed task %s in work queue', unit['task'])
+                    work_queue.release(unit_id, worker_id, error='unknown seed task', retry=False)
+                    continue
+                try:
+                    # renew in the background, seed_tiles might wait for a source (exp_backoff)
+                    # or walk through cached tiles longer than lease_time
+                    with LeaseRenewer(work_queue, unit_id, worker_id, interval=self.lease_time / 4):
+                        seed_unit(task, unit, dry_run=self.dry_run,
+                                  skip_geoms_for_last_levels=self.skip_geoms_for_last_levels,
+                                  skip_uncached=self.skip_uncached)
+                except (KeyboardInterrupt, SystemExit):
+                    work_queue.release(unit_id, worker_id, error='interrupted')
+                    raise
+                except Exception as ex:
+                    log.exception('unable to seed %s', unit)
+                    work_queue.release(unit_id, worker_id, error=str(ex))
+                else:
+                    if not work_queue.ack(unit_id, worker_id):
+                        log.warning('work unit %s was leased by another worker before it was done', unit_id)
+        finally:
+            work_queue.close()
 
 
 class TileCleanupWorker(TileWorker):
@@ -265,6 +395,30 @@ class SeedProgress(object):
         return True
 
 
+class SubtreeProgress(object):
+    """
+    Progress of a subtree seeding. The progress identifier is the list
+    of all completed subtrees.
+    """
+
+    def __init__(self, total, done=None):
+        self.total = total
+        self.done = set(done or [])
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 1.0
+        return len(self.done) / self.total
+
+    @property
+    def progress_str(self):
+        return '%d/%d subtrees' % (len(self.done), self.total)
+
+    def current_progress_identifier(self):
+        return sorted(self.done)
+
+
 class StopProcess(Exception):
     pass
 
@@ -401,13 +555,15 @@ class TileWalker(object):
                 handle_tiles = [t for t in handle_tiles if
                                 t is not None]
             elif self.handle_uncached:
-                handle_tiles = [t for t in handle_tiles if
-                                t is not None and
-                                not self.tile_mgr.is_cached(t)]
+                handle_tiles = [t for t in handle_tiles if t is not None]
+                handle_tiles = [t for t, cached in
+                                zip(handle_tiles, self.tile_mgr.are_cached(handle_tiles))
+                                if not cached]
             elif self.handle_stale:
-                handle_tiles = [t for t in handle_tiles if
-                                t is not None and
-                                self.tile_mgr.is_stale(t)]
+                handle_tiles = [t for t in handle_tiles if t is not None]
+                handle_tiles = [t for t, stale in
+                                zip(handle_tiles, self.tile_mgr.are_stale(handle_tiles))
+                                if stale]
             if handle_tiles:
                 self.count += 1
                 self.worker_pool.process(handle_tiles, self.seed_progress)
@@ -420,6 +576,28 @@ class TileWalker(object):
             # for connection based caches
             self.tile_mgr.cleanup()
 
+    def subtrees(self, level):
+        """
+        Return all (meta) tiles of `level` that intersect the coverage as
+        ``(subtile, intersection)`` tuples. Each subtile is the root of a
+        subtree that can be walked with `walk_subtree` independently.
+        """
+        bbox = self.task.coverage.extent.bbox_for(self.tile_mgr.grid.srs)
+        _, _, subtiles = self.grid.get_affected_level_tiles(bbox, level)
+        return [(subtile, intersection) for subtile, _, intersection
+                in self._filter_subtiles(subtiles, False) if subtile is not None]
+
+    def walk_subtree(self, subtile, intersection, levels):
+        """
+        Walk all `levels` below (and including) the level of `subtile`.
+        """
+        bbox = self.task.coverage.extent.bbox_for(self.tile_mgr.grid.srs)
+        bbox = limit_sub_bbox(bbox, self.grid.meta_tile(subtile).bbox)
+        try:
+            self._walk(bbox, levels, current_level=subtile[2], all_subtiles=intersection == CONTAINS)
+        except StopProcess:
+            pass
+
     def report_progress(self, level, bbox):
         if self.progress_logger:
             self.progress_logger.log_progress(self.seed_progress, level, bbox,
@@ -497,7 +675,8 @@ class CleanupTask(object):
 
 
 def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
-         progress_logger=None, cache_locker=None, skip_uncached=False):
+         progress_logger=None, cache_locker=None, skip_uncached=False, subtrees=False, subtree_level=None,
+         downsample=False):
     if cache_locker is None:
         cache_locker = DummyCacheLocker()
 
@@ -509,14 +688,17 @@ def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
         wait = len(active_tasks) == 1
         try:
             with cache_locker.lock(task.md['cache_name'], no_block=not wait):
-                if progress_logger and progress_logger.progress_store:
-                    progress_logger.current_task_id = task.id
-                    start_progress = progress_logger.progress_store.get(task.id)
+                if downsample:
+                    seed_task_downsample(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                                         skip_uncached=skip_uncached, subtrees=subtrees,
+                                         subtree_level=subtree_level)
+                elif subtrees:
+                    seed_task_subtrees(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                                       skip_uncached=skip_uncached, subtree_level=subtree_level)
                 else:
-                    start_progress = None
-                seed_progress = SeedProgress(old_progress_identifier=start_progress)
-                seed_task(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
-                          seed_progress=seed_progress, skip_uncached=skip_uncached)
+                    seed_progress = SeedProgress(old_progress_identifier=_start_progress(progress_logger, task.id))
+                    seed_task(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                              seed_progress=seed_progress, skip_uncached=skip_uncached)
         except CacheLockedError:
             print('    ...cache is locked, skipping')
             active_tasks = [task] + active_tasks[:-1]
@@ -524,30 +706,76 @@ def seed(tasks, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
             active_tasks.pop()
 
 
-def seed_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
-              progress_logger=None, seed_progress=None, skip_uncached=False):
-    if task.coverage is False:
-        return
+def _start_progress(progress_logger, task_id):
+    """
+    Return the stored progress of `task_id` and make it the current task
+    of the `progress_logger`.
+    """
+    if progress_logger and progress_logger.progress_store:
+        progress_logger.current_task_id = task_id
+        return progress_logger.progress_store.get(task_id)
+    return None
+
+
+def _prepare_seed_task(task, skip_geoms_for_last_levels=0, skip_uncached=False):
+    """
+    Prepare the tile manager of `task` for seeding and return the
+    keyword arguments for the TileWalker.
+    """
     if task.refresh_timestamp is not None:
         task.tile_manager._expire_timestamp = task.refresh_timestamp
     task.tile_manager.minimize_meta_requests = False
 
-    work_on_metatiles = True
-    if task.tile_manager.rescale_tiles:
-        work_on_metatiles = False
+    # If the configuration requests to only refresh tiles which are already in cache,
+    # tile walker parameters shall be adapted
+    return dict(
+        handle_uncached=not skip_uncached,
+        handle_stale=skip_uncached,
+        handle_all=task.refresh_all,
+        skip_geoms_for_last_levels=skip_geoms_for_last_levels,
+        work_on_metatiles=not task.tile_manager.rescale_tiles,
+    )
+
+
+def seed_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+              progress_logger=None, seed_progress=None, skip_uncached=False):
+    if task.coverage is False:
+        return
+    walker_kw = _prepare_seed_task(task, skip_geoms_for_last_levels, skip_uncached)
 
     tile_worker_pool = TileWorkerPool(task, TileSeedWorker, dry_run=dry_run,
                                       size=concurrency, progress_logger=progress_logger)
-    # If the configuration requests to only refresh tiles which are already in cache,
-    # tile walker parameters shall be adapted
-    handle_stale = skip_uncached
-    handle_uncached = not skip_uncached
-    handle_all = task.refresh_all
-    tile_walker = TileWalker(task, tile_worker_pool, handle_uncached=handle_uncached, handle_stale=handle_stale,
-                             handle_all=handle_all, skip_geoms_for_last_levels=skip_geoms_for_last_levels,
-                             progress_logger=progress_logger, seed_progress=seed_progress,
-                             work_on_metatiles=work_on_metatiles,
-                             )
+    tile_walker = TileWalker(task, tile_worker_pool, progress_logger=progress_logger,
+                             seed_progress=seed_progress, **walker_kw)
+    try:
+        tile_walker.walk()
+    except KeyboardInterrupt:
+        tile_worker_pool.stop(force=True)
+        raise
+    finally:
+        tile_worker_pool.stop()
+
+
+def _level_task(task, levels):
+    return SeedTask(task.md, task.tile_manager, levels, task.refresh_timestamp,
+                    task.refresh_all, task.coverage)
+
+
+def build_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+               progress_logger=None, seed_progress=None, skip_uncached=False):
+    """
+    Build all tiles of `task` from the cached tiles of the next level.
+    """
+    if task.coverage is False:
+        return
+    walker_kw = _prepare_seed_task(task, skip_geoms_for_last_levels, skip_uncached)
+    # build workers get all tiles of each meta tile
+    walker_kw['work_on_metatiles'] = False
+
+    tile_worker_pool = TileWorkerPool(task, TileBuildWorker, dry_run=dry_run,
+                                      size=concurrency, progress_logger=progress_logger)
+    tile_walker = TileWalker(task, tile_worker_pool, progress_logger=progress_logger,
+                             seed_progress=seed_progress, **walker_kw)
     try:
         tile_walker.walk()
     except KeyboardInterrupt:
@@ -555,3 +783,223 @@ def seed_task(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
         raise
     finally:
         tile_worker_pool.stop()
+
+
+def seed_task_downsample(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+                         progress_logger=None, skip_uncached=False, subtrees=False, subtree_level=None):
+    """
+    Seed the last level of `task` from the sources and build all coarser
+    levels, bottom-up, by downscaling the cached tiles of the next level.
+    Levels between the levels of `task` are built as well.
+    """
+    if task.coverage is False:
+        return
+    last_task = _level_task(task, task.levels[-1:])
+    if subtrees:
+        seed_task_subtrees(last_task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                           skip_uncached=skip_uncached, subtree_level=subtree_level)
+    else:
+        seed_progress = SeedProgress(old_progress_identifier=_start_progress(progress_logger, last_task.id))
+        seed_task(last_task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                  seed_progress=seed_progress, skip_uncached=skip_uncached)
+
+    build_levels(task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                 skip_uncached=skip_uncached)
+
+
+def build_levels(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+                 progress_logger=None, skip_uncached=False):
+    """
+    Build all levels from the first to the second-last level of `task`,
+    bottom-up, by downscaling the cached tiles of the next level.
+    """
+    if task.coverage is False:
+        return
+    for level in range(task.levels[-1] - 1, task.levels[0] - 1, -1):
+        level_task = _level_task(task, [level])
+        seed_progress = SeedProgress(old_progress_identifier=_start_progress(progress_logger, level_task.id))
+        build_task(level_task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                   seed_progress=seed_progress, skip_uncached=skip_uncached)
+
+
+def subtree_level_for(task, grid, concurrency):
+    """
+    Return the first level of `task` with enough (meta) tiles of `grid`
+    to keep `concurrency` workers busy, or the last level.
+    """
+    bbox = task.coverage.extent.bbox_for(task.grid.srs)
+    for level in task.levels:
+        _, (xs, ys), _ = grid.get_affected_level_tiles(bbox, level)
+        if xs * ys >= 8 * concurrency:
+            return level
+    return task.levels[-1]
+
+
+def seed_task_subtrees(task, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+                       progress_logger=None, skip_uncached=False, subtree_level=None):
+    """
+    Seed `task` by partitioning the coverage into independent subtrees.
+
+    All levels above `subtree_level` are seeded with `seed_task`. Each (meta)
+    tile of `subtree_level` is the root of a subtree that is walked, filtered
+    and seeded by one of `concurrency` SubtreeSeedWorker. The progress is
+    stored for each completed subtree.
+    """
+    if task.coverage is False:
+        return
+    walker_kw = _prepare_seed_task(task, skip_geoms_for_last_levels, skip_uncached)
+    tile_walker = TileWalker(task, None, **walker_kw)
+    if subtree_level is None:
+        subtree_level = subtree_level_for(task, tile_walker.grid, concurrency)
+    subtree_level = min(subtree_level, task.levels[-1])
+
+    top_levels = [lvl for lvl in task.levels if lvl < subtree_level]
+    if top_levels:
+        top_task = _level_task(task, top_levels)
+        seed_progress = SeedProgress(old_progress_identifier=_start_progress(progress_logger, top_task.id))
+        seed_task(top_task, concurrency, dry_run, skip_geoms_for_last_levels, progress_logger,
+                  seed_progress=seed_progress, skip_uncached=skip_uncached)
+
+    subtrees = tile_walker.subtrees(subtree_level)
+
+    progress = SubtreeProgress(len(subtrees))
+    done = _start_progress(progress_logger, task.id + ('subtrees', subtree_level))
+    if done:
+        progress.done = set(done) & set(subtile for subtile, _ in subtrees)
+    pending = [s for s in subtrees if s[0] not in progress.done]
+    if not pending:
+        return
+
+    subtree_queue = queue_class()
+    done_queue = queue_class()
+    for subtree in pending:
+        subtree_queue.put(subtree)
+
+    levels = [lvl for lvl in task.levels if lvl >= subtree_level]
+    conf = base_config()
+    procs = []
+    for _ in range(min(concurrency, len(pending))):
+        subtree_queue.put(None)
+        worker = SubtreeSeedWorker(task, subtree_queue, conf, done_queue, levels,
+                                   dry_run=dry_run, walker_kw=walker_kw)
+        worker.start()
+        procs.append(worker)
+
+    count = 0
+    try:
+        remaining = len(pending)
+        while remaining:
+            try:
+                subtile, subtree_count = done_queue.get(timeout=5)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in procs):
+                    log.warning('no workers left, stopping')
+                    raise SeedInterrupted
+                continue
+            remaining -= 1
+            count += subtree_count
+            progress.done.add(subtile)
+            if progress_logger:
+                progress_logger.log_progress(progress, subtree_level, tile_walker.grid.meta_tile(subtile).bbox,
+                                             count * tile_walker.tiles_per_metatile)
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join(1.0)
+        raise
+
+    for proc in procs:
+        proc.join()
+
+
+def unit_task_id(task):
+    """
+    Identifier of `task` in work units. It does not contain the levels, as
+    each unit has its own levels.
+    """
+    return task.md['name'], task.md['cache_name'], task.md['grid_name']
+
+
+def work_units(task, concurrency=2, subtree_level=None):
+    """
+    Return the work units of `task` for distributed seeding: one unit for
+    all levels above `subtree_level` and one unit for each subtree.
+    """
+    if task.coverage is False:
+        return []
+    tile_walker = TileWalker(task, None)
+    if subtree_level is None:
+        subtree_level = subtree_level_for(task, tile_walker.grid, concurrency)
+    subtree_level = min(subtree_level, task.levels[-1])
+
+    task_id = list(unit_task_id(task))
+    units = []
+    top_levels = [lvl for lvl in task.levels if lvl < subtree_level]
+    if top_levels:
+        units.append({'task': task_id, 'levels': top_levels, 'subtile': None})
+    levels = [lvl for lvl in task.levels if lvl >= subtree_level]
+    for subtile, intersection in tile_walker.subtrees(subtree_level):
+        units.append({'task': task_id, 'levels': levels, 'subtile': list(subtile),
+                      'intersection': intersection})
+    return units
+
+
+def seed_unit(task, unit, dry_run=False, skip_geoms_for_last_levels=0, skip_uncached=False):
+    """
+    Seed a single work unit of `task`. Returns the number of handled (meta) tiles.
+    """
+    walker_kw = _prepare_seed_task(task, skip_geoms_for_last_levels, skip_uncached)
+    pool = InlineSeedPool(task, dry_run=dry_run)
+    if unit['subtile'] is None:
+        level_task = _level_task(task, unit['levels'])
+        tile_walker = TileWalker(level_task, pool, **walker_kw)
+        tile_walker.walk()
+    else:
+        tile_walker = TileWalker(task, pool, **walker_kw)
+        tile_walker.walk_subtree(tuple(unit['subtile']), unit['intersection'], unit['levels'])
+    task.tile_manager.cleanup()
+    return tile_walker.count
+
+
+def enqueue_seed_tasks(tasks, work_queue, concurrency=2, subtree_level=None):
+    """
+    Add the work units of all `tasks` to `work_queue`. Returns the number of
+    new units.
+    """
+    added = 0
+    for task in tasks:
+        added += work_queue.add(work_units(task, concurrency, subtree_level))
+    return added
+
+
+def seed_from_queue(tasks, queue_url, concurrency=2, dry_run=False, skip_geoms_for_last_levels=0,
+                    skip_uncached=False, progress_logger=None, lease_time=600, poll_interval=5):
+    """
+    Seed work units from the work queue at `queue_url` with `concurrency`
+    QueueSeedWorker until the queue is finished. Returns the status of the queue.
+    """
+    conf = base_config()
+    procs = []
+    for _ in range(concurrency):
+        worker = QueueSeedWorker(tasks, queue_url, conf, dry_run=dry_run,
+                                 skip_geoms_for_last_levels=skip_geoms_for_last_levels,
+                                 skip_uncached=skip_uncached, lease_time=lease_time,
+                                 poll_interval=poll_interval)
+        worker.start()
+        procs.append(worker)
+
+    work_queue = load_work_queue(queue_url, lease_time=lease_time)
+    try:
+        while True:
+            alive = [proc for proc in procs if proc.is_alive()]
+            if not alive:
+                break
+            alive[0].join(poll_interval)
+            if progress_logger and not progress_logger.silent:
+                progress_logger.log_message(format_queue_status(work_queue.status()))
+        return work_queue.status()
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.join(1.0)
+        raise
+    finally:
+        work_queue.close()
@@ -260,3 +260,15 @@ def format_cleanup_task(task):
                     datetime.fromtimestamp(task.remove_timestamp))
 
     return '\n'.join(info)
+
+
+def format_queue_status(status):
+    """
+    >>> format_queue_status(dict(pending=2, leased=1, done=5, failed=0))
+    'work units: 5 done, 1 leased, 2 pending, 0 failed (62.50%)'
+    """
+    total = sum(status.values())
+    return 'work units: %d done, %d leased, %d pending, %d failed (%.2f%%)' % (
+        status['done'], status['leased'], status['pending'], status['failed'],
+        (status['done'] / total * 100) if total else 100.0,
+    )
@@ -0,0 +1,433 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared work queues for distributed seeding.
+
+A coordinator adds work units to the queue. Workers (on one or more hosts)
+lease a unit, process it and acknowledge it. Leases expire after
+`lease_time` seconds, so units of crashed workers are leased again. Units
+that were leased `max_attempts` times without success are marked as failed.
+
+Work units are JSON serializable dicts. Units with the same content are
+only added once, so the coordinator can be called repeatedly.
+
+`renew`, `ack` and `release` only change units that are still leased by
+the calling worker. A worker whose lease expired and was leased by
+another worker can not send the unit back to the queue.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+
+from mapproxy.util.sqlite3 import sqlite3
+
+try:
+    import redis  # type: ignore
+except ImportError:
+    redis = None  # type: ignore
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class WorkQueue(object):
+    """
+    Base class for work queues.
+    """
+
+    def __init__(self, lease_time=600, max_attempts=3):
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+
+    def add(self, units):
+        """
+        Add all new `units` and reset failed `units` for another try.
+        Returns the number of added or reset units.
+        """
+        raise NotImplementedError()
+
+    def lease(self, worker_id):
+        """
+        Lease the next unit for `worker_id`.
+        Returns ``(unit_id, unit)`` or ``None`` if no unit is available.
+        """
+        raise NotImplementedError()
+
+    def renew(self, unit_id, worker_id):
+        """
+        Extend the lease of `unit_id` by `lease_time`.
+        Returns ``False`` if `worker_id` does not hold the lease anymore.
+        """
+        raise NotImplementedError()
+
+    def ack(self, unit_id, worker_id):
+        """
+        Mark `unit_id` as done.
+        Returns ``False`` if `worker_id` does not hold the lease anymore.
+        """
+        raise NotImplementedError()
+
+    def release(self, unit_id, worker_id, error=None, retry=True):
+        """
+        Release the lease of the unprocessed `unit_id`. The unit is leased
+        again, unless `retry` is false or the unit reached `max_attempts`.
+        Returns ``False`` if `worker_id` does not hold the lease anymore.
+        """
+        raise NotImplementedError()
+
+    def status(self):
+        """
+        Return the number of ``pending``, ``leased``, ``done`` and ``failed`` units.
+        """
+        raise NotImplementedError()
+
+    def is_finished(self):
+        status = self.status()
+        return status['pending'] == 0 and status['leased'] == 0
+
+    def close(self):
+        pass
+
+
+class LeaseRenewer(object):
+    """
+    Renews the lease of `unit_id` every `interval` seconds in a background
+    thread, while the unit is processed. Use as a context manager.
+    """
+
+    def __init__(self, work_queue, unit_id, worker_id, interval):
+        self.work_queue = work_queue
+        self.unit_id = unit_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='mapproxy-lease-renewer')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.work_queue.renew(self.unit_id, self.worker_id):
+                    log.warning('lease of work unit %s expired and was taken by another worker', self.unit_id)
+                    return
+            except Exception as ex:
+                log.warning('unable to renew lease of work unit %s: %s', self.unit_id, ex)
+
+
+def unit_key(unit):
+    """
+    >>> unit_key({'levels': [1, 2], 'task': 'foo'})
+    '{"levels": [1, 2], "task": "foo"}'
+    """
+    return json.dumps(unit, sort_keys=True)
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue in an SQLite file. The file can be on shared storage if the
+    file system supports locking (e.g. NFSv4).
+    """
+
+    def __init__(self, filename, lease_time=600, max_attempts=3):
+        super().__init__(lease_time=lease_time, max_attempts=max_attempts)
+        self.filename = filename
+        self._initialize_db()
+
+    def _initialize_db(self):
+        db = sqlite3.connect(self.filename, timeout=60)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS units (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            );
+        """)
+        db.commit()
+        db.close()
+
+    @contextmanager
+    def _exclusive_db_cursor(self):
+        db = sqlite3.connect(self.filename, timeout=60, isolation_level="EXCLUSIVE")
+        cur = db.cursor()
+        try:
+            yield cur
+            db.commit()
+        finally:
+            db.close()
+
+    def add(self, units):
+        added = 0
+        with self._exclusive_db_cursor() as cur:
+            for unit in units:
+                key = unit_key(unit)
+                cur.execute("INSERT OR IGNORE INTO units (key) VALUES (?)", (key, ))
+                if not cur.rowcount:
+                    cur.execute("UPDATE units SET state = 'pending', attempts = 0, error = NULL"
+                                " WHERE key = ? AND state = 'failed'", (key, ))
+                added += cur.rowcount
+        return added
+
+    def lease(self, worker_id):
+        now = time.time()
+        with self._exclusive_db_cursor() as cur:
+            cur.execute("UPDATE units SET state = 'failed', error = 'lease expired'"
+                        " WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                        (now, self.max_attempts))
+            cur.execute("SELECT id, key FROM units WHERE state = 'pending'"
+                        " OR (state = 'leased' AND lease_until < ?) ORDER BY id LIMIT 1", (now, ))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute("UPDATE units SET state = 'leased', worker = ?, lease_until = ?,"
+                        " attempts = attempts + 1 WHERE id = ?", (worker_id, now + self.lease_time, row[0]))
+        return row[0], json.loads(row[1])
+
+    def renew(self, unit_id, worker_id):
+        with self._exclusive_db_cursor() as cur:
+            cur.execute("UPDATE units SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                        (time.time() + self.lease_time, unit_id, worker_id))
+            return cur.rowcount == 1
+
+    def ack(self, unit_id, worker_id):
+        # expired leases are still leased by the worker, till another worker leases the unit
+        with self._exclusive_db_cursor() as cur:
+            cur.execute("UPDATE units SET state = 'done', lease_until = NULL, error = NULL"
+                        " WHERE id = ? AND worker = ? AND state IN ('leased', 'failed')",
+                        (unit_id, worker_id))
+            return cur.rowcount == 1
+
+    def release(self, unit_id, worker_id, error=None, retry=True):
+        with self._exclusive_db_cursor() as cur:
+            cur.execute("UPDATE units SET state = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END,"
+                        " lease_until = NULL, error = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                        (retry, self.max_attempts, error, unit_id, worker_id))
+            return cur.rowcount == 1
+
+    def status(self):
+        now = time.time()
+        result = dict(pending=0, leased=0, done=0, failed=0)
+        with self._exclusive_db_cursor() as cur:
+            cur.execute("SELECT state, count(*) FROM units WHERE state != 'leased' GROUP BY state")
+            result.update(cur.fetchall())
+            # expired leases are pending (or failed) again
+            cur.execute("SELECT attempts < ?, count(*) FROM units WHERE state = 'leased' AND lease_until < ?"
+                        " GROUP BY 1", (self.max_attempts, now))
+            for retry, count in cur.fetchall():
+                result['pending' if retry else 'failed'] += count
+            cur.execute("SELECT count(*) FROM units WHERE state = 'leased' AND lease_until >= ?", (now, ))
+            result['leased'] = cur.fetchone()[0]
+        return result
+
+
+# All state changes of leased units are Lua scripts, so that they are
+# atomic and a crashed worker can not lose a unit in between.
+_redis_scripts = {
+    'lease': """
+        local unit_id = redis.call('LPOP', KEYS[1])
+        if not unit_id then
+            return nil
+        end
+        redis.call('ZADD', KEYS[2], ARGV[1], unit_id)
+        redis.call('HINCRBY', KEYS[3], unit_id, 1)
+        redis.call('HSET', KEYS[4], unit_id, ARGV[2])
+        return unit_id
+    """,
+    'requeue_expired': """
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+        for _, unit_id in ipairs(expired) do
+            redis.call('ZREM', KEYS[1], unit_id)
+            if tonumber(redis.call('HGET', KEYS[2], unit_id) or 0) < tonumber(ARGV[2]) then
+                redis.call('RPUSH', KEYS[3], unit_id)
+            else
+                redis.call('SADD', KEYS[4], unit_id)
+            end
+            redis.call('HSET', KEYS[5], unit_id, 'lease expired')
+        end
+        return #expired
+    """,
+    'renew': """
+        if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+            return 0
+        end
+        if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+            return 0
+        end
+        redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+        return 1
+    """,
+    'ack': """
+        if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] or redis.call('SISMEMBER', KEYS[6], ARGV[1]) == 1 then
+            return 0
+        end
+        -- the lease might be expired and the unit queued again, but not yet leased by another worker
+        redis.call('ZREM', KEYS[1], ARGV[1])
+        redis.call('LREM', KEYS[3], 0, ARGV[1])
+        redis.call('SREM', KEYS[4], ARGV[1])
+        redis.call('HDEL', KEYS[5], ARGV[1])
+        redis.call('SADD', KEYS[6], ARGV[1])
+        return 1
+    """,
+    'release': """
+        if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] or redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+            return 0
+        end
+        if ARGV[3] == '1' and tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or 0) < tonumber(ARGV[4]) then
+            redis.call('RPUSH', KEYS[4], ARGV[1])
+        else
+            redis.call('SADD', KEYS[5], ARGV[1])
+        end
+        if ARGV[5] ~= '' then
+            redis.call('HSET', KEYS[6], ARGV[1], ARGV[5])
+        end
+        return 1
+    """,
+}
+
+
+class RedisWorkQueue(WorkQueue):
+    """
+    Work queue in Redis. All keys start with `prefix`.
+    """
+
+    def __init__(self, host='localhost', port=6379, db=0, prefix='mapproxy-seed', password=None,
+                 lease_time=600, max_attempts=3):
+        super().__init__(lease_time=lease_time, max_attempts=max_attempts)
+        if redis is None:
+            raise ImportError("Redis work queue requires 'redis' package.")
+        self.prefix = prefix
+        self.r = redis.StrictRedis(host=host, port=port, db=db, password=password)
+        self._scripts = {}
+
+    def _key(self, name):
+        return '%s:%s' % (self.prefix, name)
+
+    def add(self, units):
+        added = 0
+        for unit in units:
+            key = unit_key(unit)
+            unit_id = self.r.hget(self._key('keys'), key)
+            if unit_id is None:
+                unit_id = self.r.incr(self._key('next_id'))
+                if not self.r.hsetnx(self._key('keys'), key, unit_id):
+                    continue
+                self.r.hset(self._key('units'), unit_id, key)
+            elif not self.r.srem(self._key('failed'), unit_id):
+                continue
+            self.r.hset(self._key('attempts'), unit_id, 0)
+            self.r.rpush(self._key('pending'), unit_id)
+            added += 1
+        return added
+
+    def _requeue_expired(self):
+        self._script('requeue_expired')(
+            keys=[self._key('leased'), self._key('attempts'), self._key('pending'), self._key('failed'),
+                  self._key('errors')],
+            args=[time.time(), self.max_attempts],
+        )
+
+    def lease(self, worker_id):
+        self._requeue_expired()
+        unit_id = self._script('lease')(
+            keys=[self._key('pending'), self._key('leased'), self._key('attempts'), self._key('workers')],
+            args=[time.time() + self.lease_time, worker_id],
+        )
+        if unit_id is None:
+            return None
+        key = self.r.hget(self._key('units'), unit_id)
+        return int(unit_id), json.loads(key)
+
+    def renew(self, unit_id, worker_id):
+        return bool(self._script('renew')(
+            keys=[self._key('leased'), self._key('workers')],
+            args=[unit_id, worker_id, time.time() + self.lease_time],
+        ))
+
+    def ack(self, unit_id, worker_id):
+        return bool(self._script('ack')(
+            keys=[self._key('leased'), self._key('workers'), self._key('pending'), self._key('failed'),
+                  self._key('errors'), self._key('done')],
+            args=[unit_id, worker_id],
+        ))
+
+    def release(self, unit_id, worker_id, error=None, retry=True):
+        return bool(self._script('release')(
+            keys=[self._key('leased'), self._key('workers'), self._key('attempts'), self._key('pending'),
+                  self._key('failed'), self._key('errors')],
+            args=[unit_id, worker_id, 1 if retry else 0, self.max_attempts, error or ''],
+        ))
+
+    def _script(self, name):
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.r.register_script(_redis_scripts[name])
+        return script
+
+    def status(self):
+        self._requeue_expired()
+        return dict(
+            pending=self.r.llen(self._key('pending')),
+            leased=self.r.zcard(self._key('leased')),
+            done=self.r.scard(self._key('done')),
+            failed=self.r.scard(self._key('failed')),
+        )
+
+    def close(self):
+        self.r.close()
+
+
+def load_work_queue(url, lease_time=600, max_attempts=3):
+    """
+    Return the work queue for `url`.
+
+    ``redis://host:port/db?prefix=name`` returns a RedisWorkQueue, all other
+    URLs (``sqlite:///path/to/queue.sqlite``, or just a filename) return
+    a SQLiteWorkQueue.
+    """
+    kw = dict(lease_time=lease_time, max_attempts=max_attempts)
+    if url.startswith('redis://'):
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        if 'prefix' in query:
+            kw['prefix'] = query['prefix'][0]
+        return RedisWorkQueue(
+            host=parsed.hostname or 'localhost',
+            port=parsed.port or 6379,
+            db=int(parsed.path.strip('/') or 0),
+            password=parsed.password,
+            **kw
+        )
+    if url.startswith('sqlite://'):
+        url = url[len('sqlite://'):]
+    elif url.startswith('sqlite:'):
+        url = url[len('sqlite:'):]
+    return SQLiteWorkQueue(url, **kw)
@@ -103,6 +103,9 @@ class KMLServer(Server):
         map_request.origin = 'sw'
         layer = self.layer(map_request)
         limit_to = self.authorize_tile_layer(layer, map_request)
+        resp = layer.not_modified_response(map_request, max_age=self.max_tile_age, coverage=limit_to)
+        if resp is not None:
+            return resp
         tile = layer.render(map_request, coverage=limit_to)
         tile_format = getattr(tile, 'format', map_request.format)
         resp = Response(tile.as_buffer(),
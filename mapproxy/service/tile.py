@@ -78,6 +78,11 @@ class TileServer(Server):
             tile_request.origin = self.origin
         layer, limit_to = self.layer(tile_request)
 
+        resp = layer.not_modified_response(tile_request, max_age=self.max_tile_age,
+                                           use_profiles=tile_request.use_profiles, coverage=limit_to)
+        if resp is not None:
+            return resp
+
         def decorate_img(image):
             query_extent = (layer.grid.srs.srs_code,
                             layer.tile_bbox(tile_request, use_profiles=tile_request.use_profiles))
@@ -275,6 +280,41 @@ class TileLayer(object):
             self._empty_tile = img.as_buffer().read()
         return ImageResponse(self._empty_tile, format=format, timestamp=time.time())
 
+    def not_modified_response(self, tile_request, max_age=None, use_profiles=False,
+                              coverage: Optional[Coverage] = None) -> Optional[Response]:
+        """
+        Return a `304 Not Modified` response if the conditional headers of the
+        request match the ETag or Last-Modified of the cached tile. Only the
+        metadata (timestamp and size) of the tile is loaded, not the tile itself.
+        Returns ``None`` if the tile needs to be rendered.
+        """
+        if tile_request.http is None:
+            return None
+        environ = tile_request.http.environ
+        if 'HTTP_IF_NONE_MATCH' not in environ and 'HTTP_IF_MODIFIED_SINCE' not in environ:
+            return None
+        if tile_request.format != self.format:
+            return None
+
+        tile_coord = self._internal_tile_coord(tile_request, use_profiles=use_profiles)
+        if coverage:
+            tile_bbox = self.grid.tile_bbox(tile_coord)
+            if not coverage.intersects(tile_bbox, self.grid.srs):
+                return None
+        dimensions = self.checked_dimensions(tile_request)
+
+        with self.tile_manager.session():
+            tile = self.tile_manager.load_tile_coord_metadata(tile_coord, dimensions=dimensions)
+        if tile is None:
+            return None
+
+        resp = Response([], content_type=self.format_mime_type)
+        resp.cache_headers(tile.timestamp, etag_data=(tile.timestamp, tile.size), max_age=max_age)
+        resp.make_conditional(tile_request.http)
+        if resp.status.startswith('304'):
+            return resp
+        return None
+
     def tile_bbox(self, tile_request, use_profiles=False, limit=False):
         tile_coord = self._internal_tile_coord(tile_request, use_profiles=use_profiles)
         return self.grid.tile_bbox(tile_coord, limit=limit)
@@ -317,7 +357,8 @@ class TileLayer(object):
         try:
             with self.tile_manager.session():
                 tile = self.tile_manager.load_tile_coord(tile_coord,
-                                                         dimensions=dimensions, with_metadata=True)
+                                                         dimensions=dimensions, with_metadata=True,
+                                                         prefetch=True)
             if tile.image_result is None:
                 return self.empty_response()
 
@@ -97,6 +97,10 @@ class WMTSServer(Server):
 
         limited_to = self.authorize_tile_layer(tile_layer, request)
 
+        resp = tile_layer.not_modified_response(request, max_age=self.max_tile_age, coverage=limited_to)
+        if resp is not None:
+            return resp
+
         def decorate_img(image):
             query_extent = tile_layer.grid.srs.srs_code, tile_layer.tile_bbox(request)
             return self.decorate_img(image, 'wmts', [tile_layer.name], request.http.environ, query_extent)
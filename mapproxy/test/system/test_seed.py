@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
 import os
 import time
 import shutil
@@ -22,9 +23,11 @@ from mapproxy.config.loader import load_configuration
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageResult
 from mapproxy.image.opts import ImageOptions
-from mapproxy.seed.seeder import seed
+from mapproxy.seed.seeder import seed, enqueue_seed_tasks, seed_from_queue
 from mapproxy.seed.cleanup import cleanup
 from mapproxy.seed.config import load_seed_tasks_conf
+from mapproxy.seed.util import ProgressLog, ProgressStore
+from mapproxy.seed.workqueue import load_work_queue
 from mapproxy.config import local_base_config
 from mapproxy.util.fs import ensure_directory
 
@@ -93,6 +96,74 @@ class SeedTestBase(SeedTestEnvironment):
                     seed(tasks, dry_run=False)
                     cleanup(cleanup_tasks, verbose=False, dry_run=False)
 
+    def test_seed_subtrees(self):
+        with tmp_image((256, 256), format='png') as img:
+            img_data = img.read()
+            expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                             '&REQUEST=GetMap&VERSION=1.1.1&bbox=-180.0,-90.0,180.0,90.0'
+                             '&width=256&height=128&srs=EPSG:4326'},
+                            {'body': img_data, 'headers': {'content-type': 'image/png'}})
+            with mock_httpd(('localhost', 42423), [expected_req]):
+                with local_base_config(self.mapproxy_conf.base_config):
+                    seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                    tasks = seed_conf.seeds(['one'])
+                    store = ProgressStore(os.path.join(self.dir, 'progress'))
+                    logger = ProgressLog(out=io.StringIO(), progress_store=store)
+                    seed(tasks, dry_run=False, subtrees=True, progress_logger=logger)
+            assert self.tile_exists((0, 0, 0))
+            # completed subtrees are stored for --continue
+            assert store.get(tasks[0].id + ('subtrees', 0)) == [(0, 0, 0)]
+
+    def test_seed_work_queue(self):
+        queue_url = 'sqlite://' + os.path.join(self.dir, 'queue.sqlite')
+        with tmp_image((256, 256), format='png') as img:
+            img_data = img.read()
+            expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                             '&REQUEST=GetMap&VERSION=1.1.1&bbox=-180.0,-90.0,180.0,90.0'
+                             '&width=256&height=128&srs=EPSG:4326'},
+                            {'body': img_data, 'headers': {'content-type': 'image/png'}})
+            with mock_httpd(('localhost', 42423), [expected_req]):
+                with local_base_config(self.mapproxy_conf.base_config):
+                    seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                    tasks = seed_conf.seeds(['one'])
+                    work_queue = load_work_queue(queue_url)
+                    assert enqueue_seed_tasks(tasks, work_queue) == 1
+                    # units are only added once
+                    assert enqueue_seed_tasks(tasks, work_queue) == 0
+                    status = seed_from_queue(tasks, queue_url, concurrency=2, poll_interval=0.1)
+        assert status == dict(pending=0, leased=0, done=1, failed=0)
+        assert self.tile_exists((0, 0, 0))
+
+    def test_seed_work_queue_dry_run(self):
+        queue_url = 'sqlite://' + os.path.join(self.dir, 'queue.sqlite')
+        with local_base_config(self.mapproxy_conf.base_config):
+            seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+            tasks = seed_conf.seeds(['one'])
+            tasks[0].levels = [0, 1, 2, 3, 4, 5]
+            work_queue = load_work_queue(queue_url)
+            units = enqueue_seed_tasks(tasks, work_queue, subtree_level=4)
+            assert units > 3
+            status = seed_from_queue(tasks, queue_url, concurrency=3, dry_run=True, poll_interval=0.1)
+        assert status == dict(pending=0, leased=0, done=units, failed=0)
+
+    def test_seed_downsample(self):
+        with tmp_image((512, 256), format='png') as img:
+            img_data = img.read()
+            # only the last level is requested from the source
+            expected_req = ({'path': r'/service?LAYERS=foo&SERVICE=WMS&FORMAT=image%2Fpng'
+                             '&REQUEST=GetMap&VERSION=1.1.1&bbox=-180.0,-90.0,180.0,90.0'
+                             '&width=512&height=256&srs=EPSG:4326'},
+                            {'body': img_data, 'headers': {'content-type': 'image/png'}})
+            with mock_httpd(('localhost', 42423), [expected_req]):
+                with local_base_config(self.mapproxy_conf.base_config):
+                    seed_conf = load_seed_tasks_conf(self.seed_conf_file, self.mapproxy_conf)
+                    tasks = seed_conf.seeds(['one'])
+                    tasks[0].levels = [0, 1]
+                    seed(tasks, dry_run=False, downsample=True)
+        assert self.tile_exists((0, 0, 1))
+        assert self.tile_exists((1, 0, 1))
+        assert self.tile_exists((0, 0, 0))
+
     def test_seed_skip_uncached(self):
         with tmp_image((256, 256), format='png') as img:
             img_data = img.read()
@@ -21,6 +21,7 @@ from io import BytesIO
 import pytest
 
 from PIL import Image
+from mapproxy.cache.file import FileCache
 from mapproxy.test.image import is_jpeg, tmp_image
 from mapproxy.test.http import mock_httpd
 from mapproxy.test.system import SysTest
@@ -227,6 +228,21 @@ class TestTileService(SysTest):
         assert resp.status == "200 OK"
         self._check_tile_resp(resp)
 
+    def test_if_none_match_without_loading_tile(
+        self, app, cache_dir, base_config, fixture_cache_data, monkeypatch
+    ):
+        etag, max_age = self._update_timestamp(cache_dir, base_config)
+
+        def load_tile(*args, **kw):
+            raise AssertionError("tile data loaded")
+
+        monkeypatch.setattr(FileCache, "load_tile", load_tile)
+        monkeypatch.setattr(FileCache, "load_tiles", load_tile)
+        resp = app.get("/tiles/wms_cache/1/0/1.jpeg", headers={"If-None-Match": etag})
+        assert resp.status == "304 Not Modified"
+        self._check_cache_control_headers(resp, etag, max_age)
+        assert "Content-type" not in resp.headers
+
     @pytest.mark.parametrize(
         "date,modified",
         [
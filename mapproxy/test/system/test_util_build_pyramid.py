@@ -0,0 +1,80 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import shutil
+
+import pytest
+
+from mapproxy.cache.tile import Tile
+from mapproxy.config import local_base_config
+from mapproxy.config.loader import load_configuration
+from mapproxy.image import ImageResult
+from mapproxy.script.pyramid import build_pyramid_command
+from mapproxy.test.image import create_tmp_image_buf
+from mapproxy.test.helper import capture
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixture")
+
+
+class TestUtilBuildPyramid(object):
+
+    def setup_method(self):
+        self.dir = tempfile.mkdtemp()
+        self.mapproxy_conf_name = "mapproxy_export.yaml"
+        shutil.copy(os.path.join(FIXTURE_DIR, self.mapproxy_conf_name), self.dir)
+        self.mapproxy_conf_file = os.path.join(self.dir, self.mapproxy_conf_name)
+        self.args = ["command_dummy", "-f", self.mapproxy_conf_file]
+
+    def teardown_method(self):
+        shutil.rmtree(self.dir)
+
+    def tile_cache(self):
+        conf = load_configuration(self.mapproxy_conf_file, seed=True)
+        with local_base_config(conf.base_config):
+            _, _, tile_mgr = conf.caches['tms_cache'].caches()[0]
+        return tile_mgr.cache
+
+    def test_unknown_cache(self):
+        self.args += ["--cache", "unknown", "--levels", "0..1"]
+        with capture() as (out, err):
+            with pytest.raises(SystemExit) as ex:
+                build_pyramid_command(self.args)
+        assert ex.value.code != 0
+        assert err.getvalue().startswith("ERROR:")
+
+    def test_build(self):
+        cache = self.tile_cache()
+        for coord in [(0, 0, 1), (1, 0, 1), (0, 1, 1), (1, 1, 1)]:
+            cache.store_tile(Tile(coord, ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+
+        self.args += ["--cache", "tms_cache", "--levels", "0..1", "-c", "1"]
+        with capture() as (out, err):
+            build_pyramid_command(self.args)
+
+        assert "Levels: 0..0 from cached level 1" in out.getvalue()
+        assert cache.is_cached(Tile((0, 0, 0)))
+
+    def test_build_dry_run(self):
+        cache = self.tile_cache()
+        cache.store_tile(Tile((0, 0, 1), ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+
+        self.args += ["--cache", "tms_cache", "--levels", "0..1", "--dry-run"]
+        with capture() as (out, err):
+            build_pyramid_command(self.args)
+
+        assert not cache.is_cached(Tile((0, 0, 0)))
@@ -0,0 +1,99 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import shutil
+
+import pytest
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    boto3 = None
+    mock_aws = None
+
+from mapproxy.cache.tile import Tile
+from mapproxy.config import local_base_config
+from mapproxy.config.loader import load_configuration
+from mapproxy.image import ImageResult
+from mapproxy.script.blobs import remove_blobs_command
+from mapproxy.test.image import create_tmp_image_buf
+from mapproxy.test.helper import capture
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixture")
+
+
+@pytest.mark.skipif(not (boto3 and mock_aws), reason="boto3 and moto required")
+class TestUtilRemoveUnreferencedBlobs(object):
+
+    def setup_method(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        boto3.client("s3").create_bucket(Bucket="tiles")
+
+        self.dir = tempfile.mkdtemp()
+        self.mapproxy_conf_name = "mapproxy_dedup_s3.yaml"
+        shutil.copy(os.path.join(FIXTURE_DIR, self.mapproxy_conf_name), self.dir)
+        self.mapproxy_conf_file = os.path.join(self.dir, self.mapproxy_conf_name)
+        self.args = ["command_dummy", "-f", self.mapproxy_conf_file]
+
+    def teardown_method(self):
+        shutil.rmtree(self.dir)
+        self.mock.stop()
+
+    def store_tiles(self):
+        conf = load_configuration(self.mapproxy_conf_file)
+        with local_base_config(conf.base_config):
+            _, _, tile_mgr = conf.caches['dedup_cache'].caches()[0]
+        cache = tile_mgr.cache
+        cache.store_tile(Tile((0, 0, 1), ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+        cache.store_tile(Tile((1, 0, 1), ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+        cache.store_tile(Tile((0, 1, 1), ImageResult(create_tmp_image_buf((256, 256), color=(255, 0, 0)))))
+        cache.remove_tile(Tile((0, 1, 1)))
+        return cache
+
+    def num_blobs(self):
+        r = boto3.client("s3").list_objects_v2(Bucket='tiles', Prefix='dedup/')
+        return sum(1 for obj in r.get('Contents', []) if '/blobs/' in obj['Key'])
+
+    def test_unknown_cache(self):
+        self.args += ["--caches", "unknown"]
+        with capture() as (out, err):
+            with pytest.raises(SystemExit) as ex:
+                remove_blobs_command(self.args)
+        assert ex.value.code == 1
+        assert 'dedup_cache' in out.getvalue()
+
+    def test_remove(self):
+        cache = self.store_tiles()
+        assert self.num_blobs() == 2
+
+        # recently stored data is kept
+        with capture():
+            remove_blobs_command(self.args)
+        assert self.num_blobs() == 2
+
+        with capture() as (out, err):
+            remove_blobs_command(self.args + ["--min-age", "0", "--dry-run"])
+        assert "dedup_cache: found 1 unreferenced blobs" in out.getvalue()
+        assert self.num_blobs() == 2
+
+        with capture():
+            remove_blobs_command(self.args + ["--min-age", "0"])
+        assert self.num_blobs() == 1
+        assert cache.load_tile(Tile((1, 0, 1)))
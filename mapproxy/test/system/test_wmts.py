@@ -210,6 +210,23 @@ class TestWMTS(SysTest):
         data = BytesIO(resp.body)
         assert is_jpeg(data)
 
+    def test_get_tile_not_modified(self, app, fixture_cache_data):
+        resp = app.get(str(self.common_tile_req))
+        etag = resp.headers["ETag"]
+        last_modified = resp.headers["Last-modified"]
+
+        resp = app.get(str(self.common_tile_req), headers={"If-None-Match": etag})
+        assert resp.status == "304 Not Modified"
+        assert resp.headers["ETag"] == etag
+        assert resp.body == b""
+
+        resp = app.get(str(self.common_tile_req), headers={"If-Modified-Since": last_modified})
+        assert resp.status == "304 Not Modified"
+
+        resp = app.get(str(self.common_tile_req), headers={"If-None-Match": etag + "foo"})
+        assert resp.status == "200 OK"
+        assert is_jpeg(BytesIO(resp.body))
+
     def test_get_tile_flipped_axis(self, app, cache_dir, fixture_cache_data):
         # test default tile lock directory
         tiles_lock_dir = cache_dir.join("tile_locks")
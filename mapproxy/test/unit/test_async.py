@@ -18,7 +18,7 @@ from __future__ import print_function
 import time
 import threading
 
-from mapproxy.util.async_ import ThreadPool, imap
+from mapproxy.util.async_ import ThreadPool, SharedPool, WorkerPool, imap
 
 
 class TestThreaded(object):
@@ -213,6 +213,82 @@ class TestThreadPool(CommonPoolTests):
         assert 'bar' in base_config()
 
 
+class TestSharedPool(CommonPoolTests):
+    def mk_pool(self):
+        return SharedPool(4, pool=WorkerPool(size=4, queue_size=8))
+
+    def test_reuses_threads(self):
+        worker_pool = WorkerPool(size=4, queue_size=8)
+        thread_names = set()
+
+        def func(x):
+            time.sleep(0.01)
+            thread_names.add(threading.current_thread().name)
+            return x
+
+        for _ in range(5):
+            assert SharedPool(4, pool=worker_pool).map(func, list(range(8))) == list(range(8))
+
+        assert worker_pool.stats()['workers'] == 4
+        # workers and the calling thread
+        assert len(thread_names) <= 5
+        stats = worker_pool.stats()
+        assert stats['executed_by_worker'] + stats['executed_by_caller'] == 40
+
+    def test_nested_saturated(self):
+        # nested calls with more tasks than workers must not deadlock
+        worker_pool = WorkerPool(size=2, queue_size=2)
+
+        def inner(x):
+            time.sleep(0.001)
+            return x
+
+        def outer(x):
+            return sum(SharedPool(4, pool=worker_pool).map(inner, list(range(10))))
+
+        result = SharedPool(4, pool=worker_pool).map(outer, list(range(10)))
+        assert result == [45] * 10
+        assert worker_pool.stats()['rejected'] > 0
+
+    def test_base_config(self):
+        from mapproxy.config import base_config
+        from mapproxy.config import local_base_config
+        from copy import deepcopy
+
+        worker_pool = WorkerPool(size=4)
+        conf1 = deepcopy(base_config())
+        conf1.conf = 1
+        conf2 = deepcopy(base_config())
+        conf2.conf = 2
+
+        def check(x):
+            return base_config().conf
+
+        with local_base_config(conf1):
+            assert set(SharedPool(4, pool=worker_pool).map(check, list(range(20)))) == set([1])
+        with local_base_config(conf2):
+            assert set(SharedPool(4, pool=worker_pool).map(check, list(range(20)))) == set([2])
+
+    def test_stop_on_exception(self):
+        worker_pool = WorkerPool(size=2)
+        executed = []
+
+        def func(x):
+            executed.append(x)
+            if x == 2:
+                raise DummyException()
+            return x
+
+        try:
+            SharedPool(2, pool=worker_pool).map(func, list(range(100)))
+        except DummyException:
+            pass
+        else:
+            assert False, 'expected DummyException'
+        time.sleep(0.05)
+        assert len(executed) < 10
+
+
 class DummyException(Exception):
     pass
 
@@ -337,6 +337,9 @@ class DummyTileLayer(object):
         # this dummy code does not handle profiles and different tile origins!
         return self.grid.tile_bbox(request.tile)
 
+    def not_modified_response(self, tile_request, max_age=None, use_profiles=False, coverage=None):
+        return None
+
     def render(self, tile_request, use_profiles=None, coverage=None, decorate_img=None):
         self.requested = True
         resp = BlankImageResult((256, 256), image_opts=ImageOptions(format='image/png'))
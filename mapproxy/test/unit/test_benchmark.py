@@ -0,0 +1,58 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import pytest
+
+from mapproxy.script.benchmark import benchmark_command, benchmarks, run_benchmarks
+
+
+class TestBenchmarks(object):
+
+    @pytest.mark.parametrize('name', [
+        'cache_hit.file', 'cache_hit.mbtiles', 'cache_hit.compact_v2',
+        'meta_tile.split', 'merge.layers', 'encode.png', 'transform.mesh',
+    ])
+    def test_run(self, name):
+        results = run_benchmarks([name], repeat=2, min_time=0)
+        assert len(results['benchmarks']) == 1
+        result = results['benchmarks'][0]
+        assert result['name'] == name
+        assert result['repeat'] == 2
+        assert result['ops'] >= 1
+        assert result['best'] <= result['median']
+        assert result['ops_per_sec'] > 0
+
+    def test_redis_skipped(self):
+        results = run_benchmarks(['cache_hit.redis'], repeat=1, min_time=0)
+        assert 'skipped' in results['benchmarks'][0]
+
+    def test_command_output(self, tmpdir):
+        out = tmpdir.join('results.json')
+        benchmark_command(['benchmark', '-b', 'encode.png,encode.jpeg',
+                           '--repeat', '1', '--min-time', '0', '-o', out.strpath])
+        results = json.loads(out.read())
+        assert [r['name'] for r in results['benchmarks']] == ['encode.png', 'encode.jpeg']
+        assert 'mapproxy_version' in results
+
+    @pytest.mark.parametrize('name', ['unknown', 'encode.pn', 'cache'])
+    def test_command_unknown(self, name):
+        with pytest.raises(SystemExit):
+            benchmark_command(['benchmark', '-b', name])
+
+    def test_registered(self):
+        for prefix in ('cache_hit.', 'meta_tile.', 'merge.', 'encode.', 'transform.', 'seed.'):
+            assert any(n.startswith(prefix) for n in benchmarks)
@@ -31,6 +31,8 @@ import pytest
 from mapproxy.cache.base import TileLocker
 from mapproxy.cache.file import FileCache
 from mapproxy.cache.path import dimensions_part
+from mapproxy.cache.prefetch import TilePrefetcher, prefetch_tile_coords, tile_prefetcher
+from mapproxy.cache.refresh import StaleTileRefresher, stale_refresher
 from mapproxy.cache.tile import Tile
 from mapproxy.cache.tile_manager import TileManager
 from mapproxy.client.http import HTTPClient
@@ -209,6 +211,159 @@ class TestTileManagerStaleTiles(object):
         tile_mgr._expire_timestamp = time.time()
         assert tile_mgr.is_stale(Tile((0, 0, 1)))
 
+    def test_are_stale(self, tile_mgr, file_cache):
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=time.time()-3600)
+        create_cached_tile(Tile((1, 0, 1)), file_cache)
+        coords = [(0, 0, 1), (1, 0, 1), (0, 1, 1), None]
+        assert tile_mgr.are_stale(coords) == [False, False, False, False]
+        tile_mgr._expire_timestamp = time.time() - 60
+        assert tile_mgr.are_stale(coords) == [True, False, False, False]
+
+    def test_are_cached(self, tile_mgr, file_cache):
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=time.time()-3600)
+        create_cached_tile(Tile((1, 0, 1)), file_cache)
+        coords = [(0, 0, 1), (1, 0, 1), (0, 1, 1)]
+        assert tile_mgr.are_cached(coords) == [True, True, False]
+        tile_mgr._expire_timestamp = time.time() - 60
+        assert tile_mgr.are_cached(coords) == [False, True, False]
+        assert tile_mgr.are_cached(coords) == [tile_mgr.is_cached(Tile(c)) for c in coords]
+
+    def test_load_tile_coord_metadata(self, tile_mgr, file_cache):
+        assert tile_mgr.load_tile_coord_metadata((0, 0, 1)) is None
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=1234567890)
+        tile = tile_mgr.load_tile_coord_metadata((0, 0, 1))
+        assert tile.timestamp == 1234567890
+        assert tile.size == 3
+        assert tile.image_result is None
+
+    def test_load_tile_coord_metadata_expired(self, tile_mgr, file_cache):
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=time.time()-3600)
+        tile_mgr._expire_timestamp = time.time()
+        assert tile_mgr.load_tile_coord_metadata((0, 0, 1)) is None
+
+
+class TestTileManagerServeStale(object):
+
+    class BlockingTileClient(MockTileClient):
+        def __init__(self):
+            super().__init__()
+            self.unblock = threading.Event()
+            self.unblock.set()
+
+        def get_tile(self, tile_coord, format=None):
+            self.unblock.wait()
+            return super().get_tile(tile_coord, format=format)
+
+    @pytest.fixture
+    def client(self):
+        return self.BlockingTileClient()
+
+    @pytest.fixture
+    def tile_mgr(self, file_cache, tile_locker, client):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = TiledSource(grid, client)
+        tile_mgr = TileManager(grid, file_cache, [source], 'png', locker=tile_locker,
+                               image_opts=ImageOptions(format='image/png'), serve_stale=True)
+        tile_mgr._expire_timestamp = time.time() - 60
+        return tile_mgr
+
+    def test_serve_stale(self, tile_mgr, file_cache, client):
+        create_cached_tile(Tile((0, 0, 1)), file_cache, timestamp=time.time()-3600)
+        client.unblock.clear()
+        tile = tile_mgr.load_tile_coord((0, 0, 1))
+        # stale tile is returned without waiting for the source
+        assert tile.image_result.as_buffer().read() == b'foo'
+        assert client.requested_tiles == []
+
+        client.unblock.set()
+        stale_refresher().join()
+        assert client.requested_tiles == [(0, 0, 1)]
+        assert tile_mgr.is_cached(Tile((0, 0, 1)))
+        tile = tile_mgr.load_tile_coord((0, 0, 1))
+        assert is_png(tile.image_result.as_buffer())
+
+    def test_missing(self, tile_mgr, file_cache, client):
+        tile = tile_mgr.load_tile_coord((0, 0, 1))
+        assert is_png(tile.image_result.as_buffer())
+        assert client.requested_tiles == [(0, 0, 1)]
+
+    def test_refresher_dedup(self, tile_mgr):
+        # no workers, tasks stay in the queue
+        refresher = StaleTileRefresher(size=0, queue_size=2)
+        refresher.refresh(tile_mgr, [(0, 0, 1), (0, 0, 1)])
+        refresher.refresh(tile_mgr, [(0, 0, 1), (1, 0, 1), (0, 1, 1)])
+        stats = refresher.stats()
+        assert stats['queued'] == 2
+        assert stats['duplicate'] == 2
+        assert stats['dropped'] == 1
+        assert stats['pending'] == 2
+
+
+class TestTileManagerPrefetch(object):
+
+    @pytest.fixture
+    def client(self):
+        return MockTileClient()
+
+    @pytest.fixture
+    def tile_mgr(self, file_cache, tile_locker, client):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = TiledSource(grid, client)
+        return TileManager(grid, file_cache, [source], 'png', locker=tile_locker,
+                           image_opts=ImageOptions(format='image/png'), prefetch=True)
+
+    @pytest.fixture
+    def meta_tile_mgr(self, file_cache, tile_locker, mock_wms_client):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = WMSSource(mock_wms_client)
+        return TileManager(grid, file_cache, [source], 'png', locker=tile_locker,
+                           image_opts=ImageOptions(format='image/png'),
+                           meta_size=[2, 2], meta_buffer=0, prefetch=True)
+
+    def test_prefetch_tile_coords(self, tile_mgr):
+        assert sorted(prefetch_tile_coords(tile_mgr, (1, 0, 2))) == [
+            (0, 0, 2), (0, 1, 2), (1, 1, 2), (2, 0, 2), (2, 0, 3), (2, 1, 2), (2, 1, 3), (3, 0, 3), (3, 1, 3),
+        ]
+        # no next level
+        assert sorted(prefetch_tile_coords(tile_mgr, (0, 0, 19))) == [
+            (0, 1, 19), (1, 0, 19), (1, 1, 19),
+        ]
+
+    def test_prefetch_meta_tile_coords(self, meta_tile_mgr):
+        assert prefetch_tile_coords(meta_tile_mgr, (1, 0, 2)) == [(2, 0, 3), (2, 0, 2)]
+
+    def test_prefetch(self, tile_mgr, client):
+        tile = tile_mgr.load_tile_coord((0, 0, 1), prefetch=True)
+        assert is_png(tile.image_result.as_buffer())
+        tile_prefetcher().join()
+        assert client.requested_tiles[0] == (0, 0, 1)
+        assert sorted(client.requested_tiles[1:]) == [(0, 0, 2), (0, 1, 2), (1, 0, 1), (1, 0, 2), (1, 1, 2)]
+        assert tile_mgr.is_cached(Tile((1, 1, 2)))
+
+        # cached tiles are not prefetched again
+        client.requested_tiles = []
+        tile_mgr.load_tile_coord((0, 0, 1), prefetch=True)
+        tile_prefetcher().join()
+        assert client.requested_tiles == []
+
+    def test_prefetch_disabled(self, tile_mgr, client):
+        tile_mgr.load_tile_coord((0, 0, 1))
+        tile_mgr.prefetch = False
+        tile_mgr.load_tile_coord((1, 0, 1), prefetch=True)
+        tile_prefetcher().join()
+        assert client.requested_tiles == [(0, 0, 1), (1, 0, 1)]
+
+    def test_prefetcher_budget(self, tile_mgr):
+        # no workers, tasks stay in the queue
+        prefetcher = TilePrefetcher(size=0, queue_size=10, budget=3)
+        prefetcher.prefetch(tile_mgr, [(1, 0, 2)])
+        prefetcher.prefetch(tile_mgr, [(1, 0, 2)])
+        stats = prefetcher.stats()
+        assert stats['queued'] == 3
+        assert stats['duplicate'] == 3
+        assert stats['dropped'] == 12
+        assert stats['pending'] == 3
+
 
 class TestTileManagerRemoveTiles(object):
     @pytest.fixture
@@ -231,6 +386,42 @@ class TestTileManagerRemoveTiles(object):
         assert not tile_mgr.is_cached(Tile((0, 0, 1)))
 
 
+class TestTileManagerBuildTiles(object):
+    @pytest.fixture
+    def tile_mgr(self, file_cache, tile_locker):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = TiledSource(grid, MockTileClient())
+        image_opts = ImageOptions(format='image/png', transparent=True, resampling='bilinear')
+        return TileManager(grid, file_cache, [source], 'png',
+                           image_opts=image_opts,
+                           locker=tile_locker)
+
+    def test_build_tiles(self, tile_mgr, file_cache):
+        # left column of the four tiles below (0, 0, 1)
+        for coord in [(0, 0, 2), (0, 1, 2)]:
+            file_cache.store_tile(Tile(coord, ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+
+        built = tile_mgr.build_tile_coords([(0, 0, 1), (1, 0, 1)])
+        assert [t.coord for t in built] == [(0, 0, 1)]
+
+        tile = Tile((0, 0, 1))
+        assert file_cache.load_tile(tile)
+        img = tile.image_result.as_image()
+        assert img.size == (256, 256)
+        assert img.convert('RGBA').getpixel((64, 128)) == (0, 0, 255, 255)
+        assert img.convert('RGBA').getpixel((192, 128))[3] == 0
+        assert not file_cache.is_cached(Tile((1, 0, 1)))
+
+    def test_build_tiles_no_tile_filter(self, tile_mgr, file_cache):
+        def tile_filter(tile):
+            raise AssertionError('tile filters are already applied to the source tiles')
+        tile_mgr.pre_store_filter = [tile_filter]
+        file_cache.store_tile(Tile((0, 0, 2), ImageResult(create_tmp_image_buf((256, 256), color=(0, 0, 255)))))
+
+        built = tile_mgr.build_tile_coords([(0, 0, 1)])
+        assert [t.coord for t in built] == [(0, 0, 1)]
+
+
 class TestTileManagerTiledSource(object):
     @pytest.fixture
     def tile_mgr(self, tile_locker, mock_file_cache, mock_tile_client):
@@ -388,6 +579,43 @@ class TestTileManagerWMSSourceConcurrent(TestTileManagerWMSSource):
                            )
 
 
+class TestTileManagerWMSSourceConcurrentEncoders(TestTileManagerWMSSource):
+    @pytest.fixture
+    def tile_mgr(self, mock_file_cache, tile_locker, mock_wms_client):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        source = WMSSource(mock_wms_client)
+        image_opts = ImageOptions(format='image/png')
+        return TileManager(grid, mock_file_cache, [source], 'png',
+                           meta_size=[2, 2], meta_buffer=0, image_opts=image_opts,
+                           locker=tile_locker,
+                           concurrent_tile_encoders=4,
+                           )
+
+    def test_encoded_before_store(self, tile_mgr, mock_file_cache, monkeypatch):
+        import mapproxy.image
+        img_to_buf = mapproxy.image.img_to_buf
+        encoded = []
+
+        def record_img_to_buf(*args, **kw):
+            encoded.append(args[0])
+            return img_to_buf(*args, **kw)
+        monkeypatch.setattr(mapproxy.image, 'img_to_buf', record_img_to_buf)
+
+        store_tiles = mock_file_cache.store_tiles
+        encoded_on_store = []
+
+        def record_store_tiles(tiles, dimensions=None):
+            encoded_on_store.append(len(encoded))
+            return store_tiles(tiles, dimensions=dimensions)
+        monkeypatch.setattr(mock_file_cache, 'store_tiles', record_store_tiles)
+
+        tile_mgr.creator().create_tiles([Tile((0, 0, 2))])
+        assert mock_file_cache.stored_tiles == \
+               {(0, 0, 2), (1, 0, 2), (0, 1, 2), (1, 1, 2)}
+        assert encoded_on_store == [4]
+        assert len(encoded) == 4
+
+
 class TestTileManagerWMSSourceMinimalMetaRequests(object):
     @pytest.fixture
     def tile_mgr(self, mock_file_cache, mock_wms_client, tile_locker):
@@ -476,20 +704,53 @@ class TestTileManagerLocking(object):
             [((-180.0, -90.0, 180.0, 90.0), (512, 256), SRS(4326))]
 
     def test_concurrent(self, tile_mgr, file_cache, slow_source):
+        results = []
+
         def do_it():
-            tile_mgr.creator().create_tiles([Tile((0, 0, 1)), Tile((1, 0, 1))])
+            results.append(tile_mgr.creator().create_tiles([Tile((0, 0, 1)), Tile((1, 0, 1))]))
 
         threads = [threading.Thread(target=do_it) for _ in range(3)]
         [t.start() for t in threads]
         [t.join() for t in threads]
 
         assert file_cache.stored_tiles == {(0, 0, 1), (1, 0, 1)}
-        assert file_cache.loaded_tiles == counting_set([(0, 0, 1), (1, 0, 1), (0, 0, 1), (1, 0, 1)])
+        # waiting requests get the tiles of the first request without loading them from the cache
+        assert file_cache.loaded_tiles == counting_set([])
         assert slow_source.requested == \
             [((-180.0, -90.0, 180.0, 90.0), (512, 256), SRS(4326))]
 
+        assert len(results) == 3
+        for tiles in results:
+            assert [t.coord for t in tiles] == [(0, 0, 1), (1, 0, 1)]
+            for t in tiles:
+                assert t.image_result.as_image().size == (256, 256)
+        # each request gets its own tile objects
+        assert len(set(id(t) for tiles in results for t in tiles)) == 6
+
         assert os.path.exists(file_cache.tile_location(Tile((0, 0, 1))))
 
+    def test_concurrent_error(self, tile_mgr, file_cache, slow_source):
+        def get_map(query):
+            time.sleep(0.1)
+            slow_source.requested.append((query.bbox, query.size, query.srs))
+            raise SourceError('failed')
+        slow_source.get_map = get_map
+        errors = []
+
+        def do_it():
+            try:
+                tile_mgr.creator().create_tiles([Tile((0, 0, 1)), Tile((1, 0, 1))])
+            except SourceError as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=do_it) for _ in range(3)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+
+        assert len(errors) == 3
+        assert file_cache.stored_tiles == set()
+        assert len(slow_source.requested) == 1
+
     def test_insufficient_permissions_on_dir(self, tile_mgr_restricted):
         # TileLocker has restrictive permissions set for creating directories
         try:
@@ -577,7 +838,8 @@ class TestTileManagerMultipleSourcesWithMetaTiles(object):
         assert source_overlay.requested == \
             [((-180.0, -90.0, 180.0, 90.0), (512, 256), SRS(4326))]
 
-        hist = tiles[0].image_result.as_image().histogram()
+        # tiles of paletted meta tiles are paletted
+        hist = tiles[0].image_result.as_image().convert('RGB').histogram()
         # lots of red (base), but not everything (overlay)
         assert 55000 < hist[255] < 60000  # red   = 0xff
         assert 55000 < hist[256]         # green = 0x00
@@ -22,6 +22,7 @@ try:
 except ImportError:
     AzureBlobCache = None
 
+from mapproxy.cache.tile import Tile
 from mapproxy.test.unit.test_cache_tile import TileCacheTestBase
 
 
@@ -95,3 +96,71 @@ class TestAzureBlobCache(TileCacheTestBase):
         cache.store_tile(self.create_tile(tile_coord))
 
         assert self.container_client.get_blob_client(key).exists()
+
+    def test_deduplicate(self):
+        cache = AzureBlobCache(
+            base_path=self.base_path,
+            file_ext=self.file_ext,
+            container_name=self.container,
+            connection_string=self.connection_string,
+            _concurrent_writer=1,
+            deduplicate=True,
+        )
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        tiles.append(self.create_another_tile((3, 589, 12)))
+        cache.store_tiles(tiles)
+
+        blobs = list(self.container_client.list_blobs(name_starts_with='mycache/webmercator/blobs/'))
+        assert len(blobs) == 2
+
+        loaded = [Tile(t.coord) for t in tiles]
+        assert cache.load_tiles(loaded)
+        assert loaded[0].image_result_buffer().read() == loaded[2].image_result_buffer().read()
+        assert loaded[0].image_result_buffer().read() != loaded[3].image_result_buffer().read()
+
+        tile = Tile((0, 589, 12))
+        assert cache.is_cached(tile)
+        assert tile.size == tiles[0].size > 0
+
+    def test_remove_unreferenced_blobs(self):
+        cache = AzureBlobCache(
+            base_path=self.base_path,
+            file_ext=self.file_ext,
+            container_name=self.container,
+            connection_string=self.connection_string,
+            _concurrent_writer=1,
+            deduplicate=True,
+        )
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        tiles.append(self.create_another_tile((3, 589, 12)))
+        cache.store_tiles(tiles)
+        cache.remove_tiles([Tile((3, 589, 12))])
+
+        # recently stored blobs are kept
+        assert cache.remove_unreferenced_blobs() == 0
+        assert cache.remove_unreferenced_blobs(min_age=0, dry_run=True) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 0
+
+        blobs = list(self.container_client.list_blobs(name_starts_with='mycache/webmercator/blobs/'))
+        assert len(blobs) == 1
+        assert cache.load_tiles([Tile(t.coord) for t in tiles[:3]])
+
+    def test_remove_tiles(self):
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        self.cache.store_tiles(tiles)
+        self.cache.remove_tiles([Tile((0, 589, 12)), Tile((2, 589, 12)), Tile((4, 589, 12)), Tile(None)])
+        assert self.cache.are_cached([Tile(t.coord) for t in tiles]) == [False, True, False]
+
+    def test_remove_tiles_failed(self, monkeypatch, caplog):
+        class Response(object):
+            status_code = 403
+            reason = 'Forbidden'
+
+        def delete_blobs(*keys, **kw):
+            assert kw['raise_on_any_failure'] is False
+            return iter([Response() for _ in keys])
+        monkeypatch.setattr(self.cache.container_client, 'delete_blobs', delete_blobs)
+
+        self.cache.remove_tiles([Tile((0, 589, 12))])
+        assert 'unable to remove mycache/webmercator/12/0/589.png: 403 Forbidden' in caplog.text
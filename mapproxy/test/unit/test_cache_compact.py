@@ -23,11 +23,11 @@ import tempfile
 
 from io import BytesIO
 
-from mapproxy.cache.compact import CompactCacheV1, CompactCacheV2
+from mapproxy.cache.compact import CompactCacheV1, CompactCacheV2, MappedFiles, mapped_files
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageResult
 from mapproxy.image.opts import ImageOptions
-from mapproxy.script.defrag import defrag_compact_cache
+from mapproxy.script.defrag import defrag_command, defrag_compact_cache
 from mapproxy.test.helper import assert_permissions
 from mapproxy.test.unit.test_cache_tile import TileCacheTestBase
 
@@ -246,6 +246,162 @@ class TestCompactCacheV2Permissions(TileCacheTestBase):
         assert_permissions(bundle.filename, '700')
 
 
+class TestCompactCacheV2Deduplicate(TileCacheTestBase):
+
+    always_loads_metadata = True
+
+    def setup_method(self):
+        TileCacheTestBase.setup_method(self)
+        self.cache = CompactCacheV2(
+            cache_dir=self.cache_dir,
+            deduplicate=True,
+        )
+        self.fname = os.path.join(self.cache_dir, 'L12', 'R0380C1380.bundle')
+
+    def create_data_tile(self, coord, data):
+        return Tile(coord, ImageResult(BytesIO(data), image_opts=ImageOptions(format='image/png')))
+
+    def test_deduplicate(self):
+        tiles = [self.create_data_tile((5000 + x, 1000, 12), b'a' * 1000) for x in range(10)]
+        tiles.append(self.create_data_tile((5000, 1001, 12), b'b' * 1000))
+        self.cache.store_tiles(tiles)
+        assert os.path.getsize(self.fname) == 64 + 128 * 128 * 8 + 2 * (1000 + 4)
+
+        # identical to existing record
+        self.cache.store_tile(self.create_data_tile((5000, 1002, 12), b'a' * 1000))
+        assert os.path.getsize(self.fname) == 64 + 128 * 128 * 8 + 2 * (1000 + 4)
+
+        tiles = [Tile((5000 + x, 1000, 12)) for x in range(10)] + [Tile((5000, 1001, 12)), Tile((5000, 1002, 12))]
+        assert self.cache.load_tiles(tiles)
+        assert [t.image_result_buffer().read()[:1] for t in tiles] == [b'a'] * 10 + [b'b', b'a']
+
+        # removing a tile keeps the shared record
+        self.cache.remove_tile(Tile((5000, 1000, 12)))
+        tile = Tile((5001, 1000, 12))
+        assert self.cache.load_tile(tile)
+        assert tile.image_result_buffer().read() == b'a' * 1000
+
+    def test_size(self):
+        self.cache.store_tiles([self.create_data_tile((5000 + x, 1000, 12), b'a' * 1000) for x in range(10)])
+        bundle = self.cache._get_bundle((5000, 1000, 12))
+        size, file_size = bundle.size()
+        assert size == file_size
+
+    def test_defragmentation(self):
+        self.cache.store_tiles([self.create_data_tile((5000 + x, 1000, 12), b'a' * 1000) for x in range(10)])
+        self.cache.store_tile(self.create_data_tile((5000, 1001, 12), b'b' * 60 * 1024))
+        self.cache.store_tile(self.create_data_tile((5000, 1001, 12), b'c' * 1000))
+        before = os.path.getsize(self.fname)
+
+        defrag_compact_cache(self.cache, min_bytes=50000)
+        after = os.path.getsize(self.fname)
+        assert after < before
+        assert after == 64 + 128 * 128 * 8 + 2 * (1000 + 4)
+
+        tiles = [Tile((5000 + x, 1000, 12)) for x in range(10)] + [Tile((5000, 1001, 12))]
+        assert self.cache.load_tiles(tiles)
+        assert [t.image_result_buffer().read()[:1] for t in tiles] == [b'a'] * 10 + [b'c']
+
+
+class MappedBundleTestBase(object):
+    def setup_method(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = self.cache_class(self.cache_dir)
+        mapped_files.clear()
+
+    def teardown_method(self):
+        mapped_files.clear()
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+    def store(self, cache, coord, data):
+        assert cache.store_tile(Tile(coord, ImageResult(BytesIO(data), image_opts=ImageOptions(format='image/png'))))
+
+    def load(self, cache, coord):
+        t = Tile(coord)
+        if not cache.load_tile(t):
+            return None
+        return t.image_result_buffer().read()
+
+    def test_store_after_load(self):
+        self.store(self.cache, (0, 0, 5), b'foo')
+        assert self.load(self.cache, (0, 0, 5)) == b'foo'
+        assert not self.cache.is_cached(Tile((1, 0, 5)))
+
+        self.store(self.cache, (1, 0, 5), b'bar')
+        self.store(self.cache, (0, 0, 5), b'baz')
+        assert self.cache.is_cached(Tile((1, 0, 5)))
+        assert self.load(self.cache, (1, 0, 5)) == b'bar'
+        assert self.load(self.cache, (0, 0, 5)) == b'baz'
+
+        self.cache.remove_tile(Tile((1, 0, 5)))
+        assert not self.cache.is_cached(Tile((1, 0, 5)))
+
+    def test_changes_from_other_process(self):
+        self.store(self.cache, (0, 0, 5), b'foo')
+        assert self.load(self.cache, (0, 0, 5)) == b'foo'
+
+        # simulate store from another process, without invalidation
+        other_cache = self.cache_class(self.cache_dir)
+        orig_invalidate = mapped_files.invalidate
+        mapped_files.invalidate = lambda filename: None
+        try:
+            self.store(other_cache, (1, 0, 5), b'a' * 10000)
+        finally:
+            mapped_files.invalidate = orig_invalidate
+
+        assert self.load(self.cache, (1, 0, 5)) == b'a' * 10000
+        assert self.load(self.cache, (0, 0, 5)) == b'foo'
+
+    def test_defragmentation(self):
+        self.store(self.cache, (0, 0, 5), b'a' * 60 * 1024)
+        self.store(self.cache, (0, 0, 5), b'b' * 60 * 1024)
+        assert self.load(self.cache, (0, 0, 5)) == b'b' * 60 * 1024
+
+        defrag_compact_cache(self.cache, min_bytes=50000, log_progress=mockProgressLog())
+        assert self.load(self.cache, (0, 0, 5)) == b'b' * 60 * 1024
+
+
+class TestMappedBundleV1(MappedBundleTestBase):
+    cache_class = CompactCacheV1
+
+
+class TestMappedBundleV2(MappedBundleTestBase):
+    cache_class = CompactCacheV2
+
+
+class TestMappedFiles(object):
+    def test_lru(self, tmpdir):
+        mf = MappedFiles(size=2)
+        for name in 'abc':
+            tmpdir.join(name).write(name * 10)
+        a = mf.get(tmpdir.join('a').strpath)
+        assert a[:] == b'aaaaaaaaaa'
+        assert mf.get(tmpdir.join('a').strpath) is a
+        mf.get(tmpdir.join('b').strpath)
+        mf.get(tmpdir.join('c').strpath)
+        # a was removed from the LRU, but the old mapping is still valid
+        assert mf.get(tmpdir.join('a').strpath) is not a
+        assert a[:] == b'aaaaaaaaaa'
+
+    def test_missing_and_empty(self, tmpdir):
+        mf = MappedFiles()
+        assert mf.get(tmpdir.join('missing').strpath) is None
+        tmpdir.join('empty').write('')
+        assert mf.get(tmpdir.join('empty').strpath) is None
+
+    def test_changed(self, tmpdir):
+        mf = MappedFiles()
+        fname = tmpdir.join('a').strpath
+        tmpdir.join('a').write('foo')
+        a = mf.get(fname)
+        # replace file, like defrag-compact-cache
+        tmpdir.join('b').write('foobar')
+        os.replace(tmpdir.join('b').strpath, fname)
+        assert mf.get(fname)[:] == b'foobar'
+        assert a[:] == b'foo'
+
+
 class mockProgressLog(object):
     def __init__(self):
         self.logs = []
@@ -354,3 +510,33 @@ class TestDefragmentationV1(DefragmentationTestBase):
 
 class TestDefragmentationV2(DefragmentationTestBase):
     cache_class = CompactCacheV2
+
+
+class TestDefragCommand(object):
+    def test_memory_cache(self, tmpdir, monkeypatch):
+        monkeypatch.setattr('mapproxy.script.util.setup_logging', lambda *args, **kw: None)
+        cache_dir = tmpdir.join('compact').strpath
+        conf = tmpdir.join('mapproxy.yaml')
+        conf.write(
+            'caches:\n'
+            '  compact:\n'
+            '    grids: [GLOBAL_WEBMERCATOR]\n'
+            '    sources: []\n'
+            '    memory_cache: true\n'
+            '    cache:\n'
+            '      type: compact\n'
+            '      version: 2\n'
+            '      directory: %s\n' % cache_dir
+        )
+
+        cache = CompactCacheV2(cache_dir)
+        for _ in range(2):
+            cache.store_tile(Tile((5000, 1000, 12),
+                                  ImageResult(BytesIO(b'a' * 60 * 1024), image_opts=ImageOptions(format='image/png'))))
+        fname = os.path.join(cache_dir, 'L12', 'R0380C1380.bundle')
+        before = os.path.getsize(fname)
+
+        # compact caches are found even if memory_cache is enabled
+        defrag_command(['defrag-compact', '-f', conf.strpath, '--caches', 'compact',
+                        '--min-mb', '0', '--min-percent', '0'])
+        assert os.path.getsize(fname) < before
@@ -100,6 +100,37 @@ class TestGeopackageCache(TileCacheTestBase):
         tiles = [Tile((i, 0, 10)) for i in range(0, 2010)]
         assert self.cache.load_tiles(tiles)
 
+    def test_load_tiles_range(self):
+        for x in range(4):
+            for y in range(4):
+                if (x, y) != (2, 2):
+                    assert self.cache.store_tile(Tile((x, y, 5), ImageResult(BytesIO(b'foo'))))
+        # tiles outside of the requested set and on other levels are ignored
+        assert self.cache.store_tile(Tile((1, 1, 4), ImageResult(BytesIO(b'bar'))))
+
+        tiles = [Tile((x, y, 5)) for x in range(1, 3) for y in range(1, 3)]
+        assert not self.cache.load_tiles(tiles)
+        assert [t.coord for t in tiles if t.image_result] == [(1, 1, 5), (1, 2, 5), (2, 1, 5)]
+        assert tiles[0].image_result_buffer().read() == b'foo'
+
+        tiles = [Tile((x, y, 5)) for x in range(0, 2) for y in range(0, 4)]
+        assert self.cache.load_tiles(tiles)
+
+        # (1, 1, 5) is within the range, but not requested
+        tiles = [Tile((0, 0, 5)), Tile((0, 1, 5)), Tile((1, 0, 5))]
+        assert self.cache.load_tiles(tiles)
+
+    def test_load_tiles_sparse(self):
+        assert self.cache.store_tile(Tile((0, 0, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.cache.store_tile(Tile((30, 30, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.cache.store_tile(Tile((3, 3, 4), ImageResult(BytesIO(b'foo'))))
+
+        tiles = [Tile((0, 0, 5)), Tile((30, 30, 5)), Tile((3, 3, 4))]
+        assert self.cache.load_tiles(tiles)
+        tiles = [Tile((0, 0, 5)), Tile((30, 29, 5))]
+        assert not self.cache.load_tiles(tiles)
+        assert tiles[0].image_result and not tiles[1].image_result
+
     def test_timeouts(self):
         self.cache._db_conn_cache.db = sqlite3.connect(self.cache.geopackage_file, timeout=0.05)
 
@@ -185,6 +216,21 @@ class TestGeopackageLevelCache(TileCacheTestBase):
         self.cache.remove_level_tiles_before(1, remove_all=True)
         assert_files_in_dir(self.cache_dir, ['2.gpkg'], glob='*.gpkg')
 
+    def test_remove_level_files_read_only(self):
+        self.cache.store_tile(self.create_tile((0, 0, 1)))
+        cache = GeopackageLevelCache(
+            self.cache_dir,
+            tile_grid=tile_grid(3857, name='global-webmarcator'),
+            table_name='test_tiles',
+            read_only=True,
+        )
+        try:
+            assert not cache.remove_level_tiles_before(1, remove_all=True)
+            assert not cache.remove_level_tiles_before(2, remove_all=True)
+            assert_files_in_dir(self.cache_dir, ['1.gpkg'], glob='*.gpkg')
+        finally:
+            cache.cleanup()
+
     def test_remove_level_tiles_before(self):
         self.cache.store_tile(self.create_tile((0, 0, 1)))
         self.cache.store_tile(self.create_tile((0, 0, 2)))
@@ -14,11 +14,15 @@
 # limitations under the License.
 
 import os
+import shutil
+import tempfile
 import threading
 import time
 
 from io import BytesIO
 
+import pytest
+
 from mapproxy.cache.mbtiles import MBTilesCache, MBTilesLevelCache
 from mapproxy.cache.tile import Tile
 from mapproxy.image import ImageResult
@@ -56,6 +60,37 @@ class TestMBTileCache(TileCacheTestBase):
         tiles = [Tile((i, 0, 10)) for i in range(0, 2010)]
         assert self.cache.load_tiles(tiles)
 
+    def test_load_tiles_range(self):
+        for x in range(4):
+            for y in range(4):
+                if (x, y) != (2, 2):
+                    assert self.cache.store_tile(Tile((x, y, 5), ImageResult(BytesIO(b'foo'))))
+        # tiles outside of the requested set and on other levels are ignored
+        assert self.cache.store_tile(Tile((1, 1, 4), ImageResult(BytesIO(b'bar'))))
+
+        tiles = [Tile((x, y, 5)) for x in range(1, 3) for y in range(1, 3)]
+        assert not self.cache.load_tiles(tiles)
+        assert [t.coord for t in tiles if t.image_result] == [(1, 1, 5), (1, 2, 5), (2, 1, 5)]
+        assert tiles[0].image_result_buffer().read() == b'foo'
+
+        tiles = [Tile((x, y, 5)) for x in range(0, 2) for y in range(0, 4)]
+        assert self.cache.load_tiles(tiles)
+
+        # (1, 1, 5) is within the range, but not requested
+        tiles = [Tile((0, 0, 5)), Tile((0, 1, 5)), Tile((1, 0, 5))]
+        assert self.cache.load_tiles(tiles)
+
+    def test_load_tiles_sparse(self):
+        assert self.cache.store_tile(Tile((0, 0, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.cache.store_tile(Tile((30, 30, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.cache.store_tile(Tile((3, 3, 4), ImageResult(BytesIO(b'foo'))))
+
+        tiles = [Tile((0, 0, 5)), Tile((30, 30, 5)), Tile((3, 3, 4))]
+        assert self.cache.load_tiles(tiles)
+        tiles = [Tile((0, 0, 5)), Tile((30, 29, 5))]
+        assert not self.cache.load_tiles(tiles)
+        assert tiles[0].image_result and not tiles[1].image_result
+
     def test_timeouts(self):
         self.cache._db_conn_cache.db = sqlite3.connect(self.cache.mbtile_file, timeout=0.05)
 
@@ -95,6 +130,147 @@ class TestMBTileCachePermissions(TileCacheTestBase):
         assert_permissions(self.cache.mbtile_file, '700')
 
 
+class TestMBTileCacheReadOnly(object):
+    def setup_method(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.mbtile_file = os.path.join(self.cache_dir, 'tmp.mbtiles')
+        cache = MBTilesCache(self.mbtile_file)
+        assert cache.store_tile(Tile((0, 0, 1), ImageResult(BytesIO(b'foo'))))
+        cache.cleanup()
+
+    def teardown_method(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_load(self):
+        cache = MBTilesCache(self.mbtile_file, read_only=True, cache_size_mb=4)
+        try:
+            tile = Tile((0, 0, 1))
+            assert cache.load_tile(tile)
+            assert tile.image_result_buffer().read() == b'foo'
+            assert not cache.is_cached(Tile((1, 0, 1)))
+            assert cache.db.execute('PRAGMA mmap_size').fetchone()[0] == 256 * 1024 * 1024
+            assert cache.db.execute('PRAGMA cache_size').fetchone()[0] == -4096
+        finally:
+            cache.cleanup()
+
+    def test_store(self):
+        cache = MBTilesCache(self.mbtile_file, read_only=True)
+        try:
+            assert not cache.store_tile(Tile((1, 0, 1), ImageResult(BytesIO(b'bar'))))
+            assert not cache.is_cached(Tile((1, 0, 1)))
+        finally:
+            cache.cleanup()
+
+    def test_missing_file(self):
+        with pytest.raises(ValueError):
+            MBTilesCache(os.path.join(self.cache_dir, 'missing.mbtiles'), read_only=True)
+        assert not os.path.exists(os.path.join(self.cache_dir, 'missing.mbtiles'))
+
+    def test_level_cache(self):
+        level_dir = os.path.join(self.cache_dir, 'levels')
+        cache = MBTilesLevelCache(level_dir)
+        assert cache.store_tile(Tile((0, 0, 1), ImageResult(BytesIO(b'foo'))))
+        cache.cleanup()
+
+        cache = MBTilesLevelCache(level_dir, read_only=True)
+        try:
+            assert cache.is_cached(Tile((0, 0, 1)))
+            assert not cache.is_cached(Tile((0, 0, 2)))
+            assert not cache.load_tiles([Tile((0, 0, 2)), Tile((1, 0, 2))])
+            assert not cache.store_tile(Tile((0, 0, 2), ImageResult(BytesIO(b'bar'))))
+            assert not cache.remove_level_tiles_before(1, remove_all=True)
+            assert not cache.remove_level_tiles_before(2, remove_all=True)
+            assert_files_in_dir(level_dir, ['1.mbtiles'], glob='*.mbtiles')
+        finally:
+            cache.cleanup()
+
+
+class TestMBTileCacheDeduplicate(TileCacheTestBase):
+    def setup_method(self):
+        TileCacheTestBase.setup_method(self)
+        self.cache = MBTilesCache(os.path.join(self.cache_dir, 'tmp.mbtiles'), deduplicate=True)
+
+    def teardown_method(self):
+        if self.cache:
+            self.cache.cleanup()
+        TileCacheTestBase.teardown_method(self)
+
+    def count(self, table):
+        return self.cache.db.execute('SELECT count(*) FROM %s' % table).fetchone()[0]
+
+    def test_deduplicate(self):
+        tiles = [Tile((x, 0, 5), ImageResult(BytesIO(b'blank'))) for x in range(3)]
+        tiles.append(Tile((3, 0, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.cache.store_tiles(tiles)
+        assert self.count('map') == 4
+        assert self.count('images') == 2
+
+        tiles = [Tile((x, 0, 5)) for x in range(4)]
+        assert self.cache.load_tiles(tiles)
+        assert [t.image_result_buffer().read() for t in tiles] == [b'blank', b'blank', b'blank', b'foo']
+        assert self.cache.are_cached(tiles + [Tile((4, 0, 5))]) == [True] * 4 + [False]
+
+    def test_remove_unused_images(self):
+        assert self.cache.store_tile(Tile((0, 0, 5), ImageResult(BytesIO(b'blank'))))
+        assert self.cache.store_tile(Tile((1, 0, 5), ImageResult(BytesIO(b'blank'))))
+        assert self.cache.store_tile(Tile((2, 0, 5), ImageResult(BytesIO(b'foo'))))
+        assert self.count('images') == 2
+
+        # image still referenced by (1, 0, 5)
+        assert self.cache.remove_tile(Tile((0, 0, 5)))
+        assert self.count('images') == 2
+
+        # replace the last reference to 'foo'
+        assert self.cache.store_tile(Tile((2, 0, 5), ImageResult(BytesIO(b'blank'))))
+        assert self.count('images') == 1
+
+        assert self.cache.remove_level_tiles_before(5, remove_all=True)
+        assert self.count('map') == 0
+        assert self.count('images') == 0
+
+    def test_move_image_to_new_tile(self):
+        assert self.cache.store_tile(Tile((0, 0, 1), ImageResult(BytesIO(b'AAAA'))))
+        # the image of the updated tile is still referenced by the new tile of the same batch
+        assert self.cache.store_tiles([
+            Tile((0, 0, 1), ImageResult(BytesIO(b'BBBB'))),
+            Tile((1, 0, 1), ImageResult(BytesIO(b'AAAA'))),
+        ])
+        tile = Tile((1, 0, 1))
+        assert self.cache.load_tile(tile)
+        assert tile.image_result_buffer().read() == b'AAAA'
+        assert self.count('images') == 2
+        assert self.cache.db.execute(
+            'SELECT count(*) FROM map WHERE tile_id NOT IN (SELECT tile_id FROM images)').fetchone()[0] == 0
+
+    def test_with_timestamps(self):
+        cache = MBTilesCache(os.path.join(self.cache_dir, 'ts.mbtiles'), with_timestamps=True, deduplicate=True)
+        try:
+            assert cache.store_tiles([Tile((x, 0, 5), ImageResult(BytesIO(b'blank'))) for x in range(2)])
+            tile = Tile((1, 0, 5))
+            assert cache.load_tile(tile)
+            assert tile.timestamp > time.time() - 60
+            tiles = [Tile((0, 0, 5)), Tile((1, 0, 5))]
+            cache.load_tiles_metadata(tiles)
+            assert [t.size for t in tiles] == [5, 5]
+
+            assert cache.remove_level_tiles_before(5, timestamp=time.time() + 60)
+            assert not cache.load_tile(Tile((0, 0, 5)))
+            assert cache.db.execute('SELECT count(*) FROM images').fetchone()[0] == 0
+        finally:
+            cache.cleanup()
+
+    def test_existing_file_without_deduplication(self):
+        filename = os.path.join(self.cache_dir, 'plain.mbtiles')
+        MBTilesCache(filename).cleanup()
+        cache = MBTilesCache(filename, deduplicate=True)
+        try:
+            assert cache.store_tile(Tile((0, 0, 5), ImageResult(BytesIO(b'blank'))))
+            assert cache.load_tile(Tile((0, 0, 5)))
+            assert cache._tiles_table == 'tiles'
+        finally:
+            cache.cleanup()
+
+
 class TestMBTileLevelCache(TileCacheTestBase):
     always_loads_metadata = True
 
@@ -0,0 +1,128 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+from mapproxy.cache.file import FileCache
+from mapproxy.cache.mbtiles import MBTilesCache
+from mapproxy.cache.memory import MemoryTileCache
+from mapproxy.cache.tile import Tile
+from mapproxy.cache.tile_manager import TileManager
+from mapproxy.grid.tile_grid import TileGrid
+from mapproxy.test.unit.test_cache_tile import TileCacheTestBase, tile_image
+
+
+class TestMemoryFileTileCache(TileCacheTestBase):
+    def setup_method(self):
+        TileCacheTestBase.setup_method(self)
+        self.cache = MemoryTileCache(FileCache(self.cache_dir, 'png'))
+
+    def test_lock_cache_id(self):
+        assert self.cache.lock_cache_id == self.cache.cache.lock_cache_id
+
+    def test_load_from_memory(self):
+        self.cache.store_tile(self.create_tile((1, 0, 4)))
+        assert self.cache.load_tile(Tile((1, 0, 4)))
+        assert self.cache.stats()['misses'] == 1
+        assert self.cache.stats()['tiles'] == 1
+
+        # remove from backend, tile is still in memory
+        os.remove(self.cache.cache.tile_location(Tile((1, 0, 4))))
+        tile = Tile((1, 0, 4))
+        assert self.cache.load_tile(tile)
+        assert tile.image_result.as_buffer().read() == tile_image.getvalue()
+        assert self.cache.is_cached(Tile((1, 0, 4)))
+        assert self.cache.stats()['hits'] == 2
+
+    def test_load_tiles_partly_from_memory(self):
+        for x in range(4):
+            self.cache.store_tile(self.create_tile((x, 0, 4)))
+        assert self.cache.load_tiles([Tile((0, 0, 4)), Tile((1, 0, 4))])
+
+        loaded = []
+        orig_load_tile = self.cache.cache.load_tile
+
+        def load_tile(tile, *args, **kw):
+            if tile.is_missing():
+                loaded.append(tile.coord)
+            return orig_load_tile(tile, *args, **kw)
+        self.cache.cache.load_tile = load_tile
+
+        tiles = [Tile((x, 0, 4)) for x in range(4)]
+        assert self.cache.load_tiles(tiles)
+        assert all(not t.is_missing() for t in tiles)
+        assert loaded == [(2, 0, 4), (3, 0, 4)]
+
+    def test_max_bytes(self):
+        self.cache.max_bytes = len(tile_image.getvalue()) * 2
+        for x in range(3):
+            self.cache.store_tile(self.create_tile((x, 0, 4)))
+            self.cache.load_tile(Tile((x, 0, 4)))
+        stats = self.cache.stats()
+        assert stats['tiles'] == 2
+        assert stats['evictions'] == 1
+        assert stats['bytes'] <= self.cache.max_bytes
+
+    def test_ttl(self):
+        self.cache.ttl = 0.05
+        self.cache.store_tile(self.create_tile((1, 0, 4)))
+        self.cache.load_tile(Tile((1, 0, 4)))
+        assert self.cache.stats()['tiles'] == 1
+        time.sleep(0.1)
+        self.cache.load_tile(Tile((1, 0, 4)))
+        assert self.cache.stats()['hits'] == 0
+
+    def test_expire_timestamp(self):
+        self.cache.store_tile(self.create_tile((1, 0, 4)))
+        tile = Tile((1, 0, 4))
+        self.cache.load_tile(tile, with_metadata=True)
+        self.cache.expire_timestamp = lambda: tile.timestamp + 1
+        self.cache.load_tile(Tile((1, 0, 4)))
+        assert self.cache.stats()['hits'] == 0
+
+    def test_store_invalidates(self):
+        self.cache.store_tile(self.create_tile((1, 0, 4)))
+        self.cache.load_tile(Tile((1, 0, 4)))
+        self.cache.store_tile(self.create_another_tile((1, 0, 4)))
+        assert self.cache.stats()['tiles'] == 0
+
+    def test_tile_manager_refresh_before(self):
+        tm = TileManager(TileGrid(3857), self.cache, [], 'png', locker=None)
+        tm._refresh_before = {'hours': -1}
+        assert self.cache.expire_timestamp() == tm.expire_timestamp()
+
+        self.cache.store_tile(self.create_tile((1, 0, 4)))
+        tiles = tm.load_tile_coords([(1, 0, 4)])
+        assert not tiles[0].is_missing()
+        tiles = tm.load_tile_coords([(1, 0, 4)])
+        # tile is older than refresh_before
+        assert self.cache.stats()['hits'] == 0
+
+    def create_cached_tile(self, tile):
+        loc = self.cache.cache.tile_location(tile, create_dir=True)
+        with open(loc, 'wb') as f:
+            f.write(b'foo')
+
+
+class TestMemoryMBTilesCache(TileCacheTestBase):
+    def setup_method(self):
+        TileCacheTestBase.setup_method(self)
+        self.cache = MemoryTileCache(MBTilesCache(os.path.join(self.cache_dir, 'tmp.mbtiles')))
+
+    def teardown_method(self):
+        if self.cache:
+            self.cache.cleanup()
+        TileCacheTestBase.teardown_method(self)
@@ -0,0 +1,147 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import pytest
+
+from mapproxy.cache.base import TileLocker
+from mapproxy.cache.file import FileCache
+from mapproxy.cache.negative import NegativeTileCache
+from mapproxy.cache.tile import Tile
+from mapproxy.cache.tile_manager import TileManager
+from mapproxy.grid.tile_grid import TileGrid
+from mapproxy.image import ImageResult
+from mapproxy.image.opts import ImageOptions
+from mapproxy.layer import BlankImageError
+from mapproxy.layer.map_layer import MapLayer
+from mapproxy.srs import SRS
+from mapproxy.test.image import create_debug_img
+
+
+class TestNegativeTileCache(object):
+
+    def test_contains(self):
+        cache = NegativeTileCache()
+        cache.add([(0, 0, 1), (1, 0, 1), None])
+        assert cache.contains([(0, 0, 1), (1, 0, 1), (0, 1, 1), None]) == [True, True, False, False]
+
+    def test_dimensions(self):
+        cache = NegativeTileCache()
+        cache.add([(0, 0, 1)], dimensions={'time': '2020'})
+        assert cache.contains([(0, 0, 1)]) == [False]
+        assert cache.contains([(0, 0, 1)], dimensions={'time': '2021'}) == [False]
+        assert cache.contains([(0, 0, 1)], dimensions={'time': '2020'}) == [True]
+
+    def test_ttl(self):
+        cache = NegativeTileCache(ttl=0.1)
+        cache.add([(0, 0, 1)])
+        assert cache.contains([(0, 0, 1)]) == [True]
+        time.sleep(0.15)
+        assert cache.contains([(0, 0, 1)]) == [False]
+
+    def test_max_entries(self):
+        cache = NegativeTileCache(max_entries=2)
+        cache.add([(0, 0, 1), (1, 0, 1)])
+        cache.add([(0, 1, 1)])
+        assert cache.contains([(0, 0, 1), (1, 0, 1), (0, 1, 1)]) == [False, True, True]
+
+    def test_persistent(self, tmpdir):
+        filename = tmpdir.join('negative', 'cache.sqlite').strpath
+        cache = NegativeTileCache(filename=filename)
+        cache.add([(0, 0, 1)], dimensions={'time': '2020'})
+
+        # new process
+        cache = NegativeTileCache(filename=filename)
+        assert cache.contains([(0, 0, 1), (1, 0, 1)], dimensions={'time': '2020'}) == [True, False]
+        assert cache.contains([(0, 0, 1)]) == [False]
+
+        cache.clear()
+        assert NegativeTileCache(filename=filename).contains([(0, 0, 1)], dimensions={'time': '2020'}) == [False]
+
+    def test_persistent_expired(self, tmpdir):
+        filename = tmpdir.join('cache.sqlite').strpath
+        cache = NegativeTileCache(ttl=0.1, filename=filename)
+        cache.add([(0, 0, 1), (1, 0, 1)])
+        time.sleep(0.15)
+        cache.add([(0, 1, 1)])
+
+        # expired entries are removed from the file
+        with cache._db() as db:
+            rows = db.execute("SELECT level, x, y FROM negative_tiles").fetchall()
+        assert rows == [(1, 0, 1)]
+
+    def test_persistent_max_entries(self, tmpdir):
+        filename = tmpdir.join('cache.sqlite').strpath
+        NegativeTileCache(filename=filename).add([(0, 0, 1), (1, 0, 1), (0, 1, 1)])
+
+        cache = NegativeTileCache(max_entries=2, filename=filename)
+        assert cache.contains([(0, 0, 1), (1, 0, 1), (0, 1, 1)]) == [True, True, True]
+        assert len(cache._entries) == 2
+
+
+class BlankSource(MapLayer):
+    supports_meta_tiles = True
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+        self.blank = True
+
+    def get_map(self, query):
+        self.requested.append(query.bbox)
+        if self.blank:
+            raise BlankImageError()
+        return ImageResult(create_debug_img(query.size))
+
+
+class TestTileManagerNegativeCache(object):
+
+    @pytest.fixture
+    def source(self):
+        return BlankSource()
+
+    @pytest.fixture
+    def tile_mgr(self, tmpdir, source):
+        grid = TileGrid(SRS(4326), bbox=[-180, -90, 180, 90])
+        file_cache = FileCache(cache_dir=tmpdir.join('cache').strpath, file_ext='png')
+        locker = TileLocker(tmpdir.join('lock').strpath, 10, "id")
+        return TileManager(grid, file_cache, [source], 'png', locker=locker,
+                           image_opts=ImageOptions(format='image/png'),
+                           meta_size=[2, 2], meta_buffer=0,
+                           negative_cache=NegativeTileCache(ttl=60))
+
+    def test_blank_meta_tile(self, tile_mgr, source):
+        tile = tile_mgr.load_tile_coord((0, 0, 2))
+        assert tile.image_result is None
+        assert len(source.requested) == 1
+
+        # all tiles of the meta tile are known to be empty
+        for coord in [(0, 0, 2), (1, 0, 2), (0, 1, 2), (1, 1, 2)]:
+            tile = tile_mgr.load_tile_coord(coord)
+            assert tile.image_result is None
+        assert len(source.requested) == 1
+
+        tile_mgr.load_tile_coord((2, 0, 2))
+        assert len(source.requested) == 2
+
+    def test_cached_tile(self, tile_mgr, source):
+        tile_mgr.load_tile_coord((0, 0, 2))
+        source.blank = False
+        assert tile_mgr.load_tile_coord((0, 0, 2)).image_result is None
+
+        # tiles created later (e.g. by seeding) are returned
+        tile_mgr.creator().create_tiles([Tile((0, 0, 2))])
+        assert tile_mgr.load_tile_coord((0, 0, 2)).image_result is not None
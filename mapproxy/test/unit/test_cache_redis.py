@@ -121,3 +121,55 @@ class TestRedisCache(TileCacheTestBase):
         assert cache.store_tile(t1)
         t2 = Tile(t1.coord)
         assert cache.is_cached(t2)
+
+    def test_store_tiles_expire(self):
+        cache = RedisCache(self.host, int(self.port), prefix='mapproxy-test', db=1, ttl=0.05)
+        tiles = [self.create_tile(coord=(x, 6234, 9)) for x in range(4)]
+        assert cache.store_tiles(tiles)
+        assert cache.are_cached([Tile(t.coord) for t in tiles]) == [True] * 4
+        time.sleep(0.1)
+        assert cache.are_cached([Tile(t.coord) for t in tiles]) == [False] * 4
+
+    def test_load_tiles_single_request(self):
+        tiles = [self.create_tile(coord=(x, 7234, 9)) for x in range(3)]
+        assert self.cache.store_tiles(tiles[:2])
+        loaded = [Tile(t.coord) for t in tiles]
+        assert not self.cache.load_tiles(loaded)
+        assert [t.is_missing() for t in loaded] == [False, False, True]
+        assert self.cache.are_cached([Tile(t.coord) for t in tiles]) == [True, True, False]
+
+    def test_deduplicate(self):
+        cache = RedisCache(self.host, int(self.port), prefix='mapproxy-test', db=1, deduplicate=True)
+        tiles = [self.create_tile(coord=(x, 8234, 9)) for x in range(3)]
+        tiles.append(self.create_another_tile(coord=(3, 8234, 9)))
+        assert cache.store_tiles(tiles)
+        assert len(cache.r.keys('mapproxy-test-blob-*')) == 2
+
+        loaded = [Tile(t.coord) for t in tiles]
+        assert cache.load_tiles(loaded)
+        assert loaded[0].image_result_buffer().read() == loaded[2].image_result_buffer().read()
+        assert loaded[0].image_result_buffer().read() != loaded[3].image_result_buffer().read()
+
+        tile = Tile((1, 8234, 9))
+        assert cache.load_tile(tile)
+        assert tile.image_result_buffer().read() == loaded[0].image_result_buffer().read()
+
+    def test_remove_unreferenced_blobs(self):
+        cache = RedisCache(self.host, int(self.port), prefix='mapproxy-test', db=1, deduplicate=True)
+        tiles = [self.create_tile(coord=(x, 8234, 9)) for x in range(3)]
+        tiles.append(self.create_another_tile(coord=(3, 8234, 9)))
+        assert cache.store_tiles(tiles)
+        cache.remove_tile(Tile((3, 8234, 9)))
+
+        # recently stored blobs are kept
+        assert cache.remove_unreferenced_blobs() == 0
+        assert cache.remove_unreferenced_blobs(min_age=0, dry_run=True) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 0
+
+        assert len(cache.r.keys('mapproxy-test-blob-*')) == 1
+        assert cache.load_tiles([Tile(t.coord) for t in tiles[:3]])
+
+    def test_max_connections(self):
+        cache = RedisCache(self.host, int(self.port), prefix='mapproxy-test', db=1, max_connections=2)
+        assert cache.r.connection_pool.max_connections == 2
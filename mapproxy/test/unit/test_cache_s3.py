@@ -26,6 +26,7 @@ except ImportError:
     mock_aws = None
 
 from mapproxy.cache.s3 import S3Cache
+from mapproxy.cache.tile import Tile
 from mapproxy.test.unit.test_cache_tile import TileCacheTestBase
 
 
@@ -91,3 +92,85 @@ class TestS3Cache(TileCacheTestBase):
 
         # raises, if key is missing
         boto3.client("s3").head_object(Bucket=self.bucket_name, Key=key)
+
+    def test_deduplicate(self):
+        cache = S3Cache('/mycache/webmercator', 'png', bucket_name=self.bucket_name,
+                        _concurrent_writer=1, deduplicate=True)
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        tiles.append(self.create_another_tile((3, 589, 12)))
+        cache.store_tiles(tiles)
+
+        s3 = boto3.client("s3")
+        blobs = s3.list_objects_v2(Bucket=self.bucket_name, Prefix='mycache/webmercator/blobs/')['Contents']
+        assert len(blobs) == 2
+        r = s3.head_object(Bucket=self.bucket_name, Key='mycache/webmercator/12/0/589.png')
+        assert r['ContentLength'] == 0
+
+        loaded = [Tile(t.coord) for t in tiles]
+        assert cache.load_tiles(loaded)
+        assert loaded[0].image_result_buffer().read() == loaded[2].image_result_buffer().read()
+        assert loaded[0].image_result_buffer().read() != loaded[3].image_result_buffer().read()
+        assert cache.are_cached([Tile(t.coord) for t in tiles]) == [True] * 4
+
+        tile = Tile((0, 589, 12))
+        assert cache.is_cached(tile)
+        assert tile.size == tiles[0].size > 0
+
+    def test_remove_unreferenced_blobs(self):
+        cache = S3Cache('/mycache/webmercator', 'png', bucket_name=self.bucket_name,
+                        _concurrent_writer=1, _concurrent_reader=1, deduplicate=True)
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        tiles.append(self.create_another_tile((3, 589, 12)))
+        cache.store_tiles(tiles)
+        cache.remove_tiles([Tile((3, 589, 12))])
+
+        # recently stored blobs are kept
+        assert cache.remove_unreferenced_blobs() == 0
+        assert cache.remove_unreferenced_blobs(min_age=0, dry_run=True) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 1
+        assert cache.remove_unreferenced_blobs(min_age=0) == 0
+
+        s3 = boto3.client("s3")
+        blobs = s3.list_objects_v2(Bucket=self.bucket_name, Prefix='mycache/webmercator/blobs/')['Contents']
+        assert len(blobs) == 1
+        loaded = [Tile(t.coord) for t in tiles[:3]]
+        assert cache.load_tiles(loaded)
+
+    def test_conn_reused(self, monkeypatch):
+        conn = self.cache.conn()
+        assert self.cache.conn() is conn
+
+        # new client after fork
+        monkeypatch.setattr('os.getpid', lambda: -1)
+        assert self.cache.conn() is not conn
+
+    def test_max_connections(self):
+        cache = S3Cache('/mycache/webmercator', 'png', bucket_name=self.bucket_name, max_connections=32)
+        assert cache.conn().meta.config.max_pool_connections == 32
+
+    def test_remove_tiles(self):
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        self.cache.store_tiles(tiles)
+        self.cache.remove_tiles([Tile((0, 589, 12)), Tile((2, 589, 12)), Tile(None)])
+        assert self.cache.are_cached([Tile(t.coord) for t in tiles]) == [False, True, False]
+
+    def test_are_cached_few_tiles(self, monkeypatch):
+        tiles = [self.create_tile((x, 589, 12)) for x in range(3)]
+        self.cache.store_tiles(tiles)
+
+        def paginate(*args, **kw):
+            raise AssertionError('unexpected listing')
+        monkeypatch.setattr(self.cache.conn(), 'get_paginator', paginate)
+        assert self.cache.are_cached([Tile((x, 589, 12)) for x in range(4)]) == [True, True, True, False]
+
+    def test_are_cached_list(self, monkeypatch):
+        self.cache.list_min_tiles = 4
+        self.cache.store_tiles([self.create_tile((0, y, 12)) for y in range(20) if y != 12])
+
+        def is_cached(*args, **kw):
+            raise AssertionError('unexpected head request')
+        monkeypatch.setattr(self.cache, 'is_cached', is_cached)
+        tiles = [Tile((0, y, 12)) for y in range(10, 15)]
+        assert self.cache.are_cached(tiles) == [True, True, False, True, True]
+        assert tiles[0].timestamp is not None
+        assert tiles[0].size > 0
@@ -75,6 +75,16 @@ class TileCacheTestBase:
     def test_is_cached_none(self):
         assert self.cache.is_cached(Tile(None))
 
+    def test_are_cached(self):
+        self.create_cached_tile(self.create_tile((3009, 589, 12)))
+        self.create_cached_tile(self.create_tile((3011, 589, 12)))
+        tiles = [Tile((3009, 589, 12)), Tile((3010, 589, 12)), Tile(None),
+                 Tile((3011, 589, 12)), Tile((3011, 589, 11))]
+        assert self.cache.are_cached(tiles) == [True, False, True, True, False]
+
+    def test_are_cached_empty(self):
+        assert self.cache.are_cached([]) == []
+
     def test_load_tile_none(self):
         assert self.cache.load_tile(Tile(None))
 
@@ -15,11 +15,13 @@
 
 
 import os
+import threading
 import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 
-from mapproxy.client.http import HTTPClient, HTTPClientError
+from mapproxy.client.http import HTTPClient, HTTPClientError, HTTPConnectionPool, KeepAliveHTTPHandler
 from mapproxy.client.tile import TileClient, TileURLTemplate
 from mapproxy.client.wms import WMSClient, WMSInfoClient
 from mapproxy.grid.tile_grid import tile_grid
@@ -243,6 +245,135 @@ class TestHTTPClient(object):
             self.client.open(TESTSERVER_URL + '/')
 
 
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        body = b'x' * 1000
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def keep_alive_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveRequestHandler)
+    server.daemon_threads = True
+    server.connections = set()
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestHTTPClientKeepAlive(object):
+    def url(self, server):
+        return 'http://127.0.0.1:%d/' % server.server_address[1]
+
+    def client(self, **kw):
+        client = HTTPClient(keep_alive=kw or True)
+        for handler in client.opener.handlers:
+            if isinstance(handler, KeepAliveHTTPHandler):
+                # use a new pool for each test
+                handler.connection_pool = HTTPConnectionPool(**kw)
+                return client, handler.connection_pool
+
+    def test_reuse_connection(self, keep_alive_server):
+        client, pool = self.client()
+        for _ in range(5):
+            assert client.open(self.url(keep_alive_server)).read() == b'x' * 1000
+        assert len(keep_alive_server.connections) == 1
+        stats = pool.stats()
+        assert stats['created'] == 1
+        assert stats['reused'] == 4
+        assert stats['idle'] == 1
+        assert stats['active'] == 0
+
+    def test_unread_response(self, keep_alive_server):
+        client, pool = self.client()
+        resp = client.open(self.url(keep_alive_server))
+        assert pool.stats()['active'] == 1
+        resp.read(10)
+        resp.close()
+        client.open(self.url(keep_alive_server)).read()
+        # partly read connection can't be reused
+        assert len(keep_alive_server.connections) == 2
+        assert pool.stats()['discarded'] == 1
+
+    def test_idle_timeout(self, keep_alive_server):
+        client, pool = self.client(idle_timeout=0.05)
+        client.open(self.url(keep_alive_server)).read()
+        time.sleep(0.1)
+        client.open(self.url(keep_alive_server)).read()
+        assert len(keep_alive_server.connections) == 2
+        assert pool.stats()['discarded'] == 1
+
+    def test_max_connections(self, keep_alive_server):
+        client, pool = self.client(max_connections=1)
+        resps = [client.open(self.url(keep_alive_server)) for _ in range(3)]
+        assert pool.stats()['active'] == 3
+        for resp in resps:
+            resp.read()
+        stats = pool.stats()
+        assert stats['idle'] == 1
+        assert stats['discarded'] == 2
+
+    def test_closed_by_server(self, keep_alive_server):
+        client, pool = self.client()
+        client.open(self.url(keep_alive_server)).read()
+        # simulate server that closed the idle connection
+        for conns in pool._idle.values():
+            for conn, _ in conns:
+                conn.sock.shutdown(2)
+        assert client.open(self.url(keep_alive_server)).read() == b'x' * 1000
+        assert len(keep_alive_server.connections) == 2
+
+    def test_closed_by_server_post(self, keep_alive_server):
+        client, pool = self.client()
+        client.open(self.url(keep_alive_server), data=b'foo').read()
+        for conns in pool._idle.values():
+            for conn, _ in conns:
+                conn.sock.shutdown(2)
+        # non-idempotent requests are not sent again
+        with pytest.raises(HTTPClientError):
+            client.open(self.url(keep_alive_server), data=b'foo')
+        assert len(keep_alive_server.connections) == 1
+        assert client.open(self.url(keep_alive_server), data=b'foo').read() == b'x' * 1000
+
+    def test_forked_process(self, keep_alive_server, monkeypatch):
+        client, pool = self.client()
+        client.open(self.url(keep_alive_server)).read()
+        assert pool.stats()['idle'] == 1
+        child_pid = pool._pid + 1
+        monkeypatch.setattr(os, 'getpid', lambda: child_pid)
+        # connections of the parent process are not reused
+        client.open(self.url(keep_alive_server)).read()
+        assert len(keep_alive_server.connections) == 2
+        stats = pool.stats()
+        assert stats['reused'] == 0
+        assert stats['idle'] == 1
+        assert stats['active'] == 0
+
+    def test_http10_server(self):
+        client, pool = self.client()
+        with mock_httpd(TESTSERVER_ADDRESS, [({'path': '/'}, {'body': b'foo'})]):
+            assert client.open(TESTSERVER_URL + '/').read() == b'foo'
+        stats = pool.stats()
+        assert stats['idle'] == 0
+        assert stats['discarded'] == 1
+
+
 # root certificates for google.com, if no ca-certificates.cert
 # file is found
 GOOGLE_ROOT_CERT = b"""
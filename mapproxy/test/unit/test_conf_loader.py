@@ -30,6 +30,8 @@ from mapproxy.config.loader import (
 )
 from mapproxy.config.configuration.base import ConfigurationError
 from mapproxy.config.configuration.proxy import ProxyConfiguration
+from mapproxy.cache.file import FileCache
+from mapproxy.cache.memory import MemoryTileCache
 from mapproxy.cache.tile_manager import TileManager
 from mapproxy.config.spec import validate_options
 from mapproxy.extent import MapExtent
@@ -39,6 +41,7 @@ from mapproxy.test.helper import TempFile
 from mapproxy.test.unit.test_grid import assert_almost_equal_bbox
 from mapproxy.util.coverage import coverage
 from mapproxy.util.geom import EmptyGeometryError
+from mapproxy.util.lock import AdaptiveSemaphore, RangeSemLock, Semaphore
 
 
 class TestLayerConfiguration(object):
@@ -551,6 +554,57 @@ class TestWMSSourceConfiguration(object):
         except ImportError:
             raise SkipTest('no ssl support')
 
+    def test_concurrent_requests(self, tmpdir):
+        conf_dict = {
+            'globals': {
+                'cache': {'lock_dir': tmpdir.strpath},
+            },
+            'sources': {
+                'osm': {
+                    'type': 'wms',
+                    'concurrent_requests': 4,
+                    'req': {
+                        'url': 'http://localhost/service?',
+                        'layers': 'base',
+                    },
+                },
+                'osm_adaptive': {
+                    'type': 'wms',
+                    'concurrent_requests': 4,
+                    'concurrent_requests_lock': 'memory',
+                    'concurrent_requests_adaptive': True,
+                    'req': {
+                        'url': 'http://localhost/service?',
+                        'layers': 'roads',
+                    },
+                },
+                'invalid': {
+                    'type': 'wms',
+                    'concurrent_requests': 4,
+                    'concurrent_requests_lock': 'foo',
+                    'req': {
+                        'url': 'http://localhost/service?',
+                        'layers': 'roads',
+                    },
+                },
+            },
+        }
+
+        conf = ProxyConfiguration(conf_dict)
+        lock = conf.sources['osm'].source({'format': 'image/png'}).client.lock
+        assert type(lock) is Semaphore
+        assert lock.n == 4
+        assert isinstance(lock.process_lock, RangeSemLock)
+        # shared by all sources for the same host
+        assert conf.sources['osm'].source({'format': 'image/png'}).client.lock is lock
+
+        lock = conf.sources['osm_adaptive'].source({'format': 'image/png'}).client.lock
+        assert isinstance(lock, AdaptiveSemaphore)
+        assert lock.process_lock is None
+
+        with pytest.raises(ConfigurationError):
+            conf.sources['invalid'].source({'format': 'image/png'})
+
 
 class TestBandMergeConfig(object):
 
@@ -1050,6 +1104,97 @@ services:
             config = load_configuration(f)  # defaults to ignore_warnings=True
             assert config.caches['temp'].coverage() == coverage([-50, -50, 50, 50], SRS(4326))
 
+    def test_load_memory_cache(object):
+        with TempFile() as f:
+            open(f, 'wb').write(b"""
+                layers:
+                  - name: temp
+                    title: temp
+                    sources: [temp]
+
+                caches:
+                  temp:
+                    grids: [GLOBAL_WEBMERCATOR]
+                    sources: []
+                    memory_cache:
+                      max_size_mb: 2
+                      ttl: 10
+                """)
+            config = load_configuration(f, ignore_warnings=False)
+            tile_mgr = config.caches['temp'].caches()[0][2]
+            assert isinstance(tile_mgr.cache, MemoryTileCache)
+            assert isinstance(tile_mgr.cache.cache, FileCache)
+            assert tile_mgr.cache.max_bytes == 2 * 1024 * 1024
+            assert tile_mgr.cache.ttl == 10
+            assert tile_mgr.cache.expire_timestamp == tile_mgr.expire_timestamp
+
+            config = load_configuration(f, seed=True)
+            tile_mgr = config.caches['temp'].caches()[0][2]
+            assert isinstance(tile_mgr.cache, FileCache)
+
+    def test_load_negative_cache(object):
+        with TempFile() as f:
+            open(f, 'wb').write(b"""
+                globals:
+                  cache:
+                    negative_cache: true
+
+                layers:
+                  - name: temp
+                    title: temp
+                    sources: [temp]
+
+                caches:
+                  temp:
+                    grids: [GLOBAL_WEBMERCATOR]
+                    sources: []
+                  temp2:
+                    grids: [GLOBAL_WEBMERCATOR]
+                    sources: []
+                    negative_cache:
+                      ttl: 60
+                      persistent: true
+                """)
+            config = load_configuration(f, ignore_warnings=False)
+            tile_mgr = config.caches['temp'].caches()[0][2]
+            assert tile_mgr.negative_cache.ttl == 3600
+            assert tile_mgr.negative_cache.filename is None
+            tile_mgr = config.caches['temp2'].caches()[0][2]
+            assert tile_mgr.negative_cache.ttl == 60
+            assert tile_mgr.negative_cache.filename.endswith('temp2_GLOBAL_WEBMERCATOR.sqlite')
+
+            config = load_configuration(f, seed=True)
+            tile_mgr = config.caches['temp'].caches()[0][2]
+            assert tile_mgr.negative_cache is None
+
+    def test_load_prefetch(object):
+        with TempFile() as f:
+            open(f, 'wb').write(b"""
+                globals:
+                  cache:
+                    prefetch: true
+
+                layers:
+                  - name: temp
+                    title: temp
+                    sources: [temp]
+
+                caches:
+                  temp:
+                    grids: [GLOBAL_WEBMERCATOR]
+                    sources: []
+                  temp2:
+                    grids: [GLOBAL_WEBMERCATOR]
+                    sources: []
+                    disable_storage: true
+                """)
+            config = load_configuration(f, ignore_warnings=False)
+            assert config.caches['temp'].caches()[0][2].prefetch
+            assert not config.caches['temp2'].caches()[0][2].prefetch
+
+            config = load_configuration(f, seed=True)
+            assert not config.caches['temp'].caches()[0][2].prefetch
+
 
 class TestImageOptions(object):
     def test_default_format(self):
@@ -1124,6 +1269,46 @@ class TestImageOptions(object):
         assert image_opts.transparent is None
         assert image_opts.resampling == 'bilinear'
 
+    def test_reprojection_method(self):
+        conf_dict = {
+            'globals': {
+                'image': {
+                    'reprojection_method': 'grid',
+                }
+            },
+            'caches': {
+                'test': {
+                    'sources': [],
+                    'grids': ['GLOBAL_MERCATOR'],
+                },
+                'test2': {
+                    'sources': [],
+                    'grids': ['GLOBAL_MERCATOR'],
+                    'image': {'reprojection_method': 'mesh'},
+                },
+            }
+        }
+        conf = ProxyConfiguration(conf_dict)
+        assert conf.globals.image_options.image_opts({}, 'image/png').reprojection == 'grid'
+        assert conf.caches['test'].image_opts().reprojection == 'grid'
+        assert conf.caches['test2'].image_opts().reprojection == 'mesh'
+
+        conf = ProxyConfiguration({})
+        assert conf.globals.image_options.image_opts({}, 'image/png').reprojection == 'mesh'
+
+        with pytest.raises(ConfigurationError):
+            conf.globals.image_options.image_opts({'reprojection_method': 'foo'}, 'image/png')
+
+    def test_reprojection_method_grid_without_numpy(self, monkeypatch):
+        from mapproxy.image import transform
+        monkeypatch.setattr(transform, 'numpy', None)
+        with pytest.raises(ConfigurationError):
+            ProxyConfiguration({'globals': {'image': {'reprojection_method': 'grid'}}})
+
+        conf = ProxyConfiguration({})
+        with pytest.raises(ConfigurationError):
+            conf.globals.image_options.image_opts({'reprojection_method': 'grid'}, 'image/png')
+
     def test_custom_format_grid(self):
         conf_dict = {
             'globals': {
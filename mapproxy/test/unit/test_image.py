@@ -21,6 +21,11 @@ from io import BytesIO
 
 import pytest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import PIL
 from PIL import Image, ImageDraw
 from mapproxy.image import (
@@ -41,7 +46,9 @@ from mapproxy.image import (
 from mapproxy.image.merge import merge_images, BandMerger
 from mapproxy.image.opts import ImageOptions
 from mapproxy.image.tile import TileMerger, TileSplitter
-from mapproxy.image.transform import ImageTransformer, transform_meshes
+from mapproxy.image.transform import (
+    ImageTransformer, TransformCache, transform_cache, transform_grid, transform_meshes,
+)
 from mapproxy.srs import SRS
 from mapproxy.test.image import (
     is_png,
@@ -640,6 +647,39 @@ class TestTransform(object):
         assert result.as_image() != self.src_img.as_image()
         assert result.size == (100, 150)
 
+    @pytest.mark.skipif(numpy is None, reason="requires numpy")
+    @pytest.mark.parametrize("mode", ["RGB", "RGBA", "P"])
+    @pytest.mark.parametrize("resampling", ["nearest", "bilinear", "bicubic"])
+    def test_transform_grid(self, mode, resampling):
+        # smooth image, small differences should not change the result too much
+        gradient = Image.linear_gradient("L").resize((200, 200))
+        src_img = Image.merge("RGB", [
+            gradient, gradient.rotate(90), Image.radial_gradient("L").resize((200, 200)),
+        ])
+        if mode == "RGBA":
+            src_img.putalpha(gradient.rotate(180))
+        elif mode == "P":
+            src_img = src_img.quantize(64)
+        transformer = ImageTransformer(self.src_srs, self.dst_srs)
+        results = []
+        for reprojection in ["mesh", "grid"]:
+            result = transformer.transform(
+                ImageResult(src_img),
+                self.src_bbox,
+                self.dst_size,
+                self.dst_bbox,
+                image_opts=ImageOptions(resampling=resampling, reprojection=reprojection),
+            )
+            assert result.size == (100, 150)
+            results.append(result.as_image())
+
+        mesh_img, grid_img = results
+        assert grid_img.mode == mesh_img.mode
+        mesh_img = numpy.asarray(mesh_img.convert("RGBA").convert("RGBa"), dtype=float)
+        grid_img = numpy.asarray(grid_img.convert("RGBA").convert("RGBa"), dtype=float)
+        # nearly the same result as PIL
+        assert numpy.abs(mesh_img - grid_img).mean() < 1.5
+
     def _test_compare_max_px_err(self):
         """
         Create transformations with different div values.
@@ -764,6 +804,126 @@ class TestMesh(object):
             assert e == pytest.approx(a, abs=1e-9)
 
 
+@pytest.mark.skipif(numpy is None, reason="requires numpy")
+class TestTransformGrid(object):
+
+    def test_grid_utm(self):
+        grid = transform_grid(
+            src_size=(1335, 1531),
+            src_bbox=(3.65, 39.84, 17.00, 55.15),
+            src_srs=SRS(4326),
+            dst_size=(853, 1683),
+            dst_bbox=(158512, 4428236, 1012321, 6111268),
+            dst_srs=SRS(25832),
+        )
+        assert len(grid.xs) == 8
+        assert len(grid.ys) == 15
+
+        x, y = grid.src_coords(0, 1683)
+        assert x.shape == (1683, 853)
+        # compare interpolated with transformed coordinates
+        for px in [(0, 0), (500, 500), (852, 1682), (100, 1000)]:
+            dst_w = (158512 + (px[0] + 0.5) * (1012321 - 158512) / 853,
+                     6111268 - (px[1] + 0.5) * (6111268 - 4428236) / 1683)
+            src_w = SRS(25832).transform_to(SRS(4326), dst_w)
+            src_px = ((src_w[0] - 3.65) / (17.00 - 3.65) * 1335,
+                      (55.15 - src_w[1]) / (55.15 - 39.84) * 1531)
+            assert x[px[1], px[0]] == pytest.approx(src_px[0], abs=1)
+            assert y[px[1], px[0]] == pytest.approx(src_px[1], abs=1)
+
+    def test_grid_large_scale(self):
+        grid = transform_grid(
+            src_size=(1000, 2000),
+            src_bbox=(
+                556597.4539663672,
+                6446275.841017158,
+                567729.4030456939,
+                6463612.124257667,
+            ),
+            src_srs=SRS(3857),
+            dst_size=(1000, 1000),
+            dst_bbox=(5, 50, 5.1, 50.1),
+            dst_srs=SRS(4326),
+        )
+        # not refined
+        assert len(grid.xs) == 5
+        assert len(grid.ys) == 5
+
+    def test_outside_of_source(self):
+        src_img = ImageResult(Image.new("RGB", (100, 100), (255, 0, 0)))
+        transformer = ImageTransformer(SRS(3857), SRS(4326))
+        result = transformer.transform(
+            src_img,
+            SRS(4326).transform_bbox_to(SRS(3857), (5, 50, 10, 55)),
+            (200, 100),
+            (0, 50, 10, 55),
+            image_opts=ImageOptions(resampling="bicubic", reprojection="grid"),
+        )
+        img = result.as_image()
+        assert img.getpixel((10, 50)) == (0, 0, 0)
+        assert img.getpixel((150, 50)) == (255, 0, 0)
+
+
+class TestTransformCache(object):
+
+    def setup_method(self):
+        transform_cache.clear()
+
+    def teardown_method(self):
+        transform_cache.clear()
+
+    def test_lru(self):
+        cache = TransformCache(size=2)
+        calls = []
+
+        def create(value):
+            def func():
+                calls.append(value)
+                return value
+            return func
+
+        assert cache.get('a', create(1)) == 1
+        assert cache.get('a', create(2)) == 1
+        assert cache.get('b', create(3)) == 3
+        assert cache.get('c', create(4)) == 4
+        assert cache.get('a', create(5)) == 5
+        assert calls == [1, 3, 4, 5]
+        assert cache.stats() == {'hits': 1, 'misses': 4, 'entries': 2, 'size': 2}
+
+    def test_transform_reuses_meshes(self, monkeypatch):
+        from mapproxy.image import transform
+        calls = []
+
+        def counting_transform_meshes(**kw):
+            calls.append(kw)
+            return transform_meshes(**kw)
+
+        monkeypatch.setattr(transform, 'transform_meshes', counting_transform_meshes)
+
+        src_img = ImageResult(create_debug_img((200, 200)))
+        dst_bbox = (0.2, 45.1, 8.3, 53.2)
+        src_bbox = SRS(4326).transform_bbox_to(SRS(31467), dst_bbox)
+        image_opts = ImageOptions(resampling="nearest")
+
+        result1 = ImageTransformer(SRS(31467), SRS(4326)).transform(
+            src_img, src_bbox, (100, 150), dst_bbox, image_opts)
+        # new transformer, bbox with floating point error
+        result2 = ImageTransformer(SRS(31467), SRS(4326)).transform(
+            src_img, src_bbox, (100, 150), (0.2, 45.1, 8.3, 53.2000000001), image_opts)
+        assert len(calls) == 1
+        assert result1.as_image().tobytes() == result2.as_image().tobytes()
+
+        # other bbox, size or max_px_err
+        ImageTransformer(SRS(31467), SRS(4326)).transform(
+            src_img, src_bbox, (100, 150), (0.2, 45.1, 8.3, 53.3), image_opts)
+        ImageTransformer(SRS(31467), SRS(4326)).transform(
+            src_img, src_bbox, (100, 151), dst_bbox, image_opts)
+        ImageTransformer(SRS(31467), SRS(4326), max_px_err=2).transform(
+            src_img, src_bbox, (100, 150), dst_bbox, image_opts)
+        assert len(calls) == 4
+        assert transform_cache.stats()['hits'] == 1
+
+
 class TestSingleColorImage(object):
 
     def test_one_point(self):
@@ -897,6 +1057,46 @@ class TestTileSplitter(object):
             (256 * 256 - 10 * 100, (255, 255, 255, 0)),
         ]
 
+    @pytest.mark.parametrize("transparent", [False, True])
+    def test_quantize(self, transparent):
+        img = Image.new("RGBA" if transparent else "RGB", (512, 256), (130, 140, 120))
+        draw = ImageDraw.Draw(img)
+        for x in range(0, 512, 2):
+            draw.line((x, 0, x, 255), fill=(x // 2, 255 - x // 2, 0))
+        img_opts = ImageOptions(transparent=transparent, format="image/png", colors=64)
+        splitter = TileSplitter(ImageResult(img), img_opts, quantize=True)
+        assert splitter.meta_img.mode == "P"
+        assert not splitter.single_color
+
+        palettes = []
+        for crop_coord in [(0, 0), (256, 0)]:
+            tile = splitter.get_tile(crop_coord, (256, 256))
+            # tiles are not quantized again
+            buf = tile.as_buffer()
+            assert is_png(buf)
+            tile_img = Image.open(buf)
+            assert tile_img.mode == "P"
+            palettes.append(tile_img.getpalette())
+        assert palettes[0] == palettes[1]
+
+    def test_quantize_single_color(self):
+        img = ImageResult(Image.new("RGB", (512, 256), (130, 140, 120)))
+        img_opts = ImageOptions(format="image/png", colors=256)
+        splitter = TileSplitter(img, img_opts, quantize=True)
+        assert splitter.single_color
+
+        tile1 = splitter.get_tile((0, 0), (256, 256))
+        tile2 = splitter.get_tile((256, 0), (256, 256))
+        assert tile1.as_buffer().read() == tile2.as_buffer().read()
+        assert tile1.size == (256, 256)
+        assert is_single_color_image(tile1.as_image()) == (130, 140, 120)
+
+    def test_quantize_not_paletted(self):
+        img = ImageResult(Image.new("RGB", (512, 256), (130, 140, 120)))
+        for img_opts in [ImageOptions(format="image/png", colors=0), ImageOptions(format="image/jpeg", colors=256)]:
+            splitter = TileSplitter(img, img_opts, quantize=True)
+            assert splitter.meta_img.mode == "RGB"
+
 
 @pytest.mark.skipif(not hasattr(Image, "FASTOCTREE"), reason="PIL has no FASTOCTREE")
 class TestHasTransparency(object):
@@ -76,3 +76,50 @@ class TestResponse(Mocker):
         self.replay()
         resp({"REQUEST_METHOD": "GET"}, start_response)
         assert resp.content_length == 342
+
+    def test_real_file_response(self, tmp_path):
+        fname = tmp_path / "tile.png"
+        fname.write_bytes(b"*" * 342)
+        f = open(fname, "rb")
+        resp = Response(f)
+        start_response = self.mock()
+        self.expect(start_response("200 OK", ANY))
+        self.replay()
+        result = resp({"REQUEST_METHOD": "GET"}, start_response)
+        assert resp.content_length == 342
+        assert f.tell() == 0
+        assert b"".join(result) == b"*" * 342
+        result.close()
+        assert f.closed
+
+    def test_real_file_response_w_file_wrapper(self, tmp_path):
+        fname = tmp_path / "tile.png"
+        fname.write_bytes(b"*" * 342)
+        f = open(fname, "rb")
+        resp = Response(f)
+        start_response = self.mock()
+        self.expect(start_response("200 OK", ANY))
+
+        file_wrapper = self.mock()
+        self.expect(file_wrapper(f, resp.block_size)).result("DUMMY")
+        self.replay()
+
+        result = resp(
+            {"REQUEST_METHOD": "GET", "wsgi.file_wrapper": file_wrapper}, start_response
+        )
+        assert result == "DUMMY"
+        assert resp.content_length == 342
+        f.close()
+
+    def test_not_modified_closes_file(self, tmp_path):
+        fname = tmp_path / "tile.png"
+        fname.write_bytes(b"*" * 342)
+        f = open(fname, "rb")
+        resp = Response(f)
+        resp.etag = "abc"
+
+        class Req(object):
+            environ = {"HTTP_IF_NONE_MATCH": "abc"}
+        resp.make_conditional(Req())
+        assert resp.status == "304 Not Modified"
+        assert f.closed
@@ -26,7 +26,8 @@ except ImportError:
 
 import pytest
 
-from mapproxy.seed.seeder import TileWalker, SeedTask, SeedProgress
+from mapproxy.seed.seeder import (TileWalker, SeedTask, SeedProgress, SubtreeProgress, subtree_level_for,
+                                  work_units)
 from mapproxy.cache.dummy import DummyLocker
 from mapproxy.cache.tile_manager import TileManager
 from mapproxy.source.tile import TiledSource
@@ -192,6 +193,44 @@ class TestSeeder(object):
         assert self.seed_pool.seeded_tiles[1] == set([(0, 0), (1, 0)])
         assert self.seed_pool.seeded_tiles[2] == set([(2, 0), (3, 0), (2, 1), (3, 1)])
 
+    def test_seed_subtrees(self):
+        task = self.make_bbox_task([-45, 0, 180, 90], SRS(4326), [0, 1, 2, 3])
+        seeder = TileWalker(task, self.seed_pool, handle_uncached=True)
+        subtrees = seeder.subtrees(2)
+        assert [s for s, _ in subtrees] == [(1, 1, 2), (2, 1, 2), (3, 1, 2)]
+        for subtile, intersection in subtrees:
+            seeder.walk_subtree(subtile, intersection, [2, 3])
+
+        subtree_pool = self.seed_pool
+        self.seed_pool = MockSeedPool()
+        TileWalker(task, self.seed_pool, handle_uncached=True).walk()
+        assert subtree_pool.seeded_tiles[2] == self.seed_pool.seeded_tiles[2]
+        assert subtree_pool.seeded_tiles[3] == self.seed_pool.seeded_tiles[3]
+        assert 0 not in subtree_pool.seeded_tiles
+
+    def test_subtree_level(self):
+        task = self.make_bbox_task([-180, -90, 180, 90], SRS(4326), [0, 1, 2, 3, 4])
+        grid = TileWalker(task, self.seed_pool, handle_uncached=True).grid
+        assert subtree_level_for(task, grid, 1) == 2
+        assert subtree_level_for(task, grid, 4) == 3
+        assert subtree_level_for(task, grid, 100) == 4
+
+    def test_work_units(self):
+        task = self.make_bbox_task([-45, 0, 180, 90], SRS(4326), [0, 1, 2, 3])
+        units = work_units(task, subtree_level=2)
+        assert units[0] == {'task': ['', '', ''], 'levels': [0, 1], 'subtile': None}
+        assert [u['subtile'] for u in units[1:]] == [[1, 1, 2], [2, 1, 2], [3, 1, 2]]
+        assert all(u['levels'] == [2, 3] for u in units[1:])
+
+        assert len(work_units(task, subtree_level=0)) == 1
+
+    def test_subtree_progress(self):
+        progress = SubtreeProgress(4, [(0, 0, 1)])
+        assert progress.progress == 0.25
+        progress.done.add((1, 0, 1))
+        assert progress.current_progress_identifier() == [(0, 0, 1), (1, 0, 1)]
+        assert SubtreeProgress(0).progress == 1.0
+
 
 class TestLevels(object):
 
@@ -0,0 +1,169 @@
+# This file is part of the MapProxy project.
+# Copyright (C) 2026 Omniscale <http://omniscale.de>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+
+import pytest
+
+from mapproxy.seed.workqueue import load_work_queue, LeaseRenewer, RedisWorkQueue, SQLiteWorkQueue
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class WorkQueueTestBase(object):
+
+    def test_lease_ack(self):
+        assert self.queue.add([{'unit': 1}, {'unit': 2}]) == 2
+        assert self.queue.status() == dict(pending=2, leased=0, done=0, failed=0)
+
+        unit_id, unit = self.queue.lease('worker-1')
+        assert unit == {'unit': 1}
+        assert self.queue.status() == dict(pending=1, leased=1, done=0, failed=0)
+        self.queue.ack(unit_id, 'worker-1')
+
+        unit_id, unit = self.queue.lease('worker-1')
+        assert unit == {'unit': 2}
+        self.queue.ack(unit_id, 'worker-1')
+
+        assert self.queue.lease('worker-1') is None
+        assert self.queue.status() == dict(pending=0, leased=0, done=2, failed=0)
+        assert self.queue.is_finished()
+
+    def test_add_existing(self):
+        assert self.queue.add([{'unit': 1}, {'unit': 2}]) == 2
+        unit_id, _ = self.queue.lease('worker-1')
+        self.queue.ack(unit_id, 'worker-1')
+        assert self.queue.add([{'unit': 1}, {'unit': 2}, {'unit': 3}]) == 1
+        assert self.queue.status() == dict(pending=2, leased=0, done=1, failed=0)
+
+    def test_release_retry(self):
+        self.queue.add([{'unit': 1}])
+        for _ in range(2):
+            unit_id, _ = self.queue.lease('worker-1')
+            self.queue.release(unit_id, 'worker-1', error='failed')
+            assert self.queue.status()['pending'] == 1
+
+        unit_id, _ = self.queue.lease('worker-1')
+        self.queue.release(unit_id, 'worker-1', error='failed')
+        # max_attempts reached
+        assert self.queue.status() == dict(pending=0, leased=0, done=0, failed=1)
+        assert self.queue.lease('worker-1') is None
+        assert self.queue.is_finished()
+
+        # failed units are added again
+        assert self.queue.add([{'unit': 1}]) == 1
+        assert self.queue.status() == dict(pending=1, leased=0, done=0, failed=0)
+
+    def test_release_no_retry(self):
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        self.queue.release(unit_id, 'worker-1', error='unknown task', retry=False)
+        assert self.queue.status() == dict(pending=0, leased=0, done=0, failed=1)
+
+    def test_lease_expired(self):
+        self.queue.lease_time = 0.1
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        assert self.queue.lease('worker-2') is None
+        assert not self.queue.is_finished()
+
+        time.sleep(0.2)
+        assert self.queue.status()['pending'] == 1
+        unit_id2, unit = self.queue.lease('worker-2')
+        assert unit_id2 == unit_id
+        assert unit == {'unit': 1}
+
+    def test_renew(self):
+        self.queue.lease_time = 0.3
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        time.sleep(0.2)
+        assert self.queue.renew(unit_id, 'worker-1')
+        time.sleep(0.2)
+        assert self.queue.lease('worker-2') is None
+
+    def test_lease_taken_over(self):
+        self.queue.lease_time = 0.1
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        time.sleep(0.2)
+        assert self.queue.lease('worker-2')[0] == unit_id
+
+        # worker-1 lost the lease and can not change the unit anymore
+        assert not self.queue.renew(unit_id, 'worker-1')
+        assert not self.queue.release(unit_id, 'worker-1', error='failed')
+        assert not self.queue.ack(unit_id, 'worker-1')
+        assert self.queue.status()['pending'] == 0
+
+        self.queue.lease_time = 60
+        assert self.queue.renew(unit_id, 'worker-2')
+        assert self.queue.status() == dict(pending=0, leased=1, done=0, failed=0)
+        assert self.queue.ack(unit_id, 'worker-2')
+        assert self.queue.status() == dict(pending=0, leased=0, done=1, failed=0)
+
+    def test_ack_expired(self):
+        self.queue.lease_time = 0.1
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        time.sleep(0.2)
+        # expired, but not leased by another worker
+        assert self.queue.ack(unit_id, 'worker-1')
+        assert self.queue.status() == dict(pending=0, leased=0, done=1, failed=0)
+        assert self.queue.lease('worker-2') is None
+
+    def test_lease_renewer(self):
+        self.queue.lease_time = 0.3
+        self.queue.add([{'unit': 1}])
+        unit_id, _ = self.queue.lease('worker-1')
+        with LeaseRenewer(self.queue, unit_id, 'worker-1', interval=0.05):
+            time.sleep(0.5)
+            assert self.queue.lease('worker-2') is None
+        assert self.queue.ack(unit_id, 'worker-1')
+
+
+class TestSQLiteWorkQueue(WorkQueueTestBase):
+
+    @pytest.fixture(autouse=True)
+    def queue_fixture(self, tmpdir):
+        self.queue = SQLiteWorkQueue(tmpdir.join('queue.sqlite').strpath)
+        yield
+        self.queue.close()
+
+    def test_shared(self, tmpdir):
+        self.queue.add([{'unit': 1}])
+        queue = load_work_queue('sqlite://' + tmpdir.join('queue.sqlite').strpath)
+        assert isinstance(queue, SQLiteWorkQueue)
+        unit_id, _ = queue.lease('worker-2')
+        assert self.queue.status()['leased'] == 1
+        assert self.queue.lease('worker-1') is None
+
+
+@pytest.mark.skipif(not redis or not os.environ.get('MAPPROXY_TEST_REDIS'),
+                    reason="redis package and MAPPROXY_TEST_REDIS env required")
+class TestRedisWorkQueue(WorkQueueTestBase):
+
+    @pytest.fixture(autouse=True)
+    def queue_fixture(self):
+        host, port = os.environ['MAPPROXY_TEST_REDIS'].split(':')
+        self.queue = load_work_queue('redis://%s:%s/1?prefix=mapproxy-test-queue' % (host, port))
+        assert isinstance(self.queue, RedisWorkQueue)
+        yield
+        for k in self.queue.r.keys('mapproxy-test-queue:*'):
+            self.queue.r.delete(k)
+        self.queue.close()
@@ -24,7 +24,19 @@ import threading
 import time
 from unittest.mock import patch
 
-from mapproxy.util.lock import FileLock, SemLock, cleanup_lockdir, LockTimeout
+import pytest
+
+from mapproxy.util.lock import (
+    FileLock,
+    SemLock,
+    RangeSemLock,
+    Semaphore,
+    AdaptiveSemaphore,
+    SingleFlight,
+    cleanup_lockdir,
+    concurrent_requests_lock,
+    LockTimeout,
+)
 from mapproxy.util.fs import (
     _force_rename_dir,
     swap_dir,
@@ -317,6 +329,227 @@ class TestSemLock(object):
         assert self.count_lockfiles() == 8
 
 
+def _try_range_lock(lock_file):
+    try:
+        with RangeSemLock(lock_file, 1, timeout=0.05)():
+            return True
+    except LockTimeout:
+        return False
+
+
+@pytest.mark.skipif(is_win, reason="fcntl not available on Windows")
+class TestRangeSemLock(object):
+
+    def setup_method(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.lock_file = os.path.join(self.lock_dir, "lock.ranges")
+
+    def teardown_method(self):
+        shutil.rmtree(self.lock_dir)
+
+    def test_threads(self):
+        lock = RangeSemLock(self.lock_file, 2, timeout=0.05)
+        slots = [lock.acquire(), lock.acquire()]
+        assert sorted(slots) == [0, 1]
+        with pytest.raises(LockTimeout):
+            lock.acquire()
+        lock.release(slots[0])
+        assert lock.acquire() == slots[0]
+
+    def test_processes(self):
+        lock = RangeSemLock(self.lock_file, 1)
+        p = multiprocess.Pool(1)
+        try:
+            with lock():
+                assert p.apply(_try_range_lock, (self.lock_file, )) is False
+            assert p.apply(_try_range_lock, (self.lock_file, )) is True
+        finally:
+            p.close()
+            p.join()
+
+
+class TestSemaphore(object):
+
+    def test_limit(self):
+        sem = Semaphore(2)
+        active = []
+        max_active = []
+        lock = threading.Lock()
+
+        def request():
+            with sem():
+                with lock:
+                    active.append(1)
+                    max_active.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(max_active) == 10
+        assert max(max_active) == 2
+        assert sem.active == 0
+
+    def test_timeout(self):
+        sem = Semaphore(1, timeout=0.05)
+        sem.acquire()
+        with pytest.raises(LockTimeout):
+            sem.acquire()
+        sem.release()
+        with sem():
+            assert sem.active == 1
+        assert sem.active == 0
+
+    def test_process_lock(self):
+        entered = []
+
+        class ProcessLock(object):
+            def __enter__(self):
+                entered.append(True)
+
+            def __exit__(self, *args):
+                entered.pop()
+
+        sem = Semaphore(1, process_lock=ProcessLock)
+        with sem():
+            assert entered == [True]
+        assert entered == []
+
+
+class TestAdaptiveSemaphore(object):
+
+    def test_error(self):
+        sem = AdaptiveSemaphore(8)
+        with pytest.raises(ValueError):
+            with sem():
+                raise ValueError()
+        assert sem.limit == 4
+        assert sem.active == 0
+
+        # only once for all requests that were active before the decrease
+        start = time.monotonic() - 1
+        sem._record(time.monotonic(), error=True)
+        sem._record(start, error=True)
+        assert sem.limit == 2
+
+        for _ in range(5):
+            sem._record(time.monotonic(), error=True)
+        assert sem.limit == 1
+
+    def test_increase(self):
+        sem = AdaptiveSemaphore(4)
+        sem.limit = 1
+        for _ in range(3):
+            with sem():
+                pass
+        assert 2.5 < sem.limit < 3
+        for _ in range(10):
+            with sem():
+                pass
+        assert sem.limit == 4
+
+    def test_latency(self):
+        sem = AdaptiveSemaphore(4)
+        sem._record(time.monotonic() - 0.01)
+        assert sem.limit == 4
+        assert sem.baseline < 0.1
+        sem._record(time.monotonic() - 0.5)
+        assert sem.limit == 2
+
+
+class TestConcurrentRequestsLock(object):
+
+    def test_shared(self, tmpdir):
+        lock_file = tmpdir.join('foo.lck').strpath
+        lock = concurrent_requests_lock(lock_file, 2)
+        assert concurrent_requests_lock(lock_file, 2) is lock
+        assert concurrent_requests_lock(lock_file, 2, adaptive=True) is not lock
+        assert isinstance(concurrent_requests_lock(lock_file, 2, adaptive=True), AdaptiveSemaphore)
+
+    def test_memory(self, tmpdir):
+        lock_file = tmpdir.join('foo.lck').strpath
+        lock = concurrent_requests_lock(lock_file, 2, mode='memory')
+        assert lock.process_lock is None
+        with lock():
+            pass
+        assert not os.path.exists(lock_file)
+
+    def test_file(self, tmpdir):
+        lock_file = tmpdir.join('foo.lck').strpath
+        lock = concurrent_requests_lock(lock_file, 2, mode='file')
+        with lock():
+            assert len(glob.glob(lock_file + '*')) == 1
+
+
+class TestSingleFlight(object):
+
+    def test_single(self):
+        flight = SingleFlight()
+        assert flight.call('a', lambda: [1], tuple, list) == [1]
+        assert flight.call('a', lambda: [2], tuple, list) == [2]
+        assert flight.leaders == 2
+        assert flight.followers == 0
+
+    def test_concurrent(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        results = []
+
+        def func():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return [42]
+
+        def do_it():
+            results.append(flight.call('a', func, tuple, list))
+
+        leader = threading.Thread(target=do_it)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=do_it) for _ in range(4)]
+        [t.start() for t in followers]
+        [t.join() for t in followers + [leader]]
+
+        assert calls == [1]
+        assert results == [[42]] * 5
+        # each caller gets its own result
+        assert len(set(id(r) for r in results)) == 5
+        assert flight.leaders == 1
+        assert flight.followers == 4
+
+    def test_exception(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        errors = []
+
+        def func():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('failed')
+
+        def do_it():
+            try:
+                flight.call('a', func, tuple, list)
+            except ValueError as ex:
+                errors.append(ex)
+
+        leader = threading.Thread(target=do_it)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=do_it)
+        follower.start()
+        [t.join() for t in [follower, leader]]
+
+        assert len(errors) == 2
+        assert flight.call('a', lambda: [1], tuple, list) == [1]
+
+
 class DirTest(object):
 
     def setup_method(self):
@@ -18,6 +18,7 @@ try:
 except ImportError:
     import queue as Queue  # type: ignore
 
+import os
 import sys
 import threading
 
@@ -207,18 +208,254 @@ class ThreadPool(object):
         return pool
 
 
+class _Task(object):
+    """
+    A single function call for the `WorkerPool`.
+
+    A task is executed exactly once, either by a worker thread or
+    by the thread that waits for the result (see `claim`).
+    """
+    __slots__ = ('func', 'args', 'base_config', 'result', '_claimed', '_done', '_lock')
+
+    def __init__(self, func, args, conf):
+        self.func = func
+        self.args = args
+        self.base_config = conf
+        self.result = None
+        self._claimed = False
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """
+        Return ``True`` if the caller is the first to claim this task and
+        should execute it.
+        """
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self):
+        try:
+            with local_base_config(self.base_config):
+                self.result = self.func(*self.args)
+        except Exception:
+            self.result = sys.exc_info()
+        self._done.set()
+
+    def cancel(self):
+        """
+        Prevent execution of this task if it was not started yet.
+        """
+        self.claim()
+
+    def wait(self):
+        self._done.wait()
+        return self.result
+
+
+class WorkerPool(object):
+    """
+    Process-wide pool of long-running worker threads.
+
+    Tasks are executed with the `base_config` of the submitting thread.
+    The number of queued tasks is bounded. Tasks that do not fit into the
+    queue, or that are not picked up by a worker in time, are executed by
+    the thread that waits for the result. This keeps nested usage (e.g.
+    a layer renderer that calls a tile creator) free of deadlocks, even
+    when all workers are busy.
+    """
+
+    def __init__(self, size=32, queue_size=256):
+        self.size = size
+        self.queue_size = queue_size
+        self.task_queue = Queue.Queue(maxsize=queue_size)
+        self._workers = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._active = 0
+        self._counters = {
+            'submitted': 0,
+            'rejected': 0,
+            'executed_by_worker': 0,
+            'executed_by_caller': 0,
+            'max_active': 0,
+        }
+
+    def submit(self, func, args):
+        """
+        Queue `func(*args)` for execution and return a task object.
+        Call `run_or_wait` to get the result.
+        """
+        task = _Task(func, args, base_config())
+        self._ensure_workers()
+        try:
+            self.task_queue.put_nowait(task)
+        except Queue.Full:
+            with self._lock:
+                self._counters['rejected'] += 1
+        else:
+            with self._lock:
+                self._counters['submitted'] += 1
+        return task
+
+    def run_or_wait(self, task):
+        """
+        Execute `task` in the current thread if no worker started it yet,
+        otherwise wait for the worker to finish. Returns the result or
+        the ``sys.exc_info()`` of an exception.
+        """
+        if task.claim():
+            with self._lock:
+                self._counters['executed_by_caller'] += 1
+            task.run()
+        return task.wait()
+
+    def _ensure_workers(self):
+        if len(self._workers) >= self.size and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # we were forked (e.g. by the seeder), threads are gone
+                self._pid = os.getpid()
+                self._workers = []
+                self.task_queue = Queue.Queue(maxsize=self.queue_size)
+            while len(self._workers) < self.size:
+                t = threading.Thread(target=self._work,
+                                     name='mapproxy-worker-%d' % len(self._workers))
+                t.daemon = True
+                t.start()
+                self._workers.append(t)
+
+    def _work(self):
+        task_queue = self.task_queue
+        while True:
+            task = task_queue.get()
+            if not task.claim():
+                # already executed by caller or cancelled
+                continue
+            with self._lock:
+                self._active += 1
+                self._counters['executed_by_worker'] += 1
+                if self._active > self._counters['max_active']:
+                    self._counters['max_active'] = self._active
+            try:
+                task.run()
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def stats(self):
+        """
+        Return a dictionary with the pool size, the current number of
+        active workers and queued tasks, and counters since startup.
+
+        A high `rejected` or `executed_by_caller` count indicates that the
+        pool is saturated.
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = self.size
+            stats['workers'] = len(self._workers)
+            stats['active'] = self._active
+        stats['queued'] = self.task_queue.qsize()
+        return stats
+
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+
+def worker_pool():
+    """
+    Return the process-wide `WorkerPool`. The pool is created on first use
+    with the ``thread_pool`` options of the current `base_config`.
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                conf = base_config().get('thread_pool', {})
+                _worker_pool = WorkerPool(
+                    size=conf.get('size', 32),
+                    queue_size=conf.get('queue_size', 256),
+                )
+    return _worker_pool
+
+
+class SharedPool(ThreadPool):
+    """
+    ThreadPool compatible interface to the process-wide `WorkerPool`.
+
+    `size` limits the number of concurrent calls for each map/imap call,
+    including the calling thread. No threads are created or destroyed
+    for each call.
+    """
+
+    def __init__(self, size=4, pool=None):
+        self.pool_size = size
+        self._pool = pool
+        self._pending = []
+
+    @property
+    def worker_pool(self):
+        if self._pool is None:
+            self._pool = worker_pool()
+        return self._pool
+
+    def map_each(self, func_args, raise_exceptions):
+        func_args = list(func_args)
+        if self.pool_size < 2:
+            for func, arg in func_args:
+                try:
+                    yield func(*arg)
+                except Exception:
+                    yield sys.exc_info()
+            return
+
+        pool = self.worker_pool
+        tasks = []
+        self._pending = tasks
+        try:
+            for i in range(len(func_args)):
+                # keep pool_size-1 tasks ahead for the workers,
+                # the current task is executed here if no worker picked it up
+                while len(tasks) < min(i + self.pool_size, len(func_args)):
+                    func, arg = func_args[len(tasks)]
+                    tasks.append(pool.submit(func, arg))
+                result = pool.run_or_wait(tasks[i])
+                if (raise_exceptions and isinstance(result, tuple) and
+                        len(result) == 3 and isinstance(result[1], Exception)):
+                    exc_class, exc, tb = result
+                    raise exc.with_traceback(tb)
+                yield result
+        finally:
+            # do not start tasks of unconsumed results
+            for task in tasks:
+                task.cancel()
+
+    def shutdown(self, force=False):
+        """
+        Cancel all tasks of the current map call that were not started yet.
+        """
+        for task in self._pending:
+            task.cancel()
+
+
 def imap(func, *args):
-    pool = ThreadPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
+    pool = SharedPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
     return pool.imap(func, *args)
 
 
 def starmap(func, args):
-    pool = ThreadPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
+    pool = SharedPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
     return pool.starmap(func, args)
 
 
 def starcall(args):
-    pool = ThreadPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
+    pool = SharedPool(min(len(args[0]), MAX_MAP_ASYNC_THREADS))
     return pool.starcall(args)
 
 
@@ -226,4 +463,4 @@ def run_non_blocking(func, args, kw={}):
     return func(*args, **kw)
 
 
-Pool = ThreadPool
+Pool = SharedPool
@@ -18,9 +18,16 @@ Utility methods and classes (file locking, asynchronous execution pools, etc.).
 """
 
 import random
+import threading
 import time
 import os
 import errno
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore
 
 from mapproxy.util.ext.lockfile import LockFile, LockError
 from mapproxy.util.fs import ensure_directory
@@ -28,7 +35,8 @@ from mapproxy.util.fs import ensure_directory
 import logging
 log = logging.getLogger(__name__)
 
-__all__ = ['LockTimeout', 'FileLock', 'LockError', 'cleanup_lockdir', 'SemLock']
+__all__ = ['LockTimeout', 'FileLock', 'LockError', 'cleanup_lockdir', 'SemLock', 'RangeSemLock',
+           'Semaphore', 'AdaptiveSemaphore', 'concurrent_requests_lock', 'SingleFlight']
 
 
 class LockTimeout(Exception):
@@ -155,6 +163,243 @@ class SemLock(FileLock):
             i = (i+1) % self.n
 
 
+class RangeSemLock(object):
+    """
+    Counting semaphore for multiple processes based on `n` byte-range locks
+    (``fcntl.lockf``) of a single `lock_file`.
+
+    Byte-range locks are held by the process and not by the thread, the
+    threads of a process only try the ranges that this process does not
+    hold already. Use it as `process_lock` of a `Semaphore` to wait for the
+    other threads of the process without polling.
+    """
+
+    def __init__(self, lock_file, n, timeout=60.0, step=0.01, directory_permissions=None, file_permissions=None):
+        self.lock_file = lock_file
+        self.n = n
+        self.timeout = timeout
+        self.step = step
+        self.directory_permissions = directory_permissions
+        self.file_permissions = file_permissions
+        self._fd = None
+        self._held = set()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._pid != os.getpid():
+            # locks are not inherited by forked processes
+            self._fd = None
+            self._held = set()
+            self._pid = os.getpid()
+        if self._fd is None:
+            ensure_directory(self.lock_file, self.directory_permissions)
+            set_permissions = self.file_permissions and not os.path.exists(self.lock_file)
+            self._fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT)
+            if set_permissions:
+                os.chmod(self.lock_file, int(self.file_permissions, base=8))
+        return self._fd
+
+    def _try_acquire(self):
+        with self._lock:
+            fd = self._open()
+            start = random.randint(0, self.n-1)
+            for i in range(self.n):
+                slot = (start + i) % self.n
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError as ex:
+                    if ex.errno in (errno.EACCES, errno.EAGAIN):
+                        continue
+                    raise
+                self._held.add(slot)
+                return slot
+        return None
+
+    def acquire(self):
+        """
+        Lock one of the ranges and return its number. Raises `LockTimeout`
+        if no range is available after `timeout` seconds.
+        """
+        stop_time = time.monotonic() + self.timeout
+        step = self.step
+        while True:
+            slot = self._try_acquire()
+            if slot is not None:
+                return slot
+            if time.monotonic() >= stop_time:
+                raise LockTimeout('unable to lock one of %d ranges of %s' % (self.n, self.lock_file))
+            time.sleep(step)
+            step = min(step * 2, 0.2)
+
+    def release(self, slot):
+        with self._lock:
+            if slot not in self._held or self._pid != os.getpid():
+                return
+            self._held.discard(slot)
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+
+    @contextmanager
+    def lock(self):
+        slot = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    __call__ = lock
+
+
+class Semaphore(object):
+    """
+    Counting semaphore for the threads of this process. Optionally combined
+    with a `process_lock` (e.g. a `RangeSemLock` or a `SemLock` factory)
+    to limit the concurrency of all processes.
+
+    Call the semaphore to get a context manager for a single request.
+    """
+
+    def __init__(self, n, timeout=60.0, process_lock=None):
+        self.n = n
+        self.limit = n
+        self.timeout = timeout
+        self.process_lock = process_lock
+        self.active = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        stop_time = time.monotonic() + self.timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                # requests of the parent are not active in forked processes
+                self._pid = os.getpid()
+                self.active = 0
+            while self.active >= max(1, int(self.limit)):
+                remaining = stop_time - time.monotonic()
+                if remaining <= 0:
+                    raise LockTimeout('unable to acquire semaphore with %d active requests' % self.active)
+                self._cond.wait(remaining)
+            self.active += 1
+
+    def release(self):
+        with self._cond:
+            if self.active > 0:
+                self.active -= 1
+            self._cond.notify()
+
+    def _record(self, start, error=False):
+        pass
+
+    @contextmanager
+    def lock(self):
+        self.acquire()
+        try:
+            with self.process_lock() if self.process_lock else DummyLock():
+                start = time.monotonic()
+                try:
+                    yield
+                except Exception:
+                    self._record(start, error=True)
+                    raise
+                self._record(start)
+        finally:
+            self.release()
+
+    __call__ = lock
+
+
+class AdaptiveSemaphore(Semaphore):
+    """
+    `Semaphore` that adapts its limit between `min_n` and `n` to the latency
+    and errors of the requests (additive increase, multiplicative decrease).
+
+    The limit is multiplied by `backoff` if a request fails or if it takes
+    longer than `tolerance` times the baseline latency (the lowest recent
+    latency, plus 50 milliseconds to ignore jitter of fast sources). The
+    limit is decreased only once for all requests that were started before
+    the last decrease. Each successful request increases the limit by
+    ``1/limit``, i.e. by one for each round of `limit` requests.
+    """
+
+    def __init__(self, n, timeout=60.0, process_lock=None, min_n=1, tolerance=2.0, backoff=0.5):
+        super().__init__(n, timeout=timeout, process_lock=process_lock)
+        self.min_n = min_n
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.baseline = None
+        self._last_decrease = 0.0
+
+    def _record(self, start, error=False):
+        now = time.monotonic()
+        latency = now - start
+        with self._cond:
+            if not error:
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    # let the baseline follow slowly, the source might have become slower for all requests
+                    self.baseline += (latency - self.baseline) * 0.01
+            overloaded = error or latency > self.baseline * self.tolerance + 0.05
+            if overloaded:
+                if start >= self._last_decrease and self.limit > self.min_n:
+                    self.limit = max(self.min_n, self.limit * self.backoff)
+                    self._last_decrease = now
+                    log.info('reduced concurrent requests to %d (%s)', int(self.limit),
+                             'error' if error else 'latency %.3fs' % latency)
+            elif self.limit < self.n:
+                self.limit = min(self.n, self.limit + 1.0 / self.limit)
+                self._cond.notify()
+
+
+_semaphores: dict[tuple, Semaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def concurrent_requests_lock(lock_file, n, mode='fcntl', adaptive=False, timeout=60.0,
+                             directory_permissions=None, file_permissions=None):
+    """
+    Return a lock factory that limits the requests to `n` for the
+    ``concurrent_requests`` option of sources. All calls with the same
+    `lock_file` and options share the semaphore within this process.
+
+    `mode` is ``memory`` to limit the requests of this process only,
+    ``fcntl`` to limit the requests of all processes with byte-range locks
+    (``file`` if not supported by the system) or ``file`` to use a `SemLock`.
+    """
+    if mode not in ('memory', 'fcntl', 'file'):
+        raise ValueError('unknown concurrent_requests_lock: %s' % mode)
+    if mode == 'fcntl' and fcntl is None:
+        mode = 'file'
+
+    key = (lock_file, n, mode, adaptive)
+    with _semaphores_lock:
+        sem = _semaphores.get(key)
+        if sem is not None:
+            return sem
+
+        if mode == 'fcntl':
+            # no .lck suffix, the file must not be removed by cleanup_lockdir
+            process_lock = RangeSemLock(lock_file + '.ranges', n, timeout=timeout,
+                                        directory_permissions=directory_permissions,
+                                        file_permissions=file_permissions)
+        elif mode == 'file':
+            process_lock = lambda: SemLock(lock_file, n, timeout=timeout,  # noqa
+                                           directory_permissions=directory_permissions,
+                                           file_permissions=file_permissions)
+        else:
+            process_lock = None
+
+        if adaptive:
+            sem = AdaptiveSemaphore(n, timeout=timeout, process_lock=process_lock)
+        else:
+            sem = Semaphore(n, timeout=timeout, process_lock=process_lock)
+        _semaphores[key] = sem
+        return sem
+
+
 class DummyLock(object):
     def __enter__(self):
         pass
@@ -167,3 +412,69 @@ class DummyLock(object):
 
     def unlock(self):
         pass
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiting = 0
+        self.shared = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key within this process.
+
+    The first caller of a key (the leader) calls `func`, all other callers
+    of the same key wait till the leader is done. The leader passes the
+    result to `freeze` (only if other callers are waiting) and each waiting
+    caller gets its own copy by calling `thaw` on the frozen result.
+    Exceptions of the leader are raised in all waiting callers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def call(self, key, func, freeze, thaw):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                call.waiting += 1
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return thaw(call.shared)
+
+        try:
+            result = func()
+        except BaseException as ex:
+            call.exception = ex
+            raise
+        else:
+            with self._lock:
+                # new callers for this key are leaders from now on
+                del self._calls[key]
+                waiting = call.waiting
+            if waiting:
+                try:
+                    call.shared = freeze(result)
+                except BaseException as ex:
+                    call.exception = ex
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
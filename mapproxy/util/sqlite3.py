@@ -1,4 +1,6 @@
 import datetime
+import os
+import urllib.parse
 import sqlite3
 
 
@@ -26,3 +28,34 @@ sqlite3.register_adapter(datetime.date, adapt_date_iso)
 sqlite3.register_adapter(datetime.datetime, adapt_datetime_iso)
 sqlite3.register_converter('date', convert_date)
 sqlite3.register_converter('datetime', convert_datetime)
+
+
+# default mmap size for read-only connections
+READ_ONLY_MMAP_SIZE_MB = 256
+
+
+def connect(filename, timeout=30, read_only=False, cache_size_mb=None, mmap_size_mb=None):
+    """
+    Open a connection to the SQLite database `filename`.
+
+    :param read_only: Open the file as read-only and immutable. SQLite skips all
+        locking and change detection, so the file must not be modified while
+        it is open. Uses memory-mapped I/O with ``READ_ONLY_MMAP_SIZE_MB`` if
+        `mmap_size_mb` is not set.
+    :param cache_size_mb: Size of the page cache for this connection.
+    :param mmap_size_mb: Maximum size of the memory-mapped I/O for this connection.
+    """
+    if read_only:
+        uri = 'file:%s?mode=ro&immutable=1' % urllib.parse.quote(os.path.abspath(filename))
+        db = sqlite3.connect(uri, timeout=timeout, uri=True)
+        if mmap_size_mb is None:
+            mmap_size_mb = READ_ONLY_MMAP_SIZE_MB
+    else:
+        db = sqlite3.connect(filename, timeout=timeout)
+
+    if cache_size_mb:
+        # negative values are KiB instead of pages
+        db.execute('PRAGMA cache_size=%d' % -int(cache_size_mb * 1024))
+    if mmap_size_mb:
+        db.execute('PRAGMA mmap_size=%d' % int(mmap_size_mb * 1024 * 1024))
+    return db